@@ -0,0 +1,148 @@
+import asyncio
+import os
+import threading
+import weakref
+
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import deadlines, resilience, signals
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+
+
+class AsyncConnectionPool:
+    """An ``httpx.AsyncClient`` per event loop, for the async storage API.
+
+    A client (and its connection pool) cannot be shared between event loops so
+    one is created lazily for each running loop.
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS, transport=None,
+                 retries=None, circuit_breaker=None, timeouts=None):
+        if httpx is None:
+            raise ImproperlyConfigured(
+                "The async API of ThumborStorage requires httpx: "
+                "pip install django-thumborstorage[async]")
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.transport = transport
+        self.retry_policy = resilience.RetryPolicy(**dict(retries)) if retries else None
+        self.circuit_breakers = resilience.CircuitBreakers(**dict(circuit_breaker)) if circuit_breaker else None
+        self.timeouts = deadlines.Timeouts(timeouts)
+        self._clients = weakref.WeakKeyDictionary()
+        self._pid = os.getpid()
+        # Hosts answering 405/501 to HEAD requests.
+        self.head_unsupported = set()
+
+    @property
+    def client(self):
+        if self._pid != os.getpid():
+            self._clients = weakref.WeakKeyDictionary()
+            self._pid = os.getpid()
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_keepalive_connections)
+            client = httpx.AsyncClient(limits=limits, transport=self.transport)
+            self._clients[loop] = client
+        return client
+
+    async def request(self, method, url, stream=False, operation=None, **kwargs):
+        """Async version of ``pool.ConnectionPool.request()``."""
+        client = self.client
+        if "timeout" in kwargs:
+            timeout = deadlines.connect_read(kwargs.pop("timeout"))
+        else:
+            timeout = self.timeouts.get(operation or method.lower())
+        request = client.build_request(method, url, **kwargs)
+        breaker = self.circuit_breakers and self.circuit_breakers.get(url)
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            request.extensions["timeout"] = httpx_timeout(deadlines.bounded(timeout)).as_dict()
+            if breaker is not None:
+                breaker.before_request()
+            try:
+                with signals.RoundTrip(operation, method, url, dict(kwargs, stream=stream)) as trip:
+                    trip.response = await client.send(request, stream=stream)
+            except BaseException as e:
+                if breaker is not None:
+                    # Even a cancelled probe must not leave the breaker half-open.
+                    breaker.record(isinstance(e, Exception) and not isinstance(e, resilience.TRANSIENT_ERRORS))
+                if (policy is None or not policy.retry_exception(method, e, attempt)
+                        or not resilience.rewind_body(kwargs)):
+                    raise
+            else:
+                response = trip.response
+                if breaker is not None:
+                    breaker.record(response.status_code < 500)
+                if policy is None or not policy.retry_status(method, response.status_code, attempt):
+                    return response
+                await response.aclose()
+            await asyncio.sleep(deadlines.sleep_time(policy.delay(attempt)))
+            attempt += 1
+
+    async def aclose(self):
+        """Close the client of the running event loop."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_async_pool(max_connections=DEFAULT_MAX_CONNECTIONS,
+                   max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                   retries=None, circuit_breaker=None, timeouts=None):
+    """Return the process-wide async pool for that configuration."""
+    config = (max_connections, max_keepalive_connections)
+    key = config + (resilience.freeze(retries), resilience.freeze(circuit_breaker), resilience.freeze(timeouts))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = AsyncConnectionPool(*config, retries=retries,
+                                                         circuit_breaker=circuit_breaker, timeouts=timeouts)
+    return pool
+
+
+def httpx_timeout(timeout):
+    """``httpx.Timeout`` of a (connect, read) tuple; the writes get the read timeout."""
+    if timeout is None:
+        return httpx.Timeout(None)
+    connect, read = timeout
+    return httpx.Timeout(read, connect=connect)
+
+
+async def iterate(chunks):
+    """Async iterator over ``chunks``, for a streamed request body."""
+    for chunk in chunks:
+        yield chunk
+
+
+async def thumbor_original_head(url, http, operation="head"):
+    """Async version of ``storages.thumbor_original_head()``."""
+    netloc = urlsplit(url).netloc
+    if netloc not in http.head_unsupported:
+        response = await http.request("HEAD", url, operation=operation)
+        if response.status_code not in (405, 501):
+            return response
+        http.head_unsupported.add(netloc)
+    response = await http.request("GET", url, headers={"Range": "bytes=0-0"}, stream=True,
+                                  operation=operation)
+    await response.aclose()
+    return response
@@ -0,0 +1,61 @@
+import contextvars
+
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from . import exceptions
+
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class BulkResult(namedtuple("BulkResult", ["name", "value", "error"])):
+    """Outcome of one item of a bulk operation.
+
+    ``name`` is the name given for the item, ``value`` what the operation
+    returned and ``error`` the exception it raised, if any.
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def run(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """Call ``func(name, *args)`` for every ``(name, *args)`` of ``items`` in a pool of threads.
+
+    Yield a ``BulkResult`` per item, in the order of ``items``. At most
+    ``2 * max_workers`` items are in flight so ``items`` can be a lazy iterable
+    of any length. The calls run in the context of the caller (e.g. under its
+    ``deadlines.deadline()``).
+    """
+    def call(item):
+        try:
+            return BulkResult(item[0], func(*item), None)
+        except (exceptions.DjangoThumborStorageException, Exception) as e:
+            return BulkResult(item[0], None, e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for item in items:
+            if not isinstance(item, tuple):
+                item = (item,)
+            pending.append(executor.submit(contextvars.copy_context().run, call, item))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def batches(iterable, size):
+    """Split ``iterable`` into lists of ``size`` items, the last one possibly shorter."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from . import exceptions
+
+logger = logging.getLogger("django_thumborstorage")
+
+# (connect, read) timeouts in seconds per operation; "default" for the others.
+DEFAULT_TIMEOUTS = {
+    "default": (5, 30),
+    "upload": (5, 60),
+    "download": (5, 30),
+    "exists": (5, 10),
+    "delete": (5, 10),
+}
+# Operations timed out like another one unless they are configured.
+FALLBACKS = {
+    "head": "exists",
+    "size": "exists",
+    "dimensions": "exists",
+    "healthcheck": "exists",
+}
+
+_deadline = contextvars.ContextVar("thumbor_deadline", default=None)
+
+
+def connect_read(timeout):
+    """``timeout`` as a (connect, read) tuple; None for no timeout."""
+    if timeout is None:
+        return None
+    if isinstance(timeout, (int, float)):
+        return (timeout, timeout)
+    return tuple(timeout)
+
+
+class Timeouts:
+    """The timeouts of the requests to the Thumbor server, per operation.
+
+    ``config`` overrides ``DEFAULT_TIMEOUTS``: a number of seconds for both
+    the connection and the reads, a ``(connect, read)`` pair or None for no
+    timeout at all.
+    """
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_TIMEOUTS, **dict(config or {}))
+
+    def get(self, operation):
+        if operation not in self.config:
+            operation = FALLBACKS.get(operation)
+            if operation not in self.config:
+                operation = "default"
+        return connect_read(self.config[operation])
+
+
+@contextmanager
+def deadline(seconds):
+    """Give up on Thumbor once ``seconds`` passed, for every call in the block.
+
+    A request is not sent once the deadline passed and raises
+    ``DeadlineExceededException``; the timeouts of the others are capped to the
+    time left. Nested deadlines never extend the enclosing one. None does not
+    set a deadline.
+    """
+    if seconds is None:
+        yield
+        return
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        expires = min(expires, current)
+    token = _deadline.set(expires)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, None without a deadline."""
+    expires = _deadline.get()
+    if expires is None:
+        return None
+    return expires - time.monotonic()
+
+
+def bounded(timeout):
+    """``timeout`` capped to the time left before the deadline.
+
+    Raise ``DeadlineExceededException`` if the deadline passed.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise exceptions.DeadlineExceededException()
+    if timeout is None:
+        return (left, left)
+    return tuple(left if value is None else min(value, left) for value in timeout)
+
+
+def sleep_time(delay):
+    """``delay`` cut short to not sleep past the deadline."""
+    left = remaining()
+    return delay if left is None else max(0, min(delay, left))
+
+
+def deadline_exceeded_response(request):
+    logger.warning("Thumbor deadline exceeded: %s", request.path, extra={"status_code": 504, "request": request})
+    return HttpResponse("Gateway Timeout", status=504, content_type="text/plain")
+
+
+@sync_and_async_middleware
+def deadline_middleware(get_response):
+    """Run each request of the site under a deadline of ``THUMBOR_REQUEST_DEADLINE`` seconds.
+
+    A request which runs out of time answers 504: ``DeadlineExceededException``
+    is not an ``Exception`` and Django would not turn it into a response.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            try:
+                with deadline(getattr(settings, "THUMBOR_REQUEST_DEADLINE", None)):
+                    return await get_response(request)
+            except exceptions.DeadlineExceededException:
+                return deadline_exceeded_response(request)
+    else:
+        def middleware(request):
+            try:
+                with deadline(getattr(settings, "THUMBOR_REQUEST_DEADLINE", None)):
+                    return get_response(request)
+            except exceptions.DeadlineExceededException:
+                return deadline_exceeded_response(request)
+    return middleware
@@ -0,0 +1,114 @@
+import hashlib
+
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from . import exceptions
+
+DEFAULT_INDEX = "django_thumborstorage.dedupe.CacheHashIndex"
+DEFAULT_CHUNK_SIZE = 64 * 2 ** 10
+
+
+def content_digest(content, chunk_size=DEFAULT_CHUNK_SIZE):
+    """SHA-256 of ``content``, read block by block; None if it cannot be read twice.
+
+    ``content`` is rewound for the upload that follows.
+    """
+    seekable = getattr(content, "seekable", None)
+    if seekable is None or not seekable():
+        return None
+    digest = chunks_digest(content.chunks(chunk_size))
+    content.seek(0)
+    return digest
+
+
+def chunks_digest(chunks):
+    """SHA-256 of the content of ``chunks``."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def original_digest(storage, name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """SHA-256 of the original ``name`` of a ``ThumborStorage``, streamed from Thumbor."""
+    response = storage.http.get(storage.original_url(name), stream=True, operation="download")
+    try:
+        if response.status_code == 404:
+            raise exceptions.NotFoundException(name)
+        if response.status_code != 200:
+            raise exceptions.DjangoThumborStorageException(f"{response.status_code} - {name}")
+        return chunks_digest(response.iter_content(chunk_size))
+    finally:
+        response.close()
+
+
+class HashIndex:
+    """The keys of the originals on Thumbor by the hash of their content.
+
+    Subclass it to keep the index elsewhere, e.g. in a table, and give its
+    dotted path in ``THUMBOR_DEDUPE["index"]``.
+    """
+
+    def get(self, digest):
+        """The key of the original with that content, None if unknown."""
+        raise NotImplementedError
+
+    def digest(self, key):
+        """The hash of the original ``key``, None if unknown."""
+        raise NotImplementedError
+
+    def set(self, digest, key):
+        raise NotImplementedError
+
+    def discard(self, key):
+        """Forget the original ``key``, e.g. once deleted."""
+        raise NotImplementedError
+
+
+class CacheHashIndex(HashIndex):
+    """A ``HashIndex`` in a Django cache, ``alias``, with both directions stored.
+
+    Use a persistent cache backend (database, Redis...): an entry evicted only
+    costs an upload, but the entries of a local memory cache are not shared
+    between the processes.
+    """
+
+    def __init__(self, alias="default", timeout=None, prefix="thumbor-dedupe"):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def digest_key(self, digest):
+        return f"{self.prefix}:sha256:{digest}"
+
+    def key_key(self, key):
+        return f"{self.prefix}:key:{key}"
+
+    def get(self, digest):
+        return self.cache.get(self.digest_key(digest))
+
+    def digest(self, key):
+        return self.cache.get(self.key_key(key))
+
+    def set(self, digest, key):
+        self.cache.set_many({self.digest_key(digest): key, self.key_key(key): digest}, self.timeout)
+
+    def discard(self, key):
+        digest = self.digest(key)
+        names = [self.key_key(key)]
+        # The same content may have been uploaded again since under another key.
+        if digest is not None and self.get(digest) == key:
+            names.append(self.digest_key(digest))
+        self.cache.delete_many(names)
+
+
+def get_index(config):
+    """The ``HashIndex`` of a ``THUMBOR_DEDUPE`` configuration (True for the defaults)."""
+    if config is True:
+        config = {}
+    return import_string(config.get("index", DEFAULT_INDEX))(**config.get("options", {}))
@@ -0,0 +1,208 @@
+import contextvars
+import itertools
+import os
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from . import pool, signals
+
+STRATEGIES = ("round_robin", "least_loaded")
+DEFAULT_HEALTH_CHECK_INTERVAL = 10
+DEFAULT_HEALTH_CHECK_PATH = "/healthcheck"
+DEFAULT_FAILURE_THRESHOLD = 3
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.netloc = urlsplit(self.url).netloc
+        self.in_flight = 0
+        self.healthy = True
+        self.failures = 0
+
+    def __repr__(self):
+        return f"<Endpoint {self.url} in_flight={self.in_flight} healthy={self.healthy}>"
+
+
+class Endpoints:
+    """The Thumbor servers accepting writes and serving the originals, with their health.
+
+    A write goes to the next healthy server (``write="round_robin"``) or to
+    the one with the fewest requests in flight (``"least_loaded"``); the reads
+    of the originals are spread the same way (``read``). With ``hedge_after``
+    seconds, a download still waiting for its response after that delay is
+    sent to a second server as well and the first response wins.
+
+    A server is unhealthy after ``failure_threshold`` errors or 5xx in a row,
+    or when ``health_check_path`` fails. The health of every server is
+    checked every ``health_check_interval`` seconds from a thread (None
+    disables the checks, and then a server is never marked unhealthy). When no
+    server is healthy, all of them are used.
+    """
+
+    def __init__(self, urls, write="round_robin", read="round_robin", hedge_after=None,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+                 health_check_path=DEFAULT_HEALTH_CHECK_PATH,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD):
+        if not urls:
+            raise ValueError("At least one Thumbor server is required.")
+        for strategy in (write, read):
+            if strategy not in STRATEGIES:
+                raise ValueError(f"Unknown balancing strategy {strategy!r}, use one of {STRATEGIES}.")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.write_strategy = write
+        self.read_strategy = read
+        self.hedge_after = hedge_after
+        self.health_check_interval = health_check_interval
+        self.health_check_path = health_check_path
+        self.failure_threshold = failure_threshold
+        self._by_netloc = {endpoint.netloc: endpoint for endpoint in self.endpoints}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._checker_pid = None
+        self._executor = None
+        self._executor_pid = None
+        if len(self.endpoints) > 1:
+            # Count the requests in flight and the errors of every request to a server.
+            signals.request_started.connect(self._request_started, dispatch_uid=id(self), weak=False)
+            signals.request_finished.connect(self._request_finished, dispatch_uid=id(self), weak=False)
+
+    @property
+    def single(self):
+        return len(self.endpoints) == 1
+
+    def healthy(self):
+        return [endpoint for endpoint in self.endpoints if endpoint.healthy] or self.endpoints
+
+    def select(self, strategy, exclude=()):
+        if self.single:
+            return self.endpoints[0]
+        self._start_health_checks()
+        candidates = [endpoint for endpoint in self.healthy() if endpoint not in exclude] or self.healthy()
+        if strategy == "least_loaded":
+            # Rotate the start so ties do not always go to the first server.
+            start = next(self._counter) % len(candidates)
+            candidates = candidates[start:] + candidates[:start]
+            return min(candidates, key=lambda endpoint: endpoint.in_flight)
+        return candidates[next(self._counter) % len(candidates)]
+
+    def write_server(self):
+        """Base url of the server to post the next image to."""
+        return self.select(self.write_strategy).url
+
+    def read_server(self):
+        """Base url of the server to read the next original from."""
+        return self.select(self.read_strategy).url
+
+    def hedged(self, request):
+        """Return ``request(base_url)`` on a read server, hedged on a second one if it is too slow.
+
+        The response of the request which loses the race is closed.
+        """
+        first = self.select(self.read_strategy)
+        if not self.hedge_after or self.single or len(self.healthy()) < 2:
+            return request(first.url)
+        executor = self._get_executor()
+        futures = [executor.submit(contextvars.copy_context().run, request, first.url)]
+        done, pending = wait(futures, timeout=self.hedge_after)
+        if not done:
+            second = self.select(self.read_strategy, exclude=[first])
+            futures.append(executor.submit(contextvars.copy_context().run, request, second.url))
+        while True:
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+            winner = next((future for future in futures if future in done and future.exception() is None), None)
+            if winner is not None or not pending:
+                break
+            futures = list(pending)
+        for future in futures:
+            if future is not winner:
+                future.add_done_callback(_close_response)
+        return (winner or done.pop()).result()
+
+    def _get_executor(self):
+        # The threads of an executor do not survive a fork.
+        if self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(thread_name_prefix="thumbor-hedge")
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _request_started(self, sender, url, **kwargs):
+        endpoint = self._by_netloc.get(urlsplit(url).netloc)
+        if endpoint is not None:
+            with self._lock:
+                endpoint.in_flight += 1
+
+    def _request_finished(self, sender, url, operation, status, exception, **kwargs):
+        endpoint = self._by_netloc.get(urlsplit(url).netloc)
+        if endpoint is None:
+            return
+        with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+            if operation == "healthcheck" or not self.health_check_interval:
+                # Without health checks, nothing would bring the server back.
+                return
+            if exception is None and status is not None and status < 500:
+                endpoint.failures = 0
+            else:
+                endpoint.failures += 1
+                if endpoint.failures >= self.failure_threshold:
+                    endpoint.healthy = False
+
+    def check(self, http):
+        """Check the health of every server now."""
+        for endpoint in self.endpoints:
+            try:
+                response = http.get(f"{endpoint.url}{self.health_check_path}", operation="healthcheck",
+                                    timeout=max(1, self.health_check_interval / 2))
+                healthy = response.status_code == 200
+            except Exception:
+                healthy = False
+            with self._lock:
+                endpoint.healthy = healthy
+                if healthy:
+                    endpoint.failures = 0
+
+    def _start_health_checks(self):
+        if not self.health_check_interval or self._checker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._checker_pid == os.getpid():
+                return
+            self._checker_pid = os.getpid()
+
+        def run():
+            http = pool.get_pool()
+            event = threading.Event()
+            while not event.wait(self.health_check_interval):
+                self.check(http)
+
+        threading.Thread(target=run, name="thumbor-health-check", daemon=True).start()
+
+    def close(self):
+        signals.request_started.disconnect(dispatch_uid=id(self))
+        signals.request_finished.disconnect(dispatch_uid=id(self))
+
+
+def _close_response(future):
+    if future.exception() is None and hasattr(future.result(), "close"):
+        future.result().close()
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoints(urls, **config):
+    """Return the process-wide ``Endpoints`` for those servers and configuration."""
+    key = (tuple(urls), tuple(sorted(config.items())))
+    endpoints = _endpoints.get(key)
+    if endpoints is None:
+        with _endpoints_lock:
+            endpoints = _endpoints.get(key)
+            if endpoints is None:
+                endpoints = _endpoints[key] = Endpoints(urls, **config)
+    return endpoints
@@ -10,11 +10,31 @@ class MethodNotAllowedException(DjangoThumborStorageException):
     """ 405 - Method Not Allowed """
 
 
+class CircuitOpenException(DjangoThumborStorageException, Exception):
+    """ The Thumbor server failed too often lately: fail fast without calling it.
+
+    An ``Exception`` too, so that Django answers a 500 and the views may catch it.
+    """
+
+
+class DeadlineExceededException(DjangoThumborStorageException):
+    """ The time given to the calls to Thumbor (``deadlines.deadline()``) is spent. """
+
+
+class ImageValidationException(DjangoThumborStorageException, Exception):
+    """ The upload is out of the limits of ``THUMBOR_UPLOAD_VALIDATION``: not sent.
+
+    An ``Exception`` too, so that the forms and views may catch it.
+    """
+
+
 class ThumborPostException(DjangoThumborStorageException):
     _error = None
 
     def __init__(self, response):
-        self._error = f"{response.status_code} - {response.reason}"
+        # ``reason`` with requests, ``reason_phrase`` with httpx.
+        reason = getattr(response, "reason", None) or getattr(response, "reason_phrase", "")
+        self._error = f"{response.status_code} - {reason}"
 
     def __str__(self):
         return repr(self._error)
@@ -0,0 +1,114 @@
+from django.apps import apps
+from django.db.models import FileField, ImageField
+from django.db.models.fields.files import FieldFile, ImageFieldFile
+
+
+class ThumborFieldFile(FieldFile):
+    """A ``FieldFile`` answering ``size`` and ``exists()`` from its ``thumbor_metadata``, once prefetched.
+
+    See ``prefetch_thumbor_metadata()``.
+    """
+
+    @property
+    def size(self):
+        metadata = getattr(self, "thumbor_metadata", None) or {}
+        if self._committed and "size" in metadata:
+            return metadata["size"]
+        return super().size
+
+    def exists(self):
+        metadata = getattr(self, "thumbor_metadata", None) or {}
+        if "exists" in metadata:
+            return metadata["exists"]
+        return self.storage.exists(self.name)
+
+
+class ThumborImageFieldFile(ThumborFieldFile, ImageFieldFile):
+    def _get_image_dimensions(self):
+        metadata = getattr(self, "thumbor_metadata", None) or {}
+        if not hasattr(self, "_dimensions_cache") and metadata.get("width") is not None:
+            self._dimensions_cache = (metadata["width"], metadata["height"])
+        # Ask the storage first: it may know the dimensions without downloading the image.
+        if not hasattr(self, "_dimensions_cache") and self._committed and self.name:
+            dimensions = getattr(self.storage, "dimensions", None)
+            if dimensions is not None:
+                size = dimensions(self.name)
+                if size is not None:
+                    self._dimensions_cache = size
+        return super()._get_image_dimensions()
+
+
+class ThumborFileField(FileField):
+    """A ``FileField`` whose files answer from the metadata of ``prefetch_thumbor_metadata()``."""
+    attr_class = ThumborFieldFile
+
+
+class ThumborImageField(ImageField):
+    """An ``ImageField`` reading the dimensions from ``ThumborStorage.dimensions()`` when possible.
+
+    Updating ``width_field`` and ``height_field`` after a save then costs no
+    download of the image just posted.
+    """
+    attr_class = ThumborImageFieldFile
+
+
+def thumbor_file_fields(storage_class=None):
+    """Yield ``(model, field)`` for every file field stored with a ``storage_class`` instance.
+
+    ``storage_class`` defaults to ``ThumborStorage``, which includes ``ThumborMigrationStorage``.
+    """
+    from .storages import ThumborStorage
+
+    storage_class = storage_class or ThumborStorage
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, FileField) and isinstance(field.storage, storage_class):
+                yield model, field
+
+
+def field_names(model, field, chunk_size=2000):
+    """Iterate over the file names stored in ``field``, skipping empty ones."""
+    queryset = model._default_manager.exclude(**{field.attname: ""}).exclude(**{field.attname: None})
+    return queryset.values_list(field.attname, flat=True).iterator(chunk_size=chunk_size)
+
+
+def original_shared(key, name):
+    """True if a file field holds another name on the Thumbor original ``key`` than ``name``, or ``name`` twice.
+
+    With ``THUMBOR_DEDUPE``, several names share an original. One row holding
+    ``name`` is taken for the one whose file is being deleted.
+    """
+    name = name.lstrip("/")
+    holders = 0
+    for model, field in thumbor_file_fields():
+        names = (model._default_manager.filter(**{f"{field.attname}__contains": f"image/{key}/"})
+                 .values_list(field.attname, flat=True)[:2])
+        for other in names:
+            holders += 1
+            if other.lstrip("/") != name or holders > 1:
+                return True
+    return False
+
+
+def prefetch_thumbor_metadata(instances, *fields, max_workers=None):
+    """Fetch the metadata of the originals of ``fields`` for all of ``instances`` at once.
+
+    ``instances`` is a queryset or a list of model instances. The originals
+    are checked concurrently, one request each, and their metadata
+    (``exists``, ``size``, ``content_type``...) is set as ``thumbor_metadata``
+    on the field files. The ``size`` and ``exists()`` of the files of a
+    ``ThumborFileField`` or ``ThumborImageField`` then answer from it, and the
+    storage from its metadata cache while they are kept. Return ``instances``.
+    """
+    by_storage = {}
+    for instance in instances:
+        for field in fields:
+            field_file = getattr(instance, field)
+            if field_file and hasattr(field_file.storage, "prefetch_metadata"):
+                by_storage.setdefault(field_file.storage, []).append(field_file)
+    for storage, field_files in by_storage.items():
+        metadata = storage.prefetch_metadata([field_file.name for field_file in field_files],
+                                             max_workers=max_workers)
+        for field_file in field_files:
+            field_file.thumbor_metadata = metadata.get(field_file.name)
+    return instances
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+DEFAULT_MAX_SIZE = 1024 * 2 ** 20  # 1 GB
+# Seconds after which the size of the cache is measured again, to count the
+# files written by the other processes.
+DEFAULT_RESCAN_INTERVAL = 60
+
+
+class OriginalsCache:
+    """A read-through cache of the originals on the local disk, keyed by Thumbor key.
+
+    The files are written under a temporary name then renamed, so a reader
+    never sees a partial file, and they are evicted least recently used first
+    once the cache grows over ``max_size``. Several processes can share the
+    same ``location``.
+
+    The size of the cache is counted as the files are written and deleted,
+    and measured by walking the directory only when the count goes over
+    ``max_size`` or is older than ``rescan_interval`` seconds.
+    """
+
+    def __init__(self, location, max_size=DEFAULT_MAX_SIZE, revalidate=False,
+                 rescan_interval=DEFAULT_RESCAN_INTERVAL, clock=time.monotonic):
+        self.location = location
+        self.max_size = max_size
+        self.revalidate = revalidate
+        self.rescan_interval = rescan_interval
+        self.clock = clock
+        self._size = None
+        self._scanned_at = None
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.location, key[:2], key)
+
+    def open(self, key):
+        """Return the cached original opened for reading, or None."""
+        path = self.path(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        # The modification time orders the eviction.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return f
+
+    def etag(self, key):
+        try:
+            with open(f"{self.path(key)}.etag") as f:
+                return f.read() or None
+        except FileNotFoundError:
+            return None
+
+    def store(self, key, chunks, etag=None):
+        """Write the ``chunks`` of an original in the cache and return it opened for reading."""
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        f = os.fdopen(fd, "w+b")
+        size = 0
+        try:
+            for chunk in chunks:
+                size += f.write(chunk)
+            f.flush()
+            if etag:
+                self._write_etag(key, etag)
+            os.replace(tmp_path, path)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+        f.seek(0)
+        self._added(size)
+        return f
+
+    def _added(self, size):
+        with self._lock:
+            if self._size is None or self.clock() - self._scanned_at >= self.rescan_interval:
+                scan = True
+            else:
+                self._size += size
+                scan = self._size > self.max_size
+        if scan:
+            self.evict()
+
+    def _write_etag(self, key, etag):
+        path = f"{self.path(key)}.etag"
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            f.write(etag)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        path = self.path(key)
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            size = 0
+        for path in (path, f"{path}.etag"):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            if self._size is not None:
+                self._size = max(0, self._size - size)
+
+    def entries(self):
+        """``(mtime, size, key)`` of the cached originals."""
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.location):
+            for filename in filenames:
+                if filename.startswith(".") or filename.endswith(".etag"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filename))
+        return entries
+
+    def evict(self):
+        """Delete the least recently used originals until the cache fits in ``max_size``."""
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, ".lock"), "w") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another process is already evicting.
+                    return
+            entries = sorted(self.entries())
+            total = sum(size for mtime, size, key in entries)
+            for mtime, size, key in entries:
+                if total <= self.max_size:
+                    break
+                self.delete(key)
+                total -= size
+            with self._lock:
+                self._size = total
+                self._scanned_at = self.clock()
@@ -0,0 +1,139 @@
+import struct
+
+
+# Give up when the dimensions are not found in the first bytes of the image.
+DEFAULT_MAX_BYTES = 256 * 2 ** 10
+
+# JPEG markers without a length.
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+# JPEG start of frame markers (DHT, JPG and DAC excluded).
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class ImageInfoParser:
+    """Read the format and dimensions of an image from its first bytes.
+
+    The bytes are fed as they come (e.g. while they are uploaded) and only
+    the header is kept in memory: the JPEG segments before the frame header,
+    such as EXIF blobs, are skipped without being buffered.
+    Support PNG, GIF, JPEG and WebP.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.reset()
+
+    def reset(self):
+        """Forget the bytes fed, to parse the image again from its first byte."""
+        self.format = None
+        self.width = None
+        self.height = None
+        self.done = False
+        self._buffer = bytearray()
+        self._fed = 0
+        self._skip = 0
+
+    @property
+    def info(self):
+        """``{"format", "width", "height"}``, or None if the header was not understood."""
+        if self.width is None:
+            return None
+        return {"format": self.format, "width": self.width, "height": self.height}
+
+    def feed(self, data):
+        if self.done:
+            return
+        self._fed += len(data)
+        if self._skip >= len(data):
+            self._skip -= len(data)
+        else:
+            self._buffer += data[self._skip:]
+            self._skip = 0
+            self._parse()
+        if not self.done and self._fed >= self.max_bytes:
+            self.done = True
+            self._buffer = bytearray()
+
+    def _found(self, width, height):
+        self.width, self.height = width, height
+        self.done = True
+        self._buffer = bytearray()
+
+    def _parse(self):
+        buf = self._buffer
+        if self.format is None:
+            if buf[:8] == b"\x89PNG\r\n\x1a\n":
+                self.format = "png"
+            elif buf[:6] in (b"GIF87a", b"GIF89a"):
+                self.format = "gif"
+            elif buf[:2] == b"\xff\xd8":
+                self.format = "jpeg"
+                del buf[:2]
+            elif buf[:4] == b"RIFF" and buf[8:12] == b"WEBP":
+                self.format = "webp"
+            elif len(buf) >= 12:
+                self.done = True
+                return
+            else:
+                return
+        getattr(self, f"_parse_{self.format}")(buf)
+
+    def _parse_png(self, buf):
+        if len(buf) >= 24:
+            self._found(*struct.unpack(">II", buf[16:24]))
+
+    def _parse_gif(self, buf):
+        if len(buf) >= 10:
+            self._found(*struct.unpack("<HH", buf[6:10]))
+
+    def _parse_webp(self, buf):
+        if len(buf) < 30:
+            return
+        chunk = bytes(buf[12:16])
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", buf[26:30])
+            self._found(width & 0x3FFF, height & 0x3FFF)
+        elif chunk == b"VP8L":
+            bits, = struct.unpack("<I", buf[21:25])
+            self._found((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+        elif chunk == b"VP8X":
+            self._found(1 + int.from_bytes(buf[24:27], "little"), 1 + int.from_bytes(buf[27:30], "little"))
+        else:
+            self.done = True
+
+    def _parse_jpeg(self, buf):
+        while len(buf) >= 2:
+            if buf[0] != 0xFF:
+                # Not a marker: corrupted or unsupported file.
+                self.done = True
+                return
+            marker = buf[1]
+            if marker == 0xFF:
+                # Fill byte.
+                del buf[0]
+                continue
+            if marker in JPEG_STANDALONE_MARKERS:
+                del buf[:2]
+                continue
+            if len(buf) < 4:
+                return
+            length, = struct.unpack(">H", buf[2:4])
+            if marker in JPEG_SOF_MARKERS:
+                if len(buf) >= 9:
+                    height, width = struct.unpack(">HH", buf[5:9])
+                    self._found(width, height)
+                return
+            # Skip the segment, even the part not received yet.
+            size = 2 + length
+            if size > len(buf):
+                self._skip = size - len(buf)
+                del buf[:]
+                return
+            del buf[:size]
+
+
+def image_info(data, max_bytes=DEFAULT_MAX_BYTES):
+    """Format and dimensions of the image whose first bytes are ``data``."""
+    parser = ImageInfoParser(max_bytes=max_bytes)
+    parser.feed(data[:max_bytes])
+    return parser.info
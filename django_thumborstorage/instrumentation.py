@@ -0,0 +1,113 @@
+"""Ready-made receivers of ``signals.request_started`` and ``signals.request_finished``.
+
+Connect them once, e.g. in ``AppConfig.ready()``::
+
+    from django_thumborstorage.instrumentation import PrometheusMetrics, OpenTelemetryTracing
+
+    PrometheusMetrics().connect()
+    OpenTelemetryTracing().connect()
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import signals
+
+# Buckets of the duration histogram, in seconds.
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+
+class Instrumentation:
+    """Base receiver: subclasses override ``request_started`` and/or ``request_finished``."""
+
+    def connect(self):
+        signals.request_started.connect(self.request_started, dispatch_uid=id(self), weak=False)
+        signals.request_finished.connect(self.request_finished, dispatch_uid=id(self), weak=False)
+        return self
+
+    def disconnect(self):
+        signals.request_started.disconnect(dispatch_uid=id(self))
+        signals.request_finished.disconnect(dispatch_uid=id(self))
+
+    def request_started(self, sender, **kwargs):
+        pass
+
+    def request_finished(self, sender, **kwargs):
+        pass
+
+
+class PrometheusMetrics(Instrumentation):
+    """Count the requests and bytes and observe their duration with ``prometheus_client``.
+
+    Metrics, labelled by ``operation`` (and ``status`` for the requests):
+    ``<namespace>_requests_total``, ``<namespace>_request_duration_seconds``,
+    ``<namespace>_sent_bytes_total`` and ``<namespace>_received_bytes_total``.
+    A failed request has the status ``error``.
+    """
+
+    def __init__(self, namespace="thumbor_storage", registry=None, buckets=DEFAULT_BUCKETS):
+        try:
+            from prometheus_client import Counter, Histogram
+        except ImportError:
+            raise ImproperlyConfigured("PrometheusMetrics requires prometheus_client: "
+                                       "pip install prometheus-client")
+        # prometheus_client registers in its default registry unless told otherwise.
+        options = {} if registry is None else {"registry": registry}
+        self.requests = Counter(f"{namespace}_requests", "Requests to the Thumbor server.",
+                                ["operation", "status"], **options)
+        self.duration = Histogram(f"{namespace}_request_duration_seconds",
+                                  "Duration of the requests to the Thumbor server.",
+                                  ["operation"], buckets=buckets, **options)
+        self.sent = Counter(f"{namespace}_sent_bytes", "Bytes sent to the Thumbor server.",
+                            ["operation"], **options)
+        self.received = Counter(f"{namespace}_received_bytes", "Bytes received from the Thumbor server.",
+                                ["operation"], **options)
+
+    def request_finished(self, sender, operation, status, duration, bytes_sent, bytes_received,
+                         exception, **kwargs):
+        self.requests.labels(operation, "error" if exception is not None else str(status)).inc()
+        self.duration.labels(operation).observe(duration)
+        if bytes_sent:
+            self.sent.labels(operation).inc(bytes_sent)
+        if bytes_received:
+            self.received.labels(operation).inc(bytes_received)
+
+
+class OpenTelemetryTracing(Instrumentation):
+    """Record a client span per request with ``opentelemetry-api``.
+
+    The spans are named ``thumbor <operation>`` and carry the method, url,
+    status, Thumbor key and sizes as attributes.
+    """
+
+    def __init__(self, tracer_provider=None):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImproperlyConfigured("OpenTelemetryTracing requires opentelemetry-api: "
+                                       "pip install opentelemetry-api")
+        self.trace = trace
+        self.tracer = trace.get_tracer("django_thumborstorage", tracer_provider=tracer_provider)
+
+    def request_started(self, sender, operation, method, url, key, context, **kwargs):
+        attributes = {"http.request.method": method, "url.full": url, "thumbor.operation": operation}
+        if key:
+            attributes["thumbor.key"] = key
+        context["span"] = self.tracer.start_span(f"thumbor {operation}", kind=self.trace.SpanKind.CLIENT,
+                                                 attributes=attributes)
+
+    def request_finished(self, sender, context, status, bytes_sent, bytes_received, exception, **kwargs):
+        span = context.pop("span", None)
+        if span is None:
+            return
+        if status is not None:
+            span.set_attribute("http.response.status_code", status)
+        if bytes_sent is not None:
+            span.set_attribute("http.request.body.size", bytes_sent)
+        if bytes_received is not None:
+            span.set_attribute("http.response.body.size", bytes_received)
+        if exception is not None:
+            span.record_exception(exception)
+            span.set_status(self.trace.Status(self.trace.StatusCode.ERROR, repr(exception)))
+        elif status is not None and status >= 500:
+            span.set_status(self.trace.Status(self.trace.StatusCode.ERROR))
+        span.end()
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_thumborstorage import bulk
+from django_thumborstorage.dedupe import original_digest
+from django_thumborstorage.fields import field_names, thumbor_file_fields
+from django_thumborstorage.migration import field_label
+from django_thumborstorage.storages import thumbor_key
+
+
+class Command(BaseCommand):
+    help = ("Hash the Thumbor originals referenced by the file fields using a ThumborStorage with "
+            "THUMBOR_DEDUPE and record them in its index, so that new uploads of the same "
+            "images are deduplicated.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("fields", nargs="*", metavar="app_label.Model.field",
+                            help="Only index these fields (default: all of them).")
+        parser.add_argument("--force", action="store_true",
+                            help="Hash the originals already in the index again.")
+        parser.add_argument("--workers", type=int, default=bulk.DEFAULT_MAX_WORKERS,
+                            help="Number of concurrent downloads.")
+
+    def handle(self, *args, **options):
+        fields = [(model, field) for model, field in thumbor_file_fields()
+                  if not options["fields"] or field_label(model, field) in options["fields"]]
+        unknown = set(options["fields"]) - {field_label(model, field) for model, field in fields}
+        if unknown:
+            raise CommandError(f"Not a field using a ThumborStorage: {', '.join(sorted(unknown))}")
+        without_index = [field_label(model, field) for model, field in fields if field.storage.dedupe_index is None]
+        if options["fields"] and without_index:
+            raise CommandError(f"THUMBOR_DEDUPE is not set for: {', '.join(without_index)}")
+        self.indexed = self.failed = 0
+        # The same original may be referenced by several rows or fields.
+        seen = set()
+        for model, field in fields:
+            if field.storage.dedupe_index is not None:
+                self.index_field(model, field, seen, options)
+        self.stdout.write(f"{self.indexed} original(s) indexed, {self.failed} failed.")
+
+    def index_field(self, model, field, seen, options):
+        storage = field.storage
+        index = storage.dedupe_index
+
+        def names():
+            for name in field_names(model, field):
+                key = thumbor_key(name)
+                if key is None or (index, key) in seen:
+                    continue
+                seen.add((index, key))
+                if options["force"] or index.digest(key) is None:
+                    yield name
+
+        for result in bulk.run(lambda name: original_digest(storage, name), names(),
+                               max_workers=options["workers"]):
+            if result.ok:
+                index.set(result.value, thumbor_key(result.name))
+                self.indexed += 1
+            else:
+                self.failed += 1
+                self.stderr.write(f"{field_label(model, field)} {result.name}: {result.error!r}")
@@ -0,0 +1,82 @@
+import re
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_thumborstorage import bulk
+from django_thumborstorage.fields import field_names, thumbor_file_fields
+from django_thumborstorage.storages import ThumborStorage, thumbor_key
+
+KEY_RE = re.compile(r"^\w{32}$")
+
+
+def read_keys(lines):
+    """Thumbor keys from lines holding a key or a name such as 'image/<key>/people/photo.jpg'."""
+    keys = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key = line if KEY_RE.match(line) else thumbor_key(line)
+        if key is None:
+            raise CommandError(f"Not a Thumbor key or name: {line!r}")
+        keys.add(key)
+    return keys
+
+
+class Command(BaseCommand):
+    help = ("Delete the Thumbor originals that are no longer referenced by any file field "
+            "using a ThumborStorage. Thumbor cannot list its originals so the candidate keys "
+            "are read from a file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("keys_file", help="File with one Thumbor key or name per line ('-' for stdin).")
+        parser.add_argument("--dry-run", action="store_true", help="List the orphans without deleting them.")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--workers", type=int, default=bulk.DEFAULT_MAX_WORKERS,
+                            help="Number of concurrent DELETE requests.")
+        parser.add_argument("--rate", type=float, default=0,
+                            help="Maximum number of deletions per second (0: unlimited).")
+
+    def handle(self, *args, **options):
+        if options["keys_file"] == "-":
+            candidates = read_keys(sys.stdin)
+        else:
+            with open(options["keys_file"]) as f:
+                candidates = read_keys(f)
+        self.stdout.write(f"{len(candidates)} candidate key(s).")
+
+        storage = None
+        for model, field in thumbor_file_fields():
+            storage = storage or field.storage
+            for name in field_names(model, field):
+                candidates.discard(thumbor_key(name))
+        orphans = sorted(candidates)
+        self.stdout.write(f"{len(orphans)} orphan(s).")
+
+        if options["dry_run"]:
+            for key in orphans:
+                self.stdout.write(key)
+            return
+
+        storage = storage or ThumborStorage()
+        deleted = missing = failed = 0
+        started = time.monotonic()
+        for batch in bulk.batches(orphans, options["batch_size"]):
+            for result in storage.delete_many([f"image/{key}" for key in batch],
+                                              max_workers=options["workers"], force=True):
+                if not result.ok:
+                    failed += 1
+                    self.stderr.write(f"{result.name}: {result.error!r}")
+                elif result.value:
+                    deleted += 1
+                else:
+                    missing += 1
+            if options["rate"]:
+                # Wait until the number of deletions fits in the rate.
+                delay = (deleted + missing + failed) / options["rate"] - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            self.stdout.write(f"{deleted + missing + failed}/{len(orphans)} processed.")
+        self.stdout.write(f"{deleted} deleted, {missing} already missing, {failed} failed.")
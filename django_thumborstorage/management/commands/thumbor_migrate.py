@@ -0,0 +1,85 @@
+import time
+from collections import deque
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_thumborstorage import bulk
+from django_thumborstorage.fields import thumbor_file_fields
+from django_thumborstorage.migration import (Checkpoint, RateLimiter, field_label, migrate_file,
+                                             pending_rows, rename_rows)
+from django_thumborstorage.storages import ThumborMigrationStorage
+
+
+class Command(BaseCommand):
+    help = ("Move the images of the file fields using a ThumborMigrationStorage from the file "
+            "system to Thumbor and store their new names. The files are left on the file system.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("fields", nargs="*", metavar="app_label.Model.field",
+                            help="Only migrate these fields (default: all of them).")
+        parser.add_argument("--dry-run", action="store_true", help="Count the images to migrate.")
+        parser.add_argument("--checkpoint",
+                            help="JSON file recording the progress, to resume an interrupted migration.")
+        parser.add_argument("--batch-size", type=int, default=100,
+                            help="Number of rows updated per query.")
+        parser.add_argument("--workers", type=int, default=bulk.DEFAULT_MAX_WORKERS,
+                            help="Number of concurrent uploads.")
+        parser.add_argument("--rate", type=float, default=0,
+                            help="Maximum number of uploads per second (0: unlimited).")
+
+    def handle(self, *args, **options):
+        fields = [(model, field) for model, field in thumbor_file_fields(ThumborMigrationStorage)
+                  if not options["fields"] or field_label(model, field) in options["fields"]]
+        unknown = set(options["fields"]) - {field_label(model, field) for model, field in fields}
+        if unknown:
+            raise CommandError(f"Not a field using a ThumborMigrationStorage: {', '.join(sorted(unknown))}")
+        checkpoint = Checkpoint(options["checkpoint"])
+        # Shared by the workers: every upload waits for its turn.
+        self.limiter = RateLimiter(options["rate"])
+        self.migrated = self.failed = self.changed = self.uploaded = 0
+        self.started = time.monotonic()
+        for model, field in fields:
+            self.migrate_field(model, field, checkpoint, options)
+        self.stdout.write(f"{self.migrated} migrated, {self.failed} failed.")
+        if self.changed:
+            self.stdout.write(f"{self.changed} row(s) saved meanwhile, left as they are.")
+
+    def migrate_field(self, model, field, checkpoint, options):
+        label = field_label(model, field)
+        rows = pending_rows(model, field, field.storage, after=checkpoint.get(label))
+        if options["dry_run"]:
+            self.stdout.write(f"{label}: {sum(1 for row in rows)} image(s) to migrate.")
+            return
+
+        pks = deque()
+
+        def names():
+            for pk, name in rows:
+                pks.append(pk)
+                yield name
+
+        def upload(name):
+            self.limiter.wait()
+            return migrate_file(field.storage, name)
+
+        # One pool of uploads for the whole field; the results come in the order of the rows.
+        results = ((pks.popleft(), result) for result in
+                   bulk.run(upload, names(), max_workers=options["workers"]))
+        processed = 0
+        for batch in bulk.batches(results, options["batch_size"]):
+            renames = []
+            for pk, result in batch:
+                if result.ok:
+                    renames.append((pk, result.name, result.value))
+                else:
+                    self.failed += 1
+                    self.stderr.write(f"{label} {result.name}: {result.error!r}")
+            renamed = rename_rows(model, field, renames) if renames else 0
+            self.migrated += renamed
+            self.changed += len(renames) - renamed
+            # The failed rows keep their name: run again without checkpoint to retry them.
+            checkpoint.set(label, batch[-1][0])
+            processed += len(batch)
+            self.uploaded += len(batch)
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(f"{label}: {processed} processed, {self.uploaded / elapsed:.1f} upload(s)/s.")
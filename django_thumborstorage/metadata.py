@@ -0,0 +1,125 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+DEFAULT_MAX_ENTRIES = 1024
+# Seconds an original is remembered as missing.
+DEFAULT_NEGATIVE_TIMEOUT = 60
+# Seconds an original is remembered in process when the metadata is shared, so
+# that its deletion by another process is seen.
+DEFAULT_LOCAL_TIMEOUT = 5
+
+
+class MetadataCache:
+    """In-process LRU of the originals metadata (size, content type...), keyed by Thumbor key.
+
+    An original never changes once posted so the entries never expire unless
+    given a ``timeout``; they are evicted when the cache is full or when the
+    image is deleted. An original known to be missing (``exists=False``) is
+    forgotten after ``negative_timeout`` seconds, as it may be posted by
+    another server later.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, negative_timeout=DEFAULT_NEGATIVE_TIMEOUT,
+                 timeout=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.negative_timeout = negative_timeout
+        self.timeout = timeout
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._expiries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if key in self._expiries and self.clock() >= self._expiries[key]:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry)
+
+    def update(self, key, **values):
+        with self._lock:
+            entry = self._entries.pop(key, {})
+            entry.update(values)
+            self._entries[key] = entry
+            self._expiries.pop(key, None)
+            timeout = self.negative_timeout if entry.get("exists") is False else self.timeout
+            if timeout is not None:
+                self._expiries[key] = self.clock() + timeout
+            while len(self._entries) > self.max_entries:
+                self._expiries.pop(self._entries.popitem(last=False)[0], None)
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._expiries.clear()
+
+    def _pop(self, key):
+        self._entries.pop(key, None)
+        self._expiries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedMetadataCache:
+    """A ``MetadataCache`` backed by a Django cache, ``alias``, shared by all the processes.
+
+    The entries missing in process are read from the Django cache, and the
+    updates and deletions are written to both. The originals are kept for
+    ``timeout`` seconds (None for ever) and the missing ones for
+    ``negative_timeout`` seconds. ``local`` should expire its entries quickly:
+    a deletion by another process is only seen once they are forgotten.
+    ``clear()`` only empties the process.
+    """
+
+    def __init__(self, local, alias="default", timeout=None, negative_timeout=DEFAULT_NEGATIVE_TIMEOUT,
+                 prefix="thumbor-metadata"):
+        self.local = local
+        self.alias = alias
+        self.timeout = timeout
+        self.negative_timeout = negative_timeout
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def cache_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self.cache.get(self.cache_key(key))
+            if entry is not None:
+                self.local.update(key, **entry)
+        return entry
+
+    def update(self, key, **values):
+        entry = dict(self.get(key) or {}, **values)
+        self.local.update(key, **entry)
+        timeout = self.negative_timeout if entry.get("exists") is False else self.timeout
+        self.cache.set(self.cache_key(key), entry, timeout)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.cache.delete(self.cache_key(key))
+
+    def clear(self):
+        self.local.clear()
+
+    def __len__(self):
+        return len(self.local)
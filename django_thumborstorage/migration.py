@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.files.images import ImageFile
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+
+from .exceptions import DjangoThumborStorageException
+from .fields import thumbor_file_fields
+
+logger = logging.getLogger("django_thumborstorage")
+
+DEFAULT_READ_MIGRATION_RATE = 1
+DEFAULT_READ_MIGRATION_QUEUE_SIZE = 1000
+
+
+def migrate_file(storage, name):
+    """Upload the file ``name`` of the file system of a ``ThumborMigrationStorage`` to Thumbor.
+
+    Return the new name of the image. The file itself is left on the file system.
+    """
+    # Not storage.open(), which would queue the file for a migration on read.
+    with ImageFile(FileSystemStorage._open(storage, name, "rb")) as content:
+        return storage.save(name, content)
+
+
+def pending_rows(model, field, storage, after=None, chunk_size=2000):
+    """Yield ``(pk, name)`` of the rows of ``model`` whose ``field`` is not on Thumbor yet.
+
+    The rows come in primary key order, from the one after ``after``.
+    """
+    queryset = model._default_manager.exclude(**{field.attname: ""}).exclude(**{field.attname: None})
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    rows = queryset.order_by("pk").values_list("pk", field.attname).iterator(chunk_size=chunk_size)
+    for pk, name in rows:
+        if not storage.is_thumbor(name):
+            yield pk, name
+
+
+def rename_rows(model, field, renames):
+    """Store the new names of ``renames``, a list of ``(pk, name, new_name)``, in a transaction.
+
+    A row is renamed only if it still holds ``name``: one saved meanwhile keeps
+    its new file. Return the number of rows renamed.
+    """
+    manager = model._default_manager
+    updated = 0
+    with transaction.atomic(using=manager.db):
+        for pk, name, new_name in renames:
+            updated += manager.filter(**{"pk": pk, field.attname: name}).update(**{field.attname: new_name})
+    return updated
+
+
+def field_label(model, field):
+    return f"{model._meta.label}.{field.name}"
+
+
+class Checkpoint:
+    """The last primary key migrated per field, saved in a JSON file to resume a migration."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.positions = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.positions = json.load(f)
+
+    def get(self, label):
+        return self.positions.get(label)
+
+    def set(self, label, pk):
+        self.positions[label] = pk
+        if not self.path:
+            return
+        # Write then rename, so an interrupted migration never leaves a truncated checkpoint.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.positions, f, default=str)
+        os.replace(tmp_path, self.path)
+
+
+def storage_fields(storage):
+    """``(model, field)`` of the file fields stored with ``storage``."""
+    return [(model, field) for model, field in thumbor_file_fields() if field.storage is storage]
+
+
+def rename_file(fields, name, new_name):
+    """Replace ``name`` by ``new_name`` in every row of ``fields``; return the number of rows updated."""
+    updated = 0
+    for model, field in fields:
+        updated += model._default_manager.filter(**{field.attname: name}).update(**{field.attname: new_name})
+    return updated
+
+
+class RateLimiter:
+    """Space the calls of ``wait()`` by ``1 / rate`` seconds, across threads (``rate`` 0: unlimited)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def wait(self):
+        """Sleep until the next call fits in the rate."""
+        if not self.rate:
+            return
+        with self._lock:
+            slot = max(self._next, time.monotonic())
+            self._next = slot + 1 / self.rate
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ReadMigrator:
+    """Move the file system images of a ``ThumborMigrationStorage`` to Thumbor as they are read.
+
+    ``enqueue()`` is called on every read of a file system image and returns
+    right away: a thread of the process uploads the images of the queue to
+    Thumbor, at most ``rate`` per second, then rewrites their name in the rows
+    of the fields using the storage. A name is not queued again while it
+    waits, and dropped when ``max_queue`` names are already waiting. An image
+    no row references is not uploaded. The last ``max_queue`` names that could
+    not be migrated are not queued again.
+    """
+
+    def __init__(self, storage, rate=DEFAULT_READ_MIGRATION_RATE, max_queue=DEFAULT_READ_MIGRATION_QUEUE_SIZE):
+        self.storage = storage
+        self.rate = rate
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._queued = set()
+        self._skipped = OrderedDict()
+        self._limiter = RateLimiter(rate)
+
+    def enqueue(self, name):
+        """Queue the migration of ``name``; False if it is already queued or the queue is full."""
+        self._start()
+        with self._lock:
+            if name in self._queued or name in self._skipped:
+                return False
+            self._queued.add(name)
+        try:
+            self._queue.put_nowait(name)
+        except queue.Full:
+            with self._lock:
+                self._queued.discard(name)
+            return False
+        return True
+
+    def migrate(self, name):
+        """Upload ``name`` and rename it in the rows referencing it; return its new name."""
+        fields = [(model, field) for model, field in storage_fields(self.storage)
+                  if model._default_manager.filter(**{field.attname: name}).exists()]
+        if not fields:
+            return None
+        new_name = migrate_file(self.storage, name)
+        rename_file(fields, name, new_name)
+        return new_name
+
+    def wait(self):
+        """Sleep until the next upload fits in the rate."""
+        self._limiter.wait()
+
+    def join(self):
+        """Block until every queued name is processed."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def run(self):
+        while True:
+            name = self._queue.get()
+            new_name = None
+            try:
+                self.wait()
+                close_old_connections()
+                new_name = self.migrate(name)
+                if new_name:
+                    logger.info("Migrated %s to %s on read.", name, new_name)
+            except (Exception, DjangoThumborStorageException):
+                logger.warning("Could not migrate %s on read.", name, exc_info=True)
+            finally:
+                close_old_connections()
+                self._done(name, new_name)
+                self._queue.task_done()
+
+    def _done(self, name, new_name):
+        with self._lock:
+            self._queued.discard(name)
+            if new_name:
+                return
+            # Not retried while among the last max_queue ones.
+            self._skipped[name] = None
+            if len(self._skipped) > self.max_queue:
+                self._skipped.popitem(last=False)
+
+    def _start(self):
+        # The thread does not survive a fork: start one per process.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._queued = set()
+            self._skipped = OrderedDict()
+            threading.Thread(target=self.run, name="thumbor-read-migration", daemon=True).start()
+            self._pid = os.getpid()
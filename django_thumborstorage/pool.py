@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from . import deadlines, resilience, signals
+
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+
+class ConnectionPool:
+    """A keep-alive HTTP session shared by every call to the Thumbor server.
+
+    The underlying ``requests.Session`` is created lazily and re-created in a
+    forked child so that sockets are never shared between processes.
+
+    ``retries`` and ``circuit_breaker`` are the keyword arguments of a
+    ``resilience.RetryPolicy`` and of the ``resilience.CircuitBreaker`` created
+    per host; None disables them. ``timeouts`` overrides the timeouts per
+    operation of ``deadlines.DEFAULT_TIMEOUTS``.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False, keep_alive=True,
+                 retries=None, circuit_breaker=None, timeouts=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.retry_policy = resilience.RetryPolicy(**dict(retries)) if retries else None
+        self.circuit_breakers = resilience.CircuitBreakers(**dict(circuit_breaker)) if circuit_breaker else None
+        self.timeouts = deadlines.Timeouts(timeouts)
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self._requests = 0
+        # Hosts answering 405/501 to HEAD requests.
+        self.head_unsupported = set()
+
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._new_session()
+                    self._pid = os.getpid()
+                    self._requests = 0
+        return self._session
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def request(self, method, url, operation=None, **kwargs):
+        """Send a request; ``operation`` names it in the ``signals`` (default: the method).
+
+        Retry it according to ``retry_policy`` and raise ``CircuitOpenException``
+        without sending it while the circuit breaker of the host is open. The
+        timeout of the operation is capped by the current deadline, if any.
+        """
+        session = self.session
+        breaker = self.circuit_breakers and self.circuit_breakers.get(url)
+        policy = self.retry_policy
+        if "timeout" in kwargs:
+            timeout = deadlines.connect_read(kwargs.pop("timeout"))
+        else:
+            timeout = self.timeouts.get(operation or method.lower())
+        attempt = 0
+        while True:
+            kwargs["timeout"] = deadlines.bounded(timeout)
+            if breaker is not None:
+                breaker.before_request()
+            self._requests += 1
+            try:
+                with signals.RoundTrip(operation, method, url, kwargs) as trip:
+                    trip.response = getattr(session, method.lower())(url, **kwargs)
+            except BaseException as e:
+                if breaker is not None:
+                    # Even a cancelled probe must not leave the breaker half-open.
+                    breaker.record(isinstance(e, Exception) and not isinstance(e, resilience.TRANSIENT_ERRORS))
+                if (policy is None or not policy.retry_exception(method, e, attempt)
+                        or not resilience.rewind_body(kwargs)):
+                    raise
+            else:
+                response = trip.response
+                if breaker is not None:
+                    breaker.record(response.status_code < 500)
+                if policy is None or not policy.retry_status(method, response.status_code, attempt):
+                    return response
+                response.close()
+            time.sleep(deadlines.sleep_time(policy.delay(attempt)))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def reset(self):
+        """Drop the current session. Called in forked children and on demand."""
+        with self._lock:
+            session, pid = self._session, self._pid
+            self._session, self._pid = None, None
+            self._requests = 0
+        # Never close the parent's sockets from a child process.
+        if session is not None and pid == os.getpid():
+            session.close()
+
+    def stats(self):
+        connections = 0
+        hosts = []
+        session = self._session
+        if session is not None and self._pid == os.getpid():
+            for adapter in set(session.adapters.values()):
+                manager = adapter.poolmanager
+                for key in manager.pools.keys():
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+                    hosts.append(f"{pool.scheme}://{pool.host}:{pool.port}")
+                    connections += pool.num_connections
+        requests_count = self._requests if self._pid == os.getpid() else 0
+        return {
+            "pid": os.getpid(),
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "keep_alive": self.keep_alive,
+            "hosts": hosts,
+            "requests": requests_count,
+            "connections": connections,
+            "reused": max(requests_count - connections, 0),
+            "circuit_breakers": self.circuit_breakers.states() if self.circuit_breakers else {},
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+             pool_block=False, keep_alive=True, retries=None, circuit_breaker=None, timeouts=None):
+    """Return the process-wide pool for that configuration."""
+    config = (pool_connections, pool_maxsize, pool_block, keep_alive,
+              resilience.freeze(retries), resilience.freeze(circuit_breaker), resilience.freeze(timeouts))
+    pool = _pools.get(config)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(config, ConnectionPool(*config))
+    return pool
+
+
+def _reset_after_fork():
+    for pool in list(_pools.values()):
+        pool._lock = threading.Lock()
+        pool._session = None
+        pool._pid = None
+        pool._requests = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
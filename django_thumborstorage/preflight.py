@@ -0,0 +1,169 @@
+import multiprocessing
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+
+from . import exceptions, imageinfo
+
+# The formats re-encoded by the normalization, as named by ``imageinfo``.
+NORMALIZED_FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+DEFAULT_QUALITY = 85
+LIMITS = ("max_size", "min_width", "min_height", "max_width", "max_height", "max_pixels", "formats")
+
+
+def seekable(content):
+    return getattr(content, "seekable", None) is not None and content.seekable()
+
+
+def read_info(content, max_bytes=imageinfo.DEFAULT_MAX_BYTES):
+    """Format and dimensions of ``content`` read from its header, which is rewound."""
+    parser = imageinfo.ImageInfoParser(max_bytes=max_bytes)
+    for chunk in content.chunks():
+        parser.feed(chunk)
+        if parser.done:
+            break
+    content.seek(0)
+    return parser.info
+
+
+def validate(content, info, limits):
+    """Raise ``ImageValidationException`` if ``content`` is out of ``limits``.
+
+    ``info`` is the header of ``content`` (see ``read_info()``), None when it
+    is not understood or could not be read.
+    """
+    unknown = set(limits) - set(LIMITS)
+    if unknown:
+        raise ImproperlyConfigured(f"Unknown upload limit(s): {', '.join(sorted(unknown))}.")
+    size = getattr(content, "size", None)
+    if limits.get("max_size") and size is not None and size > limits["max_size"]:
+        raise exceptions.ImageValidationException(f"The image is {size} bytes, the maximum is {limits['max_size']}.")
+    if not any(limits.get(name) for name in LIMITS[1:]):
+        return
+    if info is None:
+        raise exceptions.ImageValidationException("Not a supported image.")
+    if limits.get("formats") and info["format"] not in limits["formats"]:
+        raise exceptions.ImageValidationException(f"The {info['format']} format is not allowed.")
+    width, height = info["width"], info["height"]
+    if width < (limits.get("min_width") or 0) or height < (limits.get("min_height") or 0):
+        raise exceptions.ImageValidationException(f"The image is too small ({width}x{height}).")
+    if ((limits.get("max_width") and width > limits["max_width"])
+            or (limits.get("max_height") and height > limits["max_height"])
+            or (limits.get("max_pixels") and width * height > limits["max_pixels"])):
+        raise exceptions.ImageValidationException(f"The image is too large ({width}x{height}).")
+
+
+def reencode(source, image_format, max_edge=None, strip_metadata=False, quality=DEFAULT_QUALITY):
+    """Downscale the image ``source`` to ``max_edge`` pixels and re-encode it; run in a worker process.
+
+    ``source`` is the image data or the path of its file. The EXIF
+    orientation is applied to the pixels first. The color profile is kept,
+    the EXIF metadata only without ``strip_metadata`` and the others (XMP,
+    comments...) are dropped. None for an animation, to be left as is.
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+    if getattr(image, "n_frames", 1) > 1:
+        return None
+    exif = image.info.get("exif")
+    icc_profile = image.info.get("icc_profile")
+    image = ImageOps.exif_transpose(image)
+    if max_edge and max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    options = {}
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    if exif and not strip_metadata:
+        # Without the orientation, already applied.
+        options["exif"] = image.getexif().tobytes()
+    if image_format in ("JPEG", "WEBP"):
+        options["quality"] = quality
+        if image_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+    output = BytesIO()
+    image.save(output, format=image_format, **options)
+    return output.getvalue()
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(max_workers=None):
+    """The process pool of the normalizations, per process and ``max_workers``.
+
+    The workers are not forked from the web process, whose other threads
+    (health checks, migrations...) may hold locks at the time of the fork.
+    """
+    key = (os.getpid(), max_workers)
+    executor = _executors.get(key)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(key)
+            if executor is None:
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                executor = _executors[key] = ProcessPoolExecutor(
+                    max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+    return executor
+
+
+def normalize(content, info, max_edge=None, strip_metadata=False, quality=DEFAULT_QUALITY, processes=None):
+    """``content`` downscaled to ``max_edge`` and re-encoded in a process pool, if needed.
+
+    An image already small enough is left as is unless ``strip_metadata``.
+    The image is re-encoded in its own format, and only JPEG, PNG and WebP
+    are. ``processes`` is the size of the pool; 0 re-encodes in the calling
+    thread. An upload on disk (``TemporaryUploadedFile``) is read from its
+    path by the worker, the others are sent to it in memory.
+    """
+    if info is None or info["format"] not in NORMALIZED_FORMATS:
+        return content
+    if not strip_metadata and (not max_edge or max(info["width"], info["height"]) <= max_edge):
+        return content
+    if hasattr(content, "temporary_file_path"):
+        source = content.temporary_file_path()
+    else:
+        content.seek(0)
+        source = content.read()
+        content.seek(0)
+    args = (source, NORMALIZED_FORMATS[info["format"]], max_edge, strip_metadata, quality)
+    if processes == 0:
+        data = reencode(*args)
+    else:
+        data = get_executor(processes).submit(reencode, *args).result()
+    if data is None:
+        return content
+    return ContentFile(data, name=content.name)
+
+
+def check_normalization():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured("The normalization of the uploads requires Pillow: "
+                                   "pip install django-thumborstorage[normalize]")
+
+
+def prepare(content, limits=None, normalization=None):
+    """Validate ``content`` against ``limits`` and normalize it; return what to upload.
+
+    Only the size of an upload which cannot be read twice is checked, and it
+    is not normalized.
+    """
+    if not seekable(content):
+        if limits:
+            validate(content, None, {"max_size": limits.get("max_size")})
+        return content
+    info = read_info(content)
+    if limits:
+        validate(content, info, limits)
+    if normalization:
+        check_normalization()
+        content = normalize(content, info, **normalization)
+    return content
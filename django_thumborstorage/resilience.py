@@ -0,0 +1,174 @@
+import random
+import threading
+import time
+
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+
+from urllib3.exceptions import NewConnectionError
+
+from . import exceptions
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+# The request surely did not reach the server: safe to retry even a POST.
+# A requests.ConnectionError also wraps a connection lost after the body was
+# sent, see connection_failed().
+CONNECTION_ERRORS = (requests.ConnectTimeout,)
+# The request may have reached the server: only an idempotent request is retried.
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout)
+if httpx is not None:
+    CONNECTION_ERRORS += (httpx.ConnectError, httpx.ConnectTimeout)
+    TRANSIENT_ERRORS += (httpx.TransportError,)
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "DELETE"])
+DEFAULT_RETRY_STATUSES = (502, 503, 504)
+
+
+class RetryPolicy:
+    """When and after how long to send a failed request again.
+
+    GET, HEAD and DELETE are retried after a transient error or a ``statuses``
+    response; a POST only when the connection could not be established, as
+    Thumbor would store the same image twice. The delays grow exponentially from ``backoff`` up to
+    ``max_backoff`` seconds, with full jitter so that the workers do not retry
+    all together.
+    """
+
+    def __init__(self, total=2, backoff=0.1, max_backoff=2.0, statuses=DEFAULT_RETRY_STATUSES):
+        self.total = total
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+
+    def retry_exception(self, method, exception, attempt):
+        if attempt >= self.total:
+            return False
+        if method.upper() in IDEMPOTENT_METHODS:
+            return isinstance(exception, TRANSIENT_ERRORS)
+        return connection_failed(exception)
+
+    def retry_status(self, method, status, attempt):
+        return attempt < self.total and method.upper() in IDEMPOTENT_METHODS and status in self.statuses
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+def connection_failed(exception):
+    """True if ``exception`` tells that the request surely did not reach the server."""
+    if isinstance(exception, CONNECTION_ERRORS):
+        return True
+    if isinstance(exception, requests.ConnectionError) and exception.args:
+        # requests wraps the urllib3 error in a MaxRetryError.
+        reason = getattr(exception.args[0], "reason", exception.args[0])
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+def rewind_body(kwargs):
+    """Make the body of a request ready to be sent again; False if it cannot be."""
+    body = kwargs.get("data", kwargs.get("content"))
+    if body is None or isinstance(body, (bytes, str)):
+        return True
+    rewind = getattr(body, "rewind", None)
+    if rewind is None:
+        # A generator is consumed once for all.
+        return False
+    rewind()
+    return True
+
+
+class CircuitBreaker:
+    """Fail fast once a server returns too many errors.
+
+    The breaker opens when at least ``failure_rate`` of the requests of the
+    last ``window`` seconds failed (with ``min_requests`` at least). Then every
+    request raises ``CircuitOpenException`` until ``reset_timeout`` seconds
+    passed: a single request is let through to probe the server, and its
+    success closes the breaker again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_rate=0.5, min_requests=20, window=30, reset_timeout=30, clock=time.monotonic):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Raise ``CircuitOpenException`` if the request must not be sent."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+            raise exceptions.CircuitOpenException(self.state)
+
+    def record(self, success):
+        with self._lock:
+            now = self.clock()
+            if self.state == self.HALF_OPEN:
+                if success:
+                    self._close()
+                else:
+                    self._open(now)
+                return
+            self._outcomes.append((now, success))
+            self._failures += not success
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._failures -= not self._outcomes.popleft()[1]
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_requests
+                    and self._failures >= self.failure_rate * len(self._outcomes)):
+                self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._opened_at = now
+
+    def _close(self):
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+
+
+class CircuitBreakers:
+    """A ``CircuitBreaker`` per host, created with ``config`` on first use."""
+
+    def __init__(self, **config):
+        self.config = config
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        netloc = urlsplit(url).netloc
+        breaker = self._breakers.get(netloc)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(netloc, CircuitBreaker(**self.config))
+        return breaker
+
+    def states(self):
+        return {netloc: breaker.state for netloc, breaker in list(self._breakers.items())}
+
+
+def freeze(config):
+    """A hashable version of a configuration dict, to key the process-wide pools."""
+    if not config:
+        return None
+    return tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                        for name, value in config.items()))
@@ -0,0 +1,92 @@
+import logging
+import re
+import time
+
+from urllib.parse import urlsplit
+
+from django.dispatch import Signal
+
+logger = logging.getLogger("django_thumborstorage")
+
+# Sent before a request to the Thumbor server with the arguments
+# ``operation``, ``method``, ``url``, ``key`` and ``context``.
+request_started = Signal()
+# Sent once the response is received (or the request failed) with the
+# arguments of ``request_started`` plus ``status``, ``bytes_sent``,
+# ``bytes_received``, ``duration`` (in seconds) and ``exception``.
+request_finished = Signal()
+
+URL_KEY_RE = re.compile(r"/image/(?P<key>\w{32})(?:[/.]|$)")
+
+
+def url_key(url):
+    match = URL_KEY_RE.search(urlsplit(url).path)
+    return match and match.group("key")
+
+
+def body_length(kwargs):
+    """Length of the request body, None when it is streamed without a known length."""
+    body = kwargs.get("data", kwargs.get("content"))
+    if body is None:
+        return 0
+    try:
+        return len(body)
+    except TypeError:
+        length = (kwargs.get("headers") or {}).get("Content-Length")
+        return int(length) if length else None
+
+
+def response_length(response, stream):
+    """Length of the response body; from its headers only when it is streamed."""
+    if not stream and isinstance(getattr(response, "content", None), bytes):
+        return len(response.content)
+    headers = getattr(response, "headers", None) or {}
+    length = headers.get("Content-Length")
+    return int(length) if length and str(length).isdigit() else None
+
+
+class RoundTrip:
+    """Send ``request_started`` and ``request_finished`` around a request, if someone listens.
+
+    Usage::
+
+        with RoundTrip("download", "GET", url, kwargs) as trip:
+            trip.response = session.get(url, **kwargs)
+
+    ``context`` is a dict shared by the two signals of a request, for the
+    receivers to keep their state in (e.g. a span).
+    """
+
+    def __init__(self, operation, method, url, kwargs):
+        self.operation = operation or method.lower()
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.response = None
+        self.active = (request_started.has_listeners() or request_finished.has_listeners()
+                       or logger.isEnabledFor(logging.DEBUG))
+
+    def arguments(self):
+        return {"operation": self.operation, "method": self.method, "url": self.url,
+                "key": url_key(self.url), "context": self.context}
+
+    def __enter__(self):
+        if self.active:
+            self.context = {}
+            request_started.send(sender=RoundTrip, **self.arguments())
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.active:
+            return
+        duration = time.perf_counter() - self.started
+        response = self.response
+        status = getattr(response, "status_code", None)
+        bytes_sent = body_length(self.kwargs)
+        bytes_received = None if response is None else response_length(response, self.kwargs.get("stream", False))
+        logger.debug("%s %s %s %s in %.3fs", self.operation, self.method, self.url,
+                     status if exc_value is None else repr(exc_value), duration)
+        request_finished.send(sender=RoundTrip, status=status, bytes_sent=bytes_sent,
+                              bytes_received=bytes_received, duration=duration,
+                              exception=exc_value, **self.arguments())
@@ -0,0 +1,104 @@
+import threading
+
+from collections import OrderedDict
+
+from libthumbor import CryptoURL
+
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def freeze_options(options):
+    """Hashable form of the ``CryptoURL.generate()`` options."""
+    return tuple((name, _freeze(value)) for name, value in sorted(options.items()))
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def image_options(width=0, height=0, smart=False, format=None, quality=None, filters=None,
+                  **options):
+    """``CryptoURL.generate()`` options for a resized / re-encoded image.
+
+    ``format`` and ``quality`` are turned into the matching Thumbor filters.
+    """
+    filters = list(filters or [])
+    if format:
+        filters.append(f"format({format})")
+    if quality:
+        filters.append(f"quality({int(quality)})")
+    if width:
+        options["width"] = int(width)
+    if height:
+        options["height"] = int(height)
+    if smart:
+        options["smart"] = True
+    if filters:
+        options["filters"] = filters
+    return options
+
+
+class URLSigner:
+    """Sign Thumbor urls with a single ``CryptoURL`` and remember the results.
+
+    Signing the same ``(key, options)`` twice returns the cached url without
+    computing the HMAC again.
+    """
+
+    def __init__(self, server, security_key, max_entries=DEFAULT_MAX_ENTRIES):
+        self.server = server
+        self.max_entries = max_entries
+        self._crypto = CryptoURL(key=security_key)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def url(self, key, **options):
+        cache_key = (key, freeze_options(options))
+        with self._lock:
+            url = self._cache.get(cache_key)
+            if url is not None:
+                self._cache.move_to_end(cache_key)
+                return url
+        url = f"{self.server}{self._crypto.generate(image_url=key, **options)}"
+        with self._lock:
+            self._cache[cache_key] = url
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return url
+
+    def urls(self, keys, **options):
+        return [self.url(key, **options) for key in keys]
+
+    def srcset(self, key, widths, height_ratio=None, **options):
+        """A ``srcset`` attribute value with one url per width.
+
+        With ``height_ratio`` (height / width) the images are cropped to that
+        aspect ratio, otherwise Thumbor keeps the original one.
+        """
+        candidates = []
+        for width in widths:
+            height = int(round(width * height_ratio)) if height_ratio else 0
+            url = self.url(key, **image_options(width=width, height=height, **options))
+            candidates.append(f"{url} {int(width)}w")
+        return ", ".join(candidates)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_signers = {}
+_signers_lock = threading.Lock()
+
+
+def get_signer(server, security_key, max_entries=DEFAULT_MAX_ENTRIES):
+    """Return the process-wide signer for that server and key."""
+    config = (server, security_key, max_entries)
+    signer = _signers.get(config)
+    if signer is None:
+        with _signers_lock:
+            signer = _signers.setdefault(config, URLSigner(*config))
+    return signer
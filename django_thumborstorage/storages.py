@@ -1,19 +1,22 @@
 import mimetypes
 import os
 import re
+import tempfile
 
 from io import BytesIO
-from urllib.parse import quote, unquote
+from urllib.parse import quote, unquote, urlsplit
 
-import requests
-
-from libthumbor import CryptoURL
 from requests.packages.urllib3.exceptions import LocationParseError
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.files.base import File
 from django.core.files.images import ImageFile
 from django.core.files.storage import Storage, FileSystemStorage
+from django.core.files.utils import validate_file_name
 from django.utils.deconstruct import deconstructible
-from . import exceptions
+from django.utils.functional import cached_property
+from . import (aio, bulk, dedupe, endpoints, exceptions, fields, filecache, imageinfo, metadata, migration,
+               pool, preflight, signing, streams)
 
 
 # Match 'key', 'key/filename.ext' and 'key.ext'.
@@ -21,26 +24,72 @@ from . import exceptions
 # We can have pre-Django-3.2.11 path in the database that still start with '/'.
 # https://github.com/django/django/commit/6d343d01c57eb03ca1c6826318b652709e58a76e
 THUMBOR_PATH_PATTERN = r"^/?image/(?P<key>\w{32})(?:(/|\.).*){0,1}$"
+THUMBOR_PATH_RE = re.compile(THUMBOR_PATH_PATTERN)
 
 
 class ThumborStorageFile(ImageFile):
-    def __init__(self, name, mode):
+    def __init__(self, name, mode, storage=None):
         self.name = name
         self._file = None
         self._location = None
         self._mode = mode
+        self._storage = storage
+        # Format and dimensions read from the header while uploading.
+        self.image_info = None
+
+    @property
+    def http(self):
+        if self._storage is not None:
+            return self._storage.http
+        return thumbor_http()
+
+    @property
+    def endpoints(self):
+        if self._storage is not None:
+            return self._storage.endpoints
+        return thumbor_endpoints()
+
+    def get_option(self, name, default=None):
+        if self._storage is not None:
+            return self._storage.get_option(name, default)
+        return getattr(settings, f"THUMBOR_{name.upper()}", default)
 
     def write(self, *args, **kwargs):
         content = kwargs.pop("content")
-        image_content = content.file.read()
-        content.file.seek(0)
+        data = self.upload_body(content)
+        url = f"{self.endpoints.write_server()}/image"
+        try:
+            response = self.http.post(url, data=data, headers=self.post_headers(), operation="upload")
+        finally:
+            self.image_info = self._parser.info
+        self.set_location(response)
+
+    def upload_body(self, content):
+        """The request body of the upload, read from ``content`` as it is sent.
 
-        url = f"{settings.THUMBOR_RW_SERVER}/image"
-        headers = {
+        Nothing is copied in memory nor kept once posted. The image header is
+        parsed on the way to fill ``image_info``.
+        """
+        self._parser = imageinfo.ImageInfoParser()
+        chunk_size = self.get_option("upload_chunk_size", File.DEFAULT_CHUNK_SIZE)
+        if self.get_option("streaming_upload", False) or not hasattr(content, "file"):
+            # Send the upload as a chunked request body, one chunk in memory at a time.
+            return self._parsed_chunks(content.chunks(chunk_size))
+        return streams.UploadBody(content, parser=self._parser, block_size=chunk_size)
+
+    def _parsed_chunks(self, chunks):
+        for chunk in chunks:
+            self._parser.feed(chunk)
+            yield chunk
+
+    def post_headers(self):
+        return {
             "Content-Type": mimetypes.guess_type(self.name)[0] or "image/jpeg",
             "Slug": quote(self.name.encode('utf-8'), ':/?#[]@!$&\'()*+,;='),
         }
-        response = requests.post(url, data=image_content, headers=headers)
+
+    def set_location(self, response):
+        """Read the location of the new original from the response to the POST."""
         if response.status_code != 201:
             raise exceptions.ThumborPostException(response)
         self._location = unquote(response.headers["location"])
@@ -48,28 +97,58 @@ class ThumborStorageFile(ImageFile):
             self._location = self._location.decode('utf-8')
         except AttributeError:
             pass
-        return super().write(image_content)
 
     def delete(self):
-        url = f"{settings.THUMBOR_RW_SERVER}{self.get_location()}"
-        response = requests.delete(url)
-        if response.status_code == 405:
-            raise exceptions.MethodNotAllowedException
-        if response.status_code == 404:
-            raise exceptions.NotFoundException
-        if response.status_code == 204:
-            return
+        url = f"{self.endpoints.write_server()}{self.get_location()}"
+        response = self.http.delete(url, operation="delete")
+        check_delete_response(response)
 
     def _get_file(self):
         if self._file is None or self._file.closed:
+            cache = self._storage.originals_cache if self._storage is not None else None
+            key = thumbor_key(self.name)
+            if 'r' in self._mode and cache is not None and key:
+                self._file = self._get_cached_file(cache, key)
+                return self._file
+            if 'r' in self._mode and self.get_option("streaming_download", False):
+                response = self.endpoints.hedged(lambda server: self.http.get(
+                    f"{server}{self.get_location()}", stream=True, operation="download"))
+                self._file = streams.SpooledResponseFile(
+                    response,
+                    max_size=self.get_option("spool_max_size", streams.DEFAULT_SPOOL_MAX_SIZE),
+                    chunk_size=self.get_option("download_chunk_size", streams.DEFAULT_CHUNK_SIZE))
+                return self._file
             self._file = BytesIO()
             if 'r' in self._mode:
-                url = f"{settings.THUMBOR_RW_SERVER}{self.get_location()}"
-                response = requests.get(url)
+                response = self.endpoints.hedged(lambda server: self.http.get(
+                    f"{server}{self.get_location()}", operation="download"))
                 self._file.write(response.content)
                 self._file.seek(0)
         return self._file
 
+    def _get_cached_file(self, cache, key):
+        f = cache.open(key)
+        headers = {}
+        if f is not None:
+            etag = cache.etag(key)
+            if not cache.revalidate or not etag:
+                return f
+            headers["If-None-Match"] = etag
+        response = self.endpoints.hedged(lambda server: self.http.get(
+            f"{server}{self.get_location()}", headers=headers, stream=True, operation="download"))
+        if response.status_code == 304:
+            response.close()
+            return f
+        if f is not None:
+            f.close()
+        if response.status_code != 200:
+            # Errors are not cached.
+            return BytesIO(response.content)
+        return cache.store(
+            key,
+            response.iter_content(self.get_option("download_chunk_size", streams.DEFAULT_CHUNK_SIZE)),
+            etag=response.headers.get("ETag"))
+
     def _set_file(self, value):
         self._file = value
 
@@ -88,8 +167,24 @@ class ThumborStorageFile(ImageFile):
         return location
 
 
+    def _get_image_dimensions(self):
+        # Parse the header only rather than downloading the original.
+        if not hasattr(self, "_dimensions_cache") and self._file is None and self._storage is not None:
+            dimensions = self._storage.dimensions(self.name)
+            if dimensions is not None:
+                self._dimensions_cache = dimensions
+        return super()._get_image_dimensions()
+
     @property
     def size(self):
+        # Ask the server rather than downloading the original to measure it.
+        if self._file is None and 'r' in self._mode and thumbor_key(self.name) is not None:
+            if self._storage is not None:
+                return self._storage.size(self.name)
+            size = thumbor_original_size(thumbor_original_image_url(self.name, self.endpoints.read_server()),
+                                         http=self.http)
+            if size is not None:
+                return size
         self.seek(0, os.SEEK_END)
         return self.tell()
 
@@ -103,44 +198,437 @@ class ThumborStorage(Storage):
     """Thumbor Simple Storage Service"""
 
     def __init__(self, options=None):
-        pass
+        self.options = options or {}
+
+    def get_option(self, name, default=None):
+        """Read ``name`` from the storage options, then from ``settings.THUMBOR_<NAME>``."""
+        if name in self.options:
+            return self.options[name]
+        return getattr(settings, f"THUMBOR_{name.upper()}", default)
+
+    @cached_property
+    def metadata(self):
+        """Metadata of the originals already fetched from (or posted to) Thumbor.
+
+        Shared through a Django cache if ``THUMBOR_METADATA_CACHE`` is set.
+        """
+        config = self.get_option("metadata_cache")
+        max_entries = self.get_option("metadata_max_entries", metadata.DEFAULT_MAX_ENTRIES)
+        if not config:
+            return metadata.MetadataCache(max_entries=max_entries)
+        config = {} if config is True else dict(config)
+        local = metadata.MetadataCache(
+            max_entries=max_entries,
+            negative_timeout=config.get("negative_timeout", metadata.DEFAULT_NEGATIVE_TIMEOUT),
+            timeout=config.pop("local_timeout", metadata.DEFAULT_LOCAL_TIMEOUT))
+        return metadata.SharedMetadataCache(local, **config)
+
+    @cached_property
+    def originals_cache(self):
+        """The local disk cache of the originals, if ``THUMBOR_ORIGINALS_CACHE`` is set."""
+        config = self.get_option("originals_cache")
+        if not config:
+            return None
+        return filecache.OriginalsCache(
+            config["location"],
+            max_size=config.get("max_size", filecache.DEFAULT_MAX_SIZE),
+            revalidate=config.get("revalidate", False),
+            rescan_interval=config.get("rescan_interval", filecache.DEFAULT_RESCAN_INTERVAL))
+
+    @cached_property
+    def dedupe_index(self):
+        """The ``dedupe.HashIndex`` of the originals, if ``THUMBOR_DEDUPE`` is set."""
+        config = self.get_option("dedupe")
+        if not config:
+            return None
+        return dedupe.get_index(config)
+
+    @property
+    def http(self):
+        """The process-wide connection pool used to talk to the Thumbor servers."""
+        return pool.get_pool(
+            pool_connections=self.get_option("pool_connections", pool.DEFAULT_POOL_CONNECTIONS),
+            pool_maxsize=self.get_option("pool_maxsize", pool.DEFAULT_POOL_MAXSIZE),
+            pool_block=self.get_option("pool_block", False),
+            keep_alive=self.get_option("keep_alive", True),
+            retries=self.get_option("retries"),
+            circuit_breaker=self.get_option("circuit_breaker"),
+            timeouts=self.get_option("timeouts"),
+        )
+
+    @property
+    def endpoints(self):
+        """The Thumbor servers to write to and read the originals from."""
+        return thumbor_endpoints(self.get_option("rw_servers"), self.get_option("rw_balancing"))
+
+    def original_url(self, name):
+        """Url of the original ``name`` on one of the read servers."""
+        return thumbor_original_image_url(name, self.endpoints.read_server())
+
+    @property
+    def ahttp(self):
+        """The process-wide async connection pool used by the async API."""
+        return aio.get_async_pool(
+            max_connections=self.get_option("async_max_connections", aio.DEFAULT_MAX_CONNECTIONS),
+            max_keepalive_connections=self.get_option("async_max_keepalive_connections",
+                                                      aio.DEFAULT_MAX_KEEPALIVE_CONNECTIONS),
+            retries=self.get_option("retries"),
+            circuit_breaker=self.get_option("circuit_breaker"),
+            timeouts=self.get_option("timeouts"),
+        )
 
     def _open(self, name, mode='rb'):
-        f = ThumborStorageFile(name, mode)
+        f = ThumborStorageFile(name, mode, storage=self)
         return f
 
     def _save(self, name, content):
         name = self._normalize_name(name)
-        f = ThumborStorageFile(name, mode="w")
+        content = self.prepare_upload(content)
+        digest = self.content_digest(content)
+        if digest is not None:
+            duplicate = self.duplicate_name(name, digest)
+            if duplicate is not None:
+                return duplicate
+        f = ThumborStorageFile(name, mode="w", storage=self)
         f.write(content=content)
+        return self._saved(f, content, digest)
+
+    def _saved(self, f, content, digest=None):
+        key = thumbor_key(f._location)
+        if key:
+            self.metadata.update(key, exists=True, size=content.size,
+                                 content_type=f.post_headers()["Content-Type"],
+                                 **(f.image_info or {}))
+            if digest is not None:
+                self.dedupe_index.set(digest, key)
         # The '/' at the beginning of the 'name' save in the db is no more allowed
         # since Django 3.2.11.
         # https://github.com/django/django/commit/6d343d01c57eb03ca1c6826318b652709e58a76e
         return f._location[1:]
 
+    def prepare_upload(self, content):
+        """``content`` validated and normalized before it is posted, per
+        ``THUMBOR_UPLOAD_VALIDATION`` and ``THUMBOR_UPLOAD_NORMALIZATION``.
+
+        Raise ``ImageValidationException`` if it is out of the limits.
+        """
+        limits = self.get_option("upload_validation")
+        normalization = self.get_option("upload_normalization")
+        if not limits and not normalization:
+            return content
+        return preflight.prepare(content, limits, normalization)
+
+    def content_digest(self, content):
+        """Hash of ``content`` to deduplicate it, None when ``THUMBOR_DEDUPE`` is not set."""
+        if self.dedupe_index is None:
+            return None
+        return dedupe.content_digest(
+            content, self.get_option("upload_chunk_size", File.DEFAULT_CHUNK_SIZE))
+
+    def duplicate_name(self, name, digest):
+        """Name of ``name`` on the original already posted with the same content, if any.
+
+        The original is checked to still exist on Thumbor unless
+        ``THUMBOR_DEDUPE["verify"]`` is False.
+        """
+        key = self.dedupe_index.get(digest)
+        if key is None:
+            return None
+        # Thumbor ignores what follows the key in the path of an original.
+        duplicate = f"image/{key}/{name}"
+        config = self.get_option("dedupe")
+        if ((config is True or config.get("verify", True))
+                and not thumbor_original_exists(self.original_url(duplicate), http=self.http)):
+            self.dedupe_index.discard(key)
+            return None
+        return duplicate
+
     def _normalize_name(self, name):
         return name
 
     def delete(self, name):
+        if self.may_be_shared(name):
+            # Still used by other rows: deleted with the last of them.
+            return
+        self.delete_original(name)
+
+    def delete_original(self, name):
+        """Delete the original of ``name`` on Thumbor, even if other names share it."""
         f = self.open(name)
         f.delete()
+        self._deleted(name)
+
+    def may_be_shared(self, name):
+        """True if other rows use the original of ``name``, given to several names by ``THUMBOR_DEDUPE``.
+
+        See ``fields.original_shared()``.
+        """
+        key = thumbor_key(name)
+        if self.dedupe_index is None or key is None or self.dedupe_index.digest(key) is None:
+            return False
+        return fields.original_shared(key, name)
+
+    def _deleted(self, name):
+        key = thumbor_key(name)
+        if key:
+            self.metadata.delete(key)
+            if self.originals_cache is not None:
+                self.originals_cache.delete(key)
+            if self.dedupe_index is not None:
+                self.dedupe_index.discard(key)
+
+    def save_many(self, items, max_workers=None, max_length=None):
+        """Save many ``(name, content)`` concurrently.
+
+        Return a ``bulk.BulkResult`` per item, in the same order, whose ``value``
+        is the name of the saved file and ``error`` the exception raised by
+        this upload, if any (e.g. ``ThumborPostException``).
+        """
+        max_workers = max_workers or self.get_option("bulk_max_workers", bulk.DEFAULT_MAX_WORKERS)
+        return list(bulk.run(lambda name, content: self.save(name, content, max_length=max_length),
+                             items, max_workers=max_workers))
+
+    def delete_many(self, names, max_workers=None, force=False):
+        """Delete many files concurrently.
+
+        Return a ``bulk.BulkResult`` per name, in the same order, whose ``value``
+        is False when the file was already missing (``NotFoundException`` is
+        not an error here) or kept as still used by other rows (see
+        ``may_be_shared()``). With ``force``, those originals are deleted too.
+        """
+        def delete(name):
+            try:
+                if thumbor_key(name) is None:
+                    self.delete(name)
+                elif not force and self.may_be_shared(name):
+                    return False
+                else:
+                    self.delete_original(name)
+            except exceptions.NotFoundException:
+                return False
+            return True
+
+        max_workers = max_workers or self.get_option("bulk_max_workers", bulk.DEFAULT_MAX_WORKERS)
+        return list(bulk.run(delete, names, max_workers=max_workers))
 
     def exists(self, name):
         # name is the location returned by Thumbor when posted > may exists.
-        if re.match(THUMBOR_PATH_PATTERN, name):
-            return thumbor_original_exists(thumbor_original_image_url(name))
+        if THUMBOR_PATH_RE.match(name):
+            key = thumbor_key(name)
+            meta = self.metadata.get(key) or {}
+            if "exists" in meta:
+                return meta["exists"]
+            try:
+                response = thumbor_original_head(self.original_url(name), http=self.http, operation="exists")
+            except LocationParseError:
+                return False
+            exists = response.status_code in (200, 206)
+            # A server error says nothing about the original.
+            if exists or response.status_code == 404:
+                self.metadata.update(key, exists=exists)
+            return exists
         # name as defined in 'upload_to' > new image.
         return False
 
     def size(self, name):
-        f = self.open(name)
-        return f.size
+        key = thumbor_key(name)
+        if key is None:
+            f = self.open(name)
+            return f.size
+        meta = self.metadata.get(key) or {}
+        if "size" in meta:
+            return meta["size"]
+        response = thumbor_original_head(self.original_url(name), http=self.http, operation="size")
+        size = thumbor_response_size(response)
+        if size is None:
+            # No length advertised by the server: measure the body.
+            f = self.open(name)
+            f.file
+            size = f.size
+        self.metadata.update(key, exists=True, size=size, content_type=response.headers.get("Content-Type"))
+        return size
+
+    def prefetch_metadata(self, names, max_workers=None):
+        """Fetch whether the originals ``names`` exist, their size and content type concurrently.
+
+        Return ``{name: metadata}`` for the Thumbor names; the metadata is
+        kept so that ``exists()`` and ``size()`` then answer without a request.
+        The originals already known are not requested again, and those whose
+        request failed are left out.
+        """
+        found, missing = {}, []
+        for name in dict.fromkeys(names):
+            key = thumbor_key(name)
+            if key is None:
+                continue
+            meta = self.metadata.get(key) or {}
+            if "exists" in meta:
+                found[name] = meta
+            else:
+                missing.append(name)
+
+        def head(name):
+            response = thumbor_original_head(self.original_url(name), http=self.http, operation="exists")
+            if response.status_code == 404:
+                return {"exists": False}
+            if response.status_code not in (200, 206):
+                raise exceptions.DjangoThumborStorageException(f"{response.status_code} - {name}")
+            meta = {"exists": True, "content_type": response.headers.get("Content-Type")}
+            size = thumbor_response_size(response)
+            if size is not None:
+                meta["size"] = size
+            return meta
+
+        max_workers = max_workers or self.get_option("bulk_max_workers", bulk.DEFAULT_MAX_WORKERS)
+        for result in bulk.run(head, missing, max_workers=max_workers):
+            if result.ok:
+                self.metadata.update(thumbor_key(result.name), **result.value)
+                found[result.name] = self.metadata.get(thumbor_key(result.name))
+        return found
 
     def url(self, name):
         return thumbor_image_url(self.key(name))
 
+    def urls(self, names):
+        """Signed urls of many names at once, in the same order."""
+        signer = thumbor_signer()
+        return [signer.url(self.key(name)) for name in names]
+
+    def image_url(self, name, **options):
+        """Signed url of a resized / re-encoded version of the image.
+
+        Accept ``width``, ``height``, ``smart``, ``format``, ``quality``, ``filters``
+        and any other option of ``libthumbor.CryptoURL.generate()``.
+        """
+        return thumbor_signer().url(self.key(name), **signing.image_options(**options))
+
+    def srcset(self, name, widths, **options):
+        """A ``srcset`` attribute value for the image, signed in one pass."""
+        return thumbor_signer().srcset(self.key(name), widths, **options)
+
     def key(self, name):
-        return re.match(THUMBOR_PATH_PATTERN, name).groupdict()['key']
+        return THUMBOR_PATH_RE.match(name).group('key')
+
+    def dimensions(self, name):
+        """``(width, height)`` of the image, never downloading the whole original.
+
+        Answer from the metadata when the image was posted or already probed,
+        otherwise fetch the first bytes of the original only and parse its
+        header. ``(None, None)`` when the header cannot be understood or the
+        original is missing, and None when ``name`` is not a Thumbor name.
+        """
+        key = thumbor_key(name)
+        if key is None:
+            return None
+        meta = self.metadata.get(key) or {}
+        if "width" not in meta:
+            try:
+                info, size = thumbor_original_header(
+                    self.original_url(name), http=self.http,
+                    max_bytes=self.get_option("header_max_bytes", imageinfo.DEFAULT_MAX_BYTES))
+            except exceptions.NotFoundException:
+                self.metadata.update(key, exists=False)
+                return None, None
+            meta = dict(info or {"width": None, "height": None}, exists=True)
+            if size is not None:
+                meta["size"] = size
+            self.metadata.update(key, **meta)
+        return meta["width"], meta["height"]
+
+    # Async API
+
+    async def aopen(self, name, mode='rb'):
+        """Async version of ``open()``. The original is downloaded before returning."""
+        f = ThumborStorageFile(name, mode, storage=self)
+        if 'r' in mode:
+            spool = tempfile.SpooledTemporaryFile(
+                max_size=self.get_option("spool_max_size", streams.DEFAULT_SPOOL_MAX_SIZE))
+            response = await self.ahttp.request("GET", self.original_url(name), stream=True,
+                                                operation="download")
+            try:
+                async for chunk in response.aiter_bytes(
+                        self.get_option("download_chunk_size", streams.DEFAULT_CHUNK_SIZE)):
+                    spool.write(chunk)
+            finally:
+                await response.aclose()
+            spool.seek(0)
+            f.file = spool
+        return f
+
+    async def asave(self, name, content, max_length=None):
+        """Async version of ``save()``."""
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+        name = self.get_available_name(name, max_length=max_length)
+        validate_file_name(name, allow_relative_path=True)
+        name = await self._asave(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+    async def _asave(self, name, content):
+        name = self._normalize_name(name)
+        content = await sync_to_async(self.prepare_upload)(content)
+        digest = await sync_to_async(self.content_digest)(content)
+        if digest is not None:
+            duplicate = await sync_to_async(self.duplicate_name)(name, digest)
+            if duplicate is not None:
+                return duplicate
+        f = ThumborStorageFile(name, mode="w", storage=self)
+        body = f.upload_body(content)
+        headers = f.post_headers()
+        if isinstance(body, streams.UploadBody):
+            headers["Content-Length"] = str(len(body))
+        response = await self.ahttp.request("POST", f"{self.endpoints.write_server()}/image",
+                                            content=aio.iterate(body), headers=headers, operation="upload")
+        f.image_info = f._parser.info
+        f.set_location(response)
+        # The metadata and the dedupe index may be kept in a database.
+        return await sync_to_async(self._saved)(f, content, digest)
+
+    async def adelete(self, name):
+        """Async version of ``delete()``."""
+        # Queries the dedupe index and the file fields.
+        if await sync_to_async(self.may_be_shared)(name):
+            return
+        response = await self.ahttp.request("DELETE", thumbor_original_image_url(name, self.endpoints.write_server()),
+                                            operation="delete")
+        check_delete_response(response)
+        await sync_to_async(self._deleted)(name)
+
+    async def aexists(self, name):
+        """Async version of ``exists()``."""
+        if not THUMBOR_PATH_RE.match(name):
+            return False
+        key = thumbor_key(name)
+        meta = await sync_to_async(self.metadata.get)(key) or {}
+        if "exists" in meta:
+            return meta["exists"]
+        response = await aio.thumbor_original_head(self.original_url(name), self.ahttp, "exists")
+        exists = response.status_code in (200, 206)
+        if exists or response.status_code == 404:
+            await sync_to_async(self.metadata.update)(key, exists=exists)
+        return exists
+
+    async def asize(self, name):
+        """Async version of ``size()``."""
+        key = thumbor_key(name)
+        if key is None:
+            f = await self.aopen(name)
+            return f.size
+        meta = await sync_to_async(self.metadata.get)(key) or {}
+        if "size" in meta:
+            return meta["size"]
+        response = await aio.thumbor_original_head(self.original_url(name), self.ahttp, "size")
+        size = thumbor_response_size(response)
+        if size is None:
+            f = await self.aopen(name)
+            size = f.size
+        await sync_to_async(self.metadata.update)(key, exists=True, size=size,
+                                                  content_type=response.headers.get("Content-Type"))
+        return size
 
     def get_available_name(self, name, max_length=None):
         # There is no way to know if the image exists on Thumbor.
@@ -166,6 +654,9 @@ class ThumborMigrationStorage(ThumborStorage, FileSystemStorage):
     So:
         1. Store the new images on Thumbor ;
         2. continue to serve existing ones from the file system.
+
+    With ``THUMBOR_MIGRATE_ON_READ``, the images of the file system are moved
+    to Thumbor in the background the first time they are read.
     """
 
     def __init__(self, **kwargs):
@@ -176,10 +667,26 @@ class ThumborMigrationStorage(ThumborStorage, FileSystemStorage):
         ThumborStorage.__init__(self, options)
         FileSystemStorage.__init__(self, location=location, base_url=base_url)
 
+    @cached_property
+    def read_migrator(self):
+        """The ``migration.ReadMigrator`` of the storage, if ``THUMBOR_MIGRATE_ON_READ`` is set."""
+        config = self.get_option("migrate_on_read")
+        if not config:
+            return None
+        if config is True:
+            config = {}
+        return migration.ReadMigrator(
+            self,
+            rate=config.get("rate", migration.DEFAULT_READ_MIGRATION_RATE),
+            max_queue=config.get("max_queue", migration.DEFAULT_READ_MIGRATION_QUEUE_SIZE))
+
     def _open(self, name, mode='rb'):
         if self.is_thumbor(name):
             return ThumborStorage._open(self, name, mode)
-        return ImageFile(FileSystemStorage._open(self, name, mode))
+        f = ImageFile(FileSystemStorage._open(self, name, mode))
+        if self.read_migrator is not None and "r" in mode:
+            self.read_migrator.enqueue(name)
+        return f
 
     def delete(self, name):
         if self.is_thumbor(name):
@@ -191,11 +698,49 @@ class ThumborMigrationStorage(ThumborStorage, FileSystemStorage):
             return ThumborStorage.exists(self, name)
         return FileSystemStorage.exists(self, name)
 
+    def size(self, name):
+        if self.is_thumbor(name):
+            return ThumborStorage.size(self, name)
+        return FileSystemStorage.size(self, name)
+
     def url(self, name):
         if self.is_thumbor(name):
             return ThumborStorage.url(self, name)
         return FileSystemStorage.url(self, name)
 
+    async def aopen(self, name, mode='rb'):
+        if self.is_thumbor(name):
+            return await ThumborStorage.aopen(self, name, mode)
+        return await sync_to_async(self._open)(name, mode)
+
+    async def adelete(self, name):
+        if self.is_thumbor(name):
+            return await ThumborStorage.adelete(self, name)
+        return await sync_to_async(FileSystemStorage.delete)(self, name)
+
+    async def aexists(self, name):
+        if self.is_thumbor(name):
+            return await ThumborStorage.aexists(self, name)
+        return await sync_to_async(FileSystemStorage.exists)(self, name)
+
+    async def asize(self, name):
+        if self.is_thumbor(name):
+            return await ThumborStorage.asize(self, name)
+        return await sync_to_async(FileSystemStorage.size)(self, name)
+
+    def urls(self, names):
+        return [self.url(name) for name in names]
+
+    def image_url(self, name, **options):
+        if self.is_thumbor(name):
+            return ThumborStorage.image_url(self, name, **options)
+        return FileSystemStorage.url(self, name)
+
+    def srcset(self, name, widths, **options):
+        if self.is_thumbor(name):
+            return ThumborStorage.srcset(self, name, widths, **options)
+        return FileSystemStorage.url(self, name)
+
     def key(self, name):
         if self.is_thumbor(name):
             return ThumborStorage.key(self, name)
@@ -207,42 +752,152 @@ class ThumborMigrationStorage(ThumborStorage, FileSystemStorage):
         return FileSystemStorage.path(self, name)
 
     def is_thumbor(self, name):
-        return re.match(THUMBOR_PATH_PATTERN, name)
+        return THUMBOR_PATH_RE.match(name)
 
 
-def thumbor_original_exists(url):
-    # May be cool to be able to check if the image exists on Thumbor server
-    # *without* having to retrieve it.
+def thumbor_original_exists(url, http=None):
     try:
-        response = requests.get(url)
+        response = thumbor_original_head(url, http=http, operation="exists")
     # Happens when trying to get an image when the name in db
     # is in a FileSystemStorage form (without the leading slash).
     except LocationParseError:
         return False
-    if response.status_code == 200:
+    if response.status_code in (200, 206):
         return True
     return False
 
 
+def check_delete_response(response):
+    if response.status_code == 405:
+        raise exceptions.MethodNotAllowedException
+    if response.status_code == 404:
+        raise exceptions.NotFoundException
+
+
+def thumbor_original_size(url, http=None):
+    return thumbor_response_size(thumbor_original_head(url, http=http, operation="size"))
+
+
+def thumbor_response_size(response):
+    """Size of the original from the headers of a HEAD or ranged GET response.
+
+    None when a successful response does not tell it.
+    """
+    if response.status_code == 404:
+        raise exceptions.NotFoundException
+    if response.status_code not in (200, 206):
+        raise exceptions.DjangoThumborStorageException(f"{response.status_code} - size")
+    content_range = response.headers.get("Content-Range")
+    if response.status_code == 206 and content_range:
+        total = content_range.rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    if response.status_code == 200 and "Content-Length" in response.headers:
+        return int(response.headers["Content-Length"])
+    return None
+
+
+def thumbor_original_header(url, http=None, max_bytes=imageinfo.DEFAULT_MAX_BYTES,
+                            first_bytes=16 * 2 ** 10):
+    """Parse the header of the original fetching as few bytes as possible.
+
+    Ask for the first ``first_bytes`` then, if needed, for the rest up to
+    ``max_bytes`` with ranged GETs. Return ``(info, size)``: the
+    ``ImageInfoParser.info`` and the size of the original if the server told it.
+    """
+    http = http or thumbor_http()
+    parser = imageinfo.ImageInfoParser(max_bytes=max_bytes)
+    size = None
+    start = 0
+    for end in (min(first_bytes, max_bytes), max_bytes):
+        if parser.done or start >= end or (size is not None and start >= size):
+            break
+        response = http.get(url, headers={"Range": f"bytes={start}-{end - 1}"}, stream=True,
+                            operation="dimensions")
+        try:
+            if response.status_code == 404:
+                raise exceptions.NotFoundException
+            if response.status_code not in (200, 206):
+                raise exceptions.DjangoThumborStorageException(f"{response.status_code} - dimensions")
+            if response.status_code == 206:
+                size = thumbor_response_size(response)
+            for chunk in response.iter_content(streams.DEFAULT_CHUNK_SIZE):
+                parser.feed(chunk)
+                if parser.done:
+                    break
+            if response.status_code != 206:
+                # The server ignored the range and sent the image from its start.
+                break
+        finally:
+            response.close()
+        start = end
+    return parser.info, size
+
+
+def thumbor_original_head(url, http=None, operation="head"):
+    """Check the original on the Thumbor server *without* retrieving it.
+
+    Send a HEAD request, or a GET of the first byte only when the server
+    does not allow HEAD (Thumbor answers 405). The host is then remembered
+    so the next checks cost a single round-trip.
+    """
+    http = http or thumbor_http()
+    netloc = urlsplit(url).netloc
+    if netloc not in http.head_unsupported:
+        response = http.head(url, operation=operation)
+        if response.status_code not in (405, 501):
+            return response
+        http.head_unsupported.add(netloc)
+    response = http.get(url, headers={"Range": "bytes=0-0"}, stream=True, operation=operation)
+    response.close()
+    return response
+
+
 # These functions because some methods in ThumborStorage may be called with
 # self being a ThumborMigrationStorage instance and result in infinite loop.
 # These methods proxiing to these functions.
 
 def thumbor_image_url(key):
-    crypto = CryptoURL(key=settings.THUMBOR_SECURITY_KEY)
-    return f"{settings.THUMBOR_SERVER}{crypto.generate(image_url=key)}"
+    return thumbor_signer().url(key)
+
+
+def thumbor_signer():
+    return signing.get_signer(
+        settings.THUMBOR_SERVER, settings.THUMBOR_SECURITY_KEY,
+        getattr(settings, "THUMBOR_URL_CACHE_SIZE", signing.DEFAULT_MAX_ENTRIES))
+
+
+def thumbor_key(name):
+    match = THUMBOR_PATH_RE.match(name)
+    if match:
+        return match.group("key")
+    return None
 
 
-def thumbor_original_image_url(name):
+def thumbor_original_image_url(name, server=None):
     """ Django 3.2.11 introduced a backward-incompatible change.
 
     See https://github.com/django/django/commit/6d343d01c57eb03ca1c6826318b652709e58a76e
     This function manage both pre and post Django 3.2.11 name in the database (with
     and without a '/' at the start of the string.
+
+    ``server`` defaults to THUMBOR_RW_SERVER.
     """
     if not name[0] == '/':
         name = '/' + name
-    return f"{settings.THUMBOR_RW_SERVER}{name}"
+    return f"{server or settings.THUMBOR_RW_SERVER}{name}"
+
+
+def thumbor_http():
+    """The process-wide connection pool configured by the ``THUMBOR_*`` settings."""
+    return ThumborStorage().http
+
+
+def thumbor_endpoints(servers=None, balancing=None):
+    """The process-wide ``endpoints.Endpoints`` of THUMBOR_RW_SERVERS, or of THUMBOR_RW_SERVER alone."""
+    servers = servers or getattr(settings, "THUMBOR_RW_SERVERS", None) or [settings.THUMBOR_RW_SERVER]
+    if balancing is None:
+        balancing = getattr(settings, "THUMBOR_RW_BALANCING", None)
+    return endpoints.get_endpoints(servers, **(balancing or {}))
 
 
 # Utils
@@ -0,0 +1,133 @@
+import io
+import os
+import tempfile
+
+
+DEFAULT_SPOOL_MAX_SIZE = 2621440  # i.e. 2.5 MB, like FILE_UPLOAD_MAX_MEMORY_SIZE.
+DEFAULT_CHUNK_SIZE = 64 * 2 ** 10
+
+
+class SpooledResponseFile(io.RawIOBase):
+    """A read-only file over a streamed HTTP response.
+
+    Bytes are pulled from the response only when they are read. They are
+    kept in a ``SpooledTemporaryFile`` so the file stays seekable; the spool
+    moves to disk once it grows over ``max_size``.
+    """
+
+    def __init__(self, response, max_size=DEFAULT_SPOOL_MAX_SIZE, chunk_size=DEFAULT_CHUNK_SIZE):
+        self._response = response
+        self._iterator = response.iter_content(chunk_size)
+        self._spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self._filled = 0
+        self._position = 0
+        self._exhausted = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def _ensure_open(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+    def _fill(self, size=None):
+        """Download from the response until the spool holds ``size`` bytes (all if None)."""
+        if self._exhausted or (size is not None and self._filled >= size):
+            return
+        self._spool.seek(self._filled)
+        while size is None or self._filled < size:
+            try:
+                chunk = next(self._iterator)
+            except StopIteration:
+                self._exhausted = True
+                self._response.close()
+                break
+            self._spool.write(chunk)
+            self._filled += len(chunk)
+
+    def read(self, size=-1):
+        self._ensure_open()
+        if size is None or size < 0:
+            self._fill()
+        else:
+            self._fill(self._position + size)
+        self._spool.seek(self._position)
+        data = self._spool.read(-1 if size is None else size)
+        self._position += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._ensure_open()
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            self._fill()
+            position = self._filled + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def tell(self):
+        self._ensure_open()
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._response.close()
+            self._spool.close()
+        super().close()
+
+
+class UploadBody:
+    """A request body reading the upload straight from its file, block by block.
+
+    Nothing is copied beforehand: a ``TemporaryUploadedFile`` is sent from
+    the disk. ``len()`` gives the Content-Length and the bytes read go
+    through ``parser`` (an ``ImageInfoParser``) on their way out.
+    """
+
+    def __init__(self, content, parser=None, block_size=DEFAULT_CHUNK_SIZE):
+        self.file = content.file
+        self.parser = parser
+        self.block_size = block_size
+        if hasattr(self.file, "seek"):
+            self.file.seek(0)
+        self.length = content.size
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        if self.parser is not None:
+            self.parser.feed(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.block_size)
+            if not data:
+                break
+            yield data
+
+    def rewind(self):
+        """Send the body again from its first byte, e.g. for a retry."""
+        self.file.seek(0)
+        if self.parser is not None:
+            self.parser.reset()
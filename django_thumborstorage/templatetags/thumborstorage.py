@@ -0,0 +1,36 @@
+from django import template
+
+
+register = template.Library()
+
+
+def _widths(widths):
+    if isinstance(widths, str):
+        return [int(width) for width in widths.split(",") if width.strip()]
+    return [int(width) for width in widths]
+
+
+@register.simple_tag
+def thumbor_url(image, **options):
+    """Signed url of a resized / re-encoded version of an ImageField file.
+
+    {% thumbor_url person.photo width=320 height=240 smart=True format="webp" quality=80 %}
+    """
+    if not image:
+        return ""
+    if not hasattr(image.storage, "image_url"):
+        return image.url
+    return image.storage.image_url(image.name, **options)
+
+
+@register.simple_tag
+def thumbor_srcset(image, widths, **options):
+    """A ``srcset`` attribute value for an ImageField file.
+
+    {% thumbor_srcset person.photo "320,640,1280" format="webp" %}
+    """
+    if not image:
+        return ""
+    if not hasattr(image.storage, "srcset"):
+        return image.url
+    return image.storage.srcset(image.name, _widths(widths), **options)
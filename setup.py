@@ -21,7 +21,12 @@ setup(
         'Issue Tracker': 'https://github.com/Starou/django-thumborstorage/issues',
     },
     install_requires=['requests', 'libthumbor'],
-    packages=['django_thumborstorage'],
+    extras_require={'async': ['httpx'],
+                    'prometheus': ['prometheus-client'],
+                    'opentelemetry': ['opentelemetry-api'],
+                    'normalize': ['Pillow']},
+    packages=['django_thumborstorage', 'django_thumborstorage.management',
+              'django_thumborstorage.management.commands', 'django_thumborstorage.templatetags'],
     classifiers=[
         'Environment :: Web Environment',
         'Framework :: Django',
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Measure the cost of the ``ThumborStorage`` operations against a ``ThumborServer``."""
+
+import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django_thumborstorage import storages
+
+from .server import ThumborServer
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+OPERATIONS = ["save", "url", "exists", "size", "open", "delete"]
+
+
+def payload(size):
+    """A JPEG of ``size`` bytes: a real header padded with zeros."""
+    with open(os.path.join(IMAGE_DIR, "HannibalSmith.jpg"), "rb") as f:
+        header = f.read()
+    return header + b"\0" * max(0, size - len(header))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def save(storage, name, data):
+    return storage.save(name, ContentFile(data))
+
+
+def url(storage, name, data):
+    return storage.url(name)
+
+
+def exists(storage, name, data):
+    return storage.exists(name)
+
+
+def size(storage, name, data):
+    return storage.size(name)
+
+
+def open_read(storage, name, data):
+    with storage.open(name) as f:
+        while f.read(2 ** 16):
+            pass
+
+
+def delete(storage, name, data):
+    return storage.delete(name)
+
+
+FUNCTIONS = {"save": save, "url": url, "exists": exists, "size": size, "open": open_read, "delete": delete}
+
+
+def measure(func, storage, names, data, concurrency):
+    """Call ``func`` once per name; return the results, the latencies and the wall time."""
+    def call(name):
+        started = time.perf_counter()
+        result = func(storage, name, data)
+        return result, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        calls = list(executor.map(call, names))
+    return [result for result, latency in calls], [latency for result, latency in calls], time.perf_counter() - started
+
+
+def peak_memory(func, storage, names, data):
+    """Call ``func`` once per name; return the results and the highest peak of memory allocated by a call."""
+    results, peak = [], 0
+    for name in names:
+        tracemalloc.start()
+        try:
+            results.append(func(storage, name, data))
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return results, peak
+
+
+def run(operations=OPERATIONS, iterations=100, payload_size=256 * 2 ** 10, concurrency=1, latency=0,
+        options=None, memory_iterations=3):
+    """Benchmark ``operations`` and return one dict of measures per operation.
+
+    Each operation is called ``iterations`` times, on as many originals posted
+    by ``save`` (which always runs first). The reads go through a storage other
+    than the one which saved, so its metadata cache starts empty. The peak memory
+    is measured apart, over ``memory_iterations`` calls, as tracing slows the calls down.
+    """
+    data = payload(payload_size)
+    results = []
+    with ThumborServer(latency=latency) as server, override_settings(THUMBOR_RW_SERVER=server.url):
+        writer = storages.ThumborStorage(options=options)
+        names = [f"bench/{i}.jpg" for i in range(iterations + memory_iterations)]
+        # Save first to have originals to work on, delete last.
+        for operation in ["save"] + [operation for operation in OPERATIONS[1:] if operation in operations]:
+            func = FUNCTIONS[operation]
+            storage = writer if operation == "save" else storages.ThumborStorage(options=options)
+            done, latencies, wall = measure(func, storage, names[:iterations], data, concurrency)
+            traced, memory = peak_memory(func, storage, names[iterations:], data)
+            if operation == "save":
+                names = done + traced
+            if operation not in operations:
+                continue
+            results.append({
+                "operation": operation,
+                "iterations": iterations,
+                "throughput": iterations / wall,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "peak_memory": memory,
+            })
+    return results
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""A stand-in for the Thumbor ``/image`` handler, served from a thread of the benchmark."""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote
+
+IMAGE_PATH_RE = re.compile(r"^/image/(?P<key>\w{32})(/.*)?$")
+RANGE_RE = re.compile(r"^bytes=(?P<start>\d+)-(?P<end>\d*)$")
+# The bodies go through the disk by blocks, so the server allocates little
+# memory of its own next to the storage measured.
+BLOCK_SIZE = 64 * 2 ** 10
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThumborHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, headers=None, path=None, start=0, length=0):
+        """Send the response, with ``length`` bytes of the file ``path`` from ``start`` as body."""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        if self.command != "HEAD" and path:
+            with open(path, "rb") as f:
+                f.seek(start)
+                self.copy(f, self.wfile, length)
+
+    def copy(self, source, target, length):
+        while length > 0:
+            block = source.read(min(length, BLOCK_SIZE))
+            if not block:
+                break
+            target.write(block)
+            length -= len(block)
+
+    def read_body(self, f):
+        """Write the request body in ``f``, block by block, and return its length."""
+        if self.headers.get("Transfer-Encoding") != "chunked":
+            length = int(self.headers.get("Content-Length", 0))
+            self.copy(self.rfile, f, length)
+            return length
+        length = 0
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            self.copy(self.rfile, f, size)
+            self.rfile.readline()
+            length += size
+            if not size:
+                return length
+
+    def original(self):
+        match = IMAGE_PATH_RE.match(self.path)
+        return match and match.group("key"), match and self.server.originals.get(match.group("key"))
+
+    def do_POST(self):
+        key = uuid.uuid4().hex
+        path = os.path.join(self.server.location, key)
+        with open(path, "wb") as f:
+            length = self.read_body(f)
+        self.server.wait()
+        if self.path != "/image":
+            os.unlink(path)
+            return self.send(404)
+        self.server.originals[key] = (path, length, self.headers.get("Content-Type", "image/jpeg"))
+        self.send(201, headers={"Location": f"/image/{key}/{unquote(self.headers.get('Slug', ''))}"})
+
+    def do_GET(self):
+        self.server.wait()
+        key, original = self.original()
+        if original is None:
+            return self.send(404)
+        path, length, content_type = original
+        headers = {"Content-Type": content_type, "ETag": f'"{key}"'}
+        if self.headers.get("If-None-Match") == headers["ETag"]:
+            return self.send(304, headers)
+        match = RANGE_RE.match(self.headers.get("Range", ""))
+        if match is None:
+            return self.send(200, headers, path, 0, length)
+        start = int(match.group("start"))
+        end = min(int(match.group("end") or length - 1), length - 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+        self.send(206, headers, path, start, end + 1 - start)
+
+    def do_HEAD(self):
+        self.server.wait()
+        key, original = self.original()
+        if original is None:
+            return self.send(404)
+        path, length, content_type = original
+        self.send(200, {"Content-Type": content_type}, length=length)
+
+    def do_DELETE(self):
+        self.server.wait()
+        key, original = self.original()
+        if original is None:
+            return self.send(404)
+        self.server.originals.pop(key, None)
+        os.unlink(original[0])
+        self.send(204)
+
+
+class ThumborServer:
+    """Run a ``ThumborHandler`` on a free local port, answering each request after ``latency`` seconds.
+
+    The originals are written in a temporary directory. Use it as a context manager.
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), ThumborHandler)
+        self.httpd.originals = {}
+        self.httpd.location = tempfile.mkdtemp(prefix="thumbor-bench-")
+        self.httpd.wait = self.wait
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    @property
+    def originals(self):
+        return self.httpd.originals
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.httpd.location, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import unittest
+import uuid
+
+import httpx
+import mock
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django_thumborstorage import aio
+from django_thumborstorage import deadlines
+from django_thumborstorage import exceptions
+from django_thumborstorage import fields
+from django_thumborstorage import signals
+from django_thumborstorage import storages
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+
+class MockedField:
+    attname = "photo"
+
+
+class MockedModel:
+    """A model whose rows hold the names on the original of ``name``."""
+
+    def __init__(self, name):
+        self._default_manager = mock.Mock()
+        self._default_manager.filter.return_value.values_list.return_value = [
+            name, name.replace("avatars/", "people/")]
+
+
+class MockedThumbor:
+    """Answer like the Thumbor /image handler, with the files of IMAGE_DIR as originals."""
+
+    def __init__(self, allow_head=True):
+        self.allow_head = allow_head
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if request.method == "POST":
+            body = request.read()
+            if len(body) < 10000:
+                return httpx.Response(412, content=b"Image too small")
+            slug = request.headers["Slug"]
+            return httpx.Response(201, headers={"Location": f"/image/oooooo32chars_random_idooooooooo/{slug}"})
+        filename = os.path.join(IMAGE_DIR, os.path.basename(request.url.path))
+        if request.method == "HEAD" and not self.allow_head:
+            return httpx.Response(405)
+        if not os.path.exists(filename):
+            return httpx.Response(404)
+        if request.method == "DELETE":
+            return httpx.Response(204)
+        content = open(filename, "rb").read()
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"Content-Length": str(len(content)),
+                                                "Content-Type": "image/jpeg"})
+        if request.headers.get("Range") == "bytes=0-0":
+            return httpx.Response(206, content=content[:1],
+                                  headers={"Content-Range": f"bytes 0-0/{len(content)}"})
+        return httpx.Response(200, content=content)
+
+
+class AsyncThumborStorageTest(unittest.IsolatedAsyncioTestCase):
+    storage_class = storages.ThumborStorage
+
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+        self.thumbor = MockedThumbor()
+        self.ahttp = aio.AsyncConnectionPool(transport=httpx.MockTransport(self.thumbor))
+        self.patcher = mock.patch.object(storages.ThumborStorage, 'ahttp', self.ahttp)
+        self.patcher.start()
+        self.storage = self.storage_class()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    async def asyncTearDown(self):
+        await self.ahttp.aclose()
+
+    async def test_asave(self):
+        filename = 'people/HannibalSmith.jpg'
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        name = await self.storage.asave(filename, content)
+        self.assertEqual(name, f'image/oooooo32chars_random_idooooooooo/{filename}')
+        [request] = self.thumbor.requests
+        self.assertEqual(str(request.url), f"{settings.THUMBOR_RW_SERVER}/image")
+        self.assertEqual(request.headers["Slug"], filename)
+        self.assertEqual(request.headers["Content-Type"], "image/jpeg")
+        self.assertEqual(request.content, content.file.getvalue())
+
+    async def test_asave_dedupe(self):
+        storage = self.storage_class(options={"dedupe": {"verify": False, "options": {"prefix": uuid.uuid4().hex}}})
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        await storage.asave('people/HannibalSmith.jpg', content)
+        name = await storage.asave('avatars/HannibalSmith.jpg', content)
+        self.assertEqual(name, 'image/oooooo32chars_random_idooooooooo/avatars/HannibalSmith.jpg')
+        self.assertEqual(len(self.thumbor.requests), 1)
+        # Still used by another row: kept.
+        index_digest = storage.dedupe_index.digest
+
+        def digest(key):
+            # The index may be a table: not called from the event loop.
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            return index_digest(key)
+        with mock.patch.object(fields, "thumbor_file_fields", return_value=[(MockedModel(name), MockedField())]), \
+                mock.patch.object(storage.dedupe_index, "digest", side_effect=digest) as digest_mock:
+            await storage.adelete(name)
+        self.assertTrue(digest_mock.called)
+        self.assertEqual(len(self.thumbor.requests), 1)
+        self.assertIsNotNone(storage.dedupe_index.digest("oooooo32chars_random_idooooooooo"))
+        # Deleted with the last one.
+        with mock.patch.object(fields, "thumbor_file_fields", return_value=[]):
+            await storage.adelete(name)
+        self.assertEqual(self.thumbor.requests[-1].method, "DELETE")
+        self.assertIsNone(storage.dedupe_index.digest("oooooo32chars_random_idooooooooo"))
+
+    async def test_asave_signals(self):
+        finished = []
+
+        def on_finished(sender, **kwargs):
+            finished.append(kwargs)
+        signals.request_finished.connect(on_finished)
+        self.addCleanup(signals.request_finished.disconnect, on_finished)
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        await self.storage.asave('people/HannibalSmith.jpg', content)
+        await self.storage.aexists('image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg')
+        self.assertEqual([(kwargs["operation"], kwargs["status"]) for kwargs in finished],
+                         [("upload", 201), ("exists", 200)])
+        self.assertEqual(finished[0]["bytes_sent"], content.size)
+
+    async def test_asave_streaming(self):
+        storage = self.storage_class(options={"streaming_upload": True, "upload_chunk_size": 1024})
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        name = await storage.asave('people/HannibalSmith.jpg', content)
+        self.assertEqual(name, 'image/oooooo32chars_random_idooooooooo/people/HannibalSmith.jpg')
+        [request] = self.thumbor.requests
+        self.assertEqual(request.headers["Transfer-Encoding"], "chunked")
+
+    async def test_asave_image_too_small(self):
+        content = ContentFile(open(f'{IMAGE_DIR}/bouboune.png', "rb").read())
+        with self.assertRaises(exceptions.ThumborPostException) as cm:
+            await self.storage.asave('beasts/bouboune.png', content)
+        self.assertEqual(str(cm.exception), repr("412 - Precondition Failed"))
+
+    async def test_aopen(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        f = await self.storage.aopen(filename)
+        [request] = self.thumbor.requests
+        self.assertEqual(str(request.url), f"{settings.THUMBOR_RW_SERVER}/{filename}")
+        self.assertEqual(f.read(), open(f'{IMAGE_DIR}/TempletonPeck.jpg', "rb").read())
+        self.assertEqual(len(self.thumbor.requests), 1)
+
+    async def test_adelete(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        await self.storage.adelete(filename)
+        self.assertEqual(self.thumbor.requests[0].method, "DELETE")
+        with self.assertRaises(exceptions.NotFoundException):
+            await self.storage.adelete('image/5247a82854384f228c6fba432c67e6a8/DoesNotExists.jpg')
+
+    async def test_aexists(self):
+        self.assertTrue(await self.storage.aexists(
+            'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'))
+        self.assertFalse(await self.storage.aexists('image/e8a82fa321e344dfaddcbaa997845302/DoesNotExists.jpg'))
+        self.assertFalse(await self.storage.aexists('people/new/TempletonPeck.jpg'))
+        self.assertEqual([request.method for request in self.thumbor.requests], ["HEAD", "HEAD"])
+
+    async def test_aexists_head_not_allowed(self):
+        self.thumbor.allow_head = False
+        self.ahttp.head_unsupported.clear()
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertTrue(await self.storage.aexists(filename))
+        self.assertTrue(await self.storage.aexists(filename.replace("5247a82854384f228c6fba432c67e6a8",
+                                                                    "e8a82fa321e344dfaddcbaa997845302")))
+        self.assertEqual([request.method for request in self.thumbor.requests], ["HEAD", "GET", "GET"])
+        self.ahttp.head_unsupported.clear()
+
+    async def test_asize(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertEqual(await self.storage.asize(filename), 9730)
+        self.assertEqual(await self.storage.asize(filename), 9730)
+        self.assertEqual([request.method for request in self.thumbor.requests], ["HEAD"])
+
+    async def test_shared_metadata(self):
+        storage = self.storage_class(options={"metadata_cache": {"prefix": uuid.uuid4().hex, "local_timeout": 0}})
+        calls = []
+
+        def off_loop(*args, **kwargs):
+            # A database or network cache must not be called from the event loop.
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            calls.append(args[0])
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        cache = caches["default"]
+        with mock.patch.object(cache, "get", side_effect=off_loop), \
+                mock.patch.object(cache, "set", side_effect=off_loop), \
+                mock.patch.object(cache, "delete", side_effect=off_loop):
+            self.assertTrue(await storage.aexists(filename))
+            self.assertEqual(await storage.asize(filename), 9730)
+            content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+            await storage.asave('people/HannibalSmith.jpg', content)
+            await storage.adelete(filename)
+        # Read, written on save and deleted.
+        self.assertIn(storage.metadata.cache_key("oooooo32chars_random_idooooooooo"), calls)
+        self.assertEqual(calls[-1], storage.metadata.cache_key("5247a82854384f228c6fba432c67e6a8"))
+
+    async def test_retries(self):
+        responses = [httpx.Response(503), httpx.Response(200)]
+        ahttp = aio.AsyncConnectionPool(transport=httpx.MockTransport(lambda request: responses.pop(0)),
+                                        retries={"total": 2, "backoff": 0})
+        response = await ahttp.request("HEAD", f"{settings.THUMBOR_RW_SERVER}/image/5247a82854384f228c6fba432c67e6a8")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(responses, [])
+        await ahttp.aclose()
+
+    async def test_circuit_breaker(self):
+        def handler(request):
+            raise httpx.ConnectError("refused")
+        ahttp = aio.AsyncConnectionPool(transport=httpx.MockTransport(handler),
+                                        circuit_breaker={"min_requests": 2})
+        url = f"{settings.THUMBOR_RW_SERVER}/image/5247a82854384f228c6fba432c67e6a8"
+        for i in range(2):
+            with self.assertRaises(httpx.ConnectError):
+                await ahttp.request("GET", url)
+        with self.assertRaises(exceptions.CircuitOpenException):
+            await ahttp.request("GET", url)
+        await ahttp.aclose()
+
+    async def test_cancelled_probe(self):
+        async def handler(request):
+            await asyncio.sleep(10)
+        ahttp = aio.AsyncConnectionPool(transport=httpx.MockTransport(handler),
+                                        circuit_breaker={"min_requests": 1, "reset_timeout": 0})
+        url = f"{settings.THUMBOR_RW_SERVER}/image/5247a82854384f228c6fba432c67e6a8"
+        breaker = ahttp.circuit_breakers.get(url)
+        breaker.record(False)
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(ahttp.request("GET", url), 0.01)
+        # Open again, not stuck half-open: another probe is let through later.
+        self.assertEqual(breaker.state, "open")
+        await ahttp.aclose()
+
+    async def test_timeouts(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        await self.storage.aexists(filename)
+        timeout = self.thumbor.requests[-1].extensions["timeout"]
+        self.assertEqual((timeout["connect"], timeout["read"]), (5, 10))
+        self.storage.metadata.clear()
+        with deadlines.deadline(0):
+            with self.assertRaises(exceptions.DeadlineExceededException):
+                await self.storage.aexists(filename)
+        self.assertEqual(len(self.thumbor.requests), 1)
+
+    async def test_concurrent(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        results = await asyncio.gather(*[self.storage.aexists(filename) for i in range(20)])
+        self.assertEqual(results, [True] * 20)
+
+
+class AsyncThumborMigrationStorageTest(AsyncThumborStorageTest):
+    storage_class = storages.ThumborMigrationStorage
+
+    async def test_filesystem(self):
+        storage = storages.ThumborMigrationStorage(location=os.path.join(CURRENT_DIR, ".."))
+        self.assertTrue(await storage.aexists('images/gnu.png'))
+        self.assertEqual(await storage.asize('images/gnu.png'), os.path.getsize(f'{IMAGE_DIR}/gnu.png'))
+        f = await storage.aopen('images/gnu.png')
+        self.assertEqual(len(f.read()), os.path.getsize(f'{IMAGE_DIR}/gnu.png'))
+        f.close()
+        self.assertEqual(self.thumbor.requests, [])
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(AsyncThumborStorageTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(AsyncThumborMigrationStorageTest))
+    return suite
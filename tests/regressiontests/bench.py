@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import requests
+from django.conf import settings
+
+from benchmarks import bench
+from benchmarks.server import ThumborServer
+
+
+class ThumborServerTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+
+    def test_image_handler(self):
+        with ThumborServer() as server:
+            response = requests.post(f"{server.url}/image", data=b"x" * 100, headers={"Slug": "people/a.jpg"})
+            self.assertEqual(response.status_code, 201)
+            location = response.headers["Location"]
+            self.assertTrue(location.endswith("/people/a.jpg"))
+            self.assertEqual(requests.get(f"{server.url}{location}").content, b"x" * 100)
+            response = requests.get(f"{server.url}{location}", headers={"Range": "bytes=0-9"})
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response.headers["Content-Range"], "bytes 0-9/100")
+            self.assertEqual(requests.head(f"{server.url}{location}").headers["Content-Length"], "100")
+            self.assertEqual(requests.delete(f"{server.url}{location}").status_code, 204)
+            self.assertEqual(requests.get(f"{server.url}{location}").status_code, 404)
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Keep the benchmark suite running; the figures themselves are not checked."""
+
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+        # Configure the settings before they are overridden.
+        settings.THUMBOR_RW_SERVER
+
+    def test_run(self):
+        results = bench.run(iterations=3, payload_size=20000, concurrency=2, memory_iterations=1)
+        self.assertEqual([result["operation"] for result in results], bench.OPERATIONS)
+        for result in results:
+            self.assertGreater(result["throughput"], 0)
+            self.assertLessEqual(result["p50"], result["p99"])
+
+    def test_run_operations(self):
+        results = bench.run(operations=["exists", "save"], iterations=2, payload_size=20000,
+                            options={"streaming_upload": True}, memory_iterations=1)
+        self.assertEqual([result["operation"] for result in results], ["save", "exists"])
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(ThumborServerTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(BenchmarkTest))
+    return suite
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+import time
+import unittest
+
+from django_thumborstorage import bulk
+from django_thumborstorage import exceptions
+
+
+class BulkRunTest(unittest.TestCase):
+    def test_order_and_errors(self):
+        def func(name, value):
+            time.sleep(0.01 * (5 - value))
+            if value == 2:
+                raise exceptions.NotFoundException
+            return value * 10
+
+        results = list(bulk.run(func, [(f"name{i}", i) for i in range(5)], max_workers=3))
+        self.assertEqual([result.name for result in results], [f"name{i}" for i in range(5)])
+        self.assertEqual([result.value for result in results], [0, 10, None, 30, 40])
+        self.assertEqual([result.ok for result in results], [True, True, False, True, True])
+        self.assertIsInstance(results[2].error, exceptions.NotFoundException)
+
+    def test_single_argument(self):
+        results = list(bulk.run(lambda name: name.upper(), ["a", "b"]))
+        self.assertEqual(results, [bulk.BulkResult("a", "A", None), bulk.BulkResult("b", "B", None)])
+
+    def test_bounded_in_flight(self):
+        submitted = []
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def func(name):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.005)
+            with lock:
+                running[0] -= 1
+
+        def items():
+            for i in itertools.count():
+                if i == 100:
+                    return
+                submitted.append(i)
+                yield f"name{i}"
+
+        results = bulk.run(func, items(), max_workers=4)
+        next(results)
+        self.assertLessEqual(len(submitted), 8)
+        self.assertEqual(len(list(results)), 99)
+        self.assertLessEqual(running[1], 4)
+        self.assertGreater(running[1], 1)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(BulkRunTest)
+    return suite
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import os
+import tempfile
+import time
+import unittest
+import uuid
+
+import mock
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django_thumborstorage import storages
+from django_thumborstorage import migration
+from django_thumborstorage.management.commands import (thumbor_dedupe_backfill, thumbor_delete_orphans,
+                                                      thumbor_migrate)
+
+from .storages import DjangoThumborTestCase, mocked_thumbor_streaming_get_response
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+
+class MockedField:
+    def __init__(self, storage, names):
+        self.storage = storage
+        self.names = names
+
+
+def mocked_thumbor_file_fields(*fields):
+    return mock.patch.multiple(
+        'django_thumborstorage.management.commands.thumbor_delete_orphans',
+        thumbor_file_fields=lambda: [(None, field) for field in fields],
+        field_names=lambda model, field: iter(field.names),
+    )
+
+
+class DeleteOrphansCommandTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = storages.ThumborStorage()
+        self.keys_file = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+        self.keys_file.write("\n".join([
+            "# Keys listed on the Thumbor server",
+            "5247a82854384f228c6fba432c67e6a8",
+            "image/e8a82fa321e344dfaddcbaa997845302/people/HannibalSmith.jpg",
+            "/image/oooooo32chars_random_idooooooooo",
+            "",
+        ]))
+        self.keys_file.close()
+
+    def tearDown(self):
+        os.unlink(self.keys_file.name)
+        super().tearDown()
+
+    def call_command(self, *args, **kwargs):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(thumbor_delete_orphans.Command(), *args, stdout=stdout, stderr=stderr, **kwargs)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_dry_run(self):
+        field = MockedField(self.storage, ['image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'])
+        with mocked_thumbor_file_fields(field):
+            stdout, stderr = self.call_command(self.keys_file.name, dry_run=True)
+        self.assertIn("3 candidate key(s).", stdout)
+        self.assertIn("2 orphan(s).", stdout)
+        self.assertIn("e8a82fa321e344dfaddcbaa997845302", stdout)
+        self.assertIn("oooooo32chars_random_idooooooooo", stdout)
+        assert not self.MockDeleteClass.called, "Should not DELETE on Thumbor."
+
+    def test_delete(self):
+        field = MockedField(self.storage, ['/image/oooooo32chars_random_idooooooooo/foundations/gnu.png'])
+        with mocked_thumbor_file_fields(field):
+            stdout, stderr = self.call_command(self.keys_file.name, batch_size=1, rate=1000)
+        self.assertEqual(sorted(call[0][0] for call in self.MockDeleteClass.call_args_list), [
+            f"{settings.THUMBOR_RW_SERVER}/image/5247a82854384f228c6fba432c67e6a8",
+            f"{settings.THUMBOR_RW_SERVER}/image/e8a82fa321e344dfaddcbaa997845302",
+        ])
+        # The mocked server only knows the images of tests/images by their basename.
+        self.assertIn("0 deleted, 2 already missing, 0 failed.", stdout)
+        self.assertEqual(stderr, "")
+
+    def test_invalid_key(self):
+        with open(self.keys_file.name, "a") as f:
+            f.write("people/photo.jpg\n")
+        with mocked_thumbor_file_fields():
+            self.assertRaises(CommandError, self.call_command, self.keys_file.name)
+
+
+class MockedModel:
+    class _meta:
+        label = "my_app.Person"
+
+
+class MockedMigrationField(MockedField):
+    name = "photo"
+
+    def __init__(self, storage, rows):
+        super().__init__(storage, [name for pk, name in rows])
+        self.rows = rows
+        self.renames = []
+
+
+def mocked_migration_fields(*fields):
+    def pending_rows(model, field, storage, after=None):
+        return iter([(pk, name) for pk, name in field.rows
+                     if (after is None or pk > after) and not storage.is_thumbor(name)])
+
+    return mock.patch.multiple(
+        'django_thumborstorage.management.commands.thumbor_migrate',
+        thumbor_file_fields=lambda storage_class: [(MockedModel, field) for field in fields],
+        pending_rows=pending_rows,
+        rename_rows=lambda model, field, renames: field.renames.extend(renames) or len(renames),
+    )
+
+
+class MigrateCommandTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = storages.ThumborMigrationStorage(location=os.path.join(CURRENT_DIR, ".."))
+        self.field = MockedMigrationField(self.storage, [
+            (1, 'images/HannibalSmith.jpg'),
+            (2, 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'),
+            (3, 'images/gnu.png'),
+            (4, 'images/DoesNotExists.jpg'),
+            (5, 'images/TempletonPeck.jpg'),
+        ])
+
+    def call_command(self, *args, **kwargs):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(thumbor_migrate.Command(), *args, stdout=stdout, stderr=stderr, **kwargs)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_dry_run(self):
+        with mocked_migration_fields(self.field):
+            stdout, stderr = self.call_command(dry_run=True)
+        self.assertIn("my_app.Person.photo: 4 image(s) to migrate.", stdout)
+        assert not self.MockPostClass.called, "Should not POST on Thumbor."
+
+    def test_migrate(self):
+        with mocked_migration_fields(self.field):
+            stdout, stderr = self.call_command(batch_size=2, workers=2, rate=1000)
+        self.assertEqual(self.field.renames, [
+            (1, 'images/HannibalSmith.jpg', 'image/oooooo32chars_random_idooooooooo/images/HannibalSmith.jpg'),
+            (3, 'images/gnu.png', 'image/oooooo32chars_random_idooooooooo/images/gnu.png'),
+        ])
+        self.assertEqual(sorted(call[1]["headers"]["Slug"] for call in self.MockPostClass.call_args_list), [
+            'images/HannibalSmith.jpg', 'images/TempletonPeck.jpg', 'images/gnu.png',
+        ])
+        # TempletonPeck.jpg is too small for the mocked server.
+        self.assertIn("2 migrated, 2 failed.", stdout)
+        self.assertIn("images/DoesNotExists.jpg", stderr)
+        self.assertIn("images/TempletonPeck.jpg", stderr)
+
+    def test_resume(self):
+        checkpoint = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+        self.addCleanup(os.unlink, checkpoint)
+        migration.Checkpoint(checkpoint).set("my_app.Person.photo", 2)
+        with mocked_migration_fields(self.field):
+            stdout, stderr = self.call_command(checkpoint=checkpoint)
+        self.assertEqual(self.field.renames,
+                         [(3, 'images/gnu.png', 'image/oooooo32chars_random_idooooooooo/images/gnu.png')])
+        self.assertEqual(migration.Checkpoint(checkpoint).get("my_app.Person.photo"), 5)
+
+    def test_rate(self):
+        start = time.monotonic()
+        with mocked_migration_fields(self.field):
+            # A single batch: the uploads are spaced out within it.
+            self.call_command(batch_size=100, workers=4, rate=20)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_saved_meanwhile(self):
+        with mocked_migration_fields(self.field), \
+                mock.patch('django_thumborstorage.management.commands.thumbor_migrate.rename_rows',
+                           return_value=1):
+            stdout, stderr = self.call_command(batch_size=2)
+        self.assertIn("1 migrated, 2 failed.", stdout)
+        self.assertIn("1 row(s) saved meanwhile, left as they are.", stdout)
+
+    def test_unknown_field(self):
+        with mocked_migration_fields(self.field):
+            self.assertRaises(CommandError, self.call_command, "my_app.Person.avatar")
+
+
+def mocked_backfill_fields(*fields):
+    return mock.patch.multiple(
+        'django_thumborstorage.management.commands.thumbor_dedupe_backfill',
+        thumbor_file_fields=lambda: [(MockedModel, field) for field in fields],
+        field_names=lambda model, field: iter(field.names),
+    )
+
+
+class DedupeBackfillCommandTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.MockGetClass.side_effect = mocked_thumbor_streaming_get_response
+        self.storage = storages.ThumborStorage(options={"dedupe": {"options": {"prefix": uuid.uuid4().hex}}})
+        self.field = MockedMigrationField(self.storage, [
+            (1, 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'),
+            (2, 'image/5247a82854384f228c6fba432c67e6a8/people/TempletonPeck.jpg'),
+            (3, 'images/gnu.png'),
+            (4, 'image/e8a82fa321e344dfaddcbaa997845302/people/DoesNotExists.jpg'),
+        ])
+
+    def call_command(self, *args, **kwargs):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(thumbor_dedupe_backfill.Command(), *args, stdout=stdout, stderr=stderr, **kwargs)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_backfill(self):
+        with mocked_backfill_fields(self.field):
+            stdout, stderr = self.call_command(workers=2)
+        content = open(os.path.join(IMAGE_DIR, "TempletonPeck.jpg"), "rb").read()
+        self.assertEqual(self.storage.dedupe_index.get(hashlib.sha256(content).hexdigest()),
+                         "5247a82854384f228c6fba432c67e6a8")
+        self.assertEqual(self.MockGetClass.call_count, 2)
+        self.assertIn("1 original(s) indexed, 1 failed.", stdout)
+        self.assertIn("DoesNotExists.jpg", stderr)
+        # Already indexed.
+        with mocked_backfill_fields(self.field):
+            stdout, stderr = self.call_command()
+        self.assertIn("0 original(s) indexed, 1 failed.", stdout)
+
+    def test_without_index(self):
+        field = MockedMigrationField(storages.ThumborStorage(), self.field.rows)
+        with mocked_backfill_fields(field):
+            self.assertRaises(CommandError, self.call_command, "my_app.Person.photo")
+            stdout, stderr = self.call_command()
+        self.assertIn("0 original(s) indexed, 0 failed.", stdout)
+        assert not self.MockGetClass.called, "Should not GET on Thumbor."
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(DeleteOrphansCommandTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(MigrateCommandTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(DedupeBackfillCommandTest))
+    return suite
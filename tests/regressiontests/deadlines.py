@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import time
+import unittest
+
+import mock
+import requests
+from django.test import RequestFactory, override_settings
+from django_thumborstorage import bulk
+from django_thumborstorage import deadlines
+from django_thumborstorage import exceptions
+from django_thumborstorage import pool
+from django_thumborstorage import storages
+
+URL = "http://rw.thumbor-server/image/5247a82854384f228c6fba432c67e6a8"
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+class TimeoutsTest(unittest.TestCase):
+    def test_defaults(self):
+        timeouts = deadlines.Timeouts()
+        self.assertEqual(timeouts.get("upload"), (5, 60))
+        self.assertEqual(timeouts.get("download"), (5, 30))
+        self.assertEqual(timeouts.get("size"), (5, 10))
+        self.assertEqual(timeouts.get("get"), (5, 30))
+
+    def test_config(self):
+        timeouts = deadlines.Timeouts({"upload": 120, "exists": [1, 2], "delete": None, "default": (2, 3)})
+        self.assertEqual(timeouts.get("upload"), (120, 120))
+        self.assertEqual(timeouts.get("exists"), (1, 2))
+        self.assertEqual(timeouts.get("dimensions"), (1, 2))
+        self.assertIsNone(timeouts.get("delete"))
+        self.assertEqual(timeouts.get("post"), (2, 3))
+
+
+class DeadlineTest(unittest.TestCase):
+    def test_no_deadline(self):
+        self.assertIsNone(deadlines.remaining())
+        self.assertEqual(deadlines.bounded((5, 30)), (5, 30))
+        with deadlines.deadline(None):
+            self.assertIsNone(deadlines.remaining())
+
+    def test_bounded(self):
+        with deadlines.deadline(2):
+            connect, read = deadlines.bounded((5, 1))
+            self.assertLessEqual(connect, 2)
+            self.assertEqual(read, 1)
+            self.assertLessEqual(deadlines.bounded(None)[1], 2)
+        self.assertIsNone(deadlines.remaining())
+
+    def test_nested(self):
+        with deadlines.deadline(1):
+            with deadlines.deadline(10):
+                self.assertLessEqual(deadlines.remaining(), 1)
+            with deadlines.deadline(0.5):
+                self.assertLessEqual(deadlines.remaining(), 0.5)
+            self.assertGreater(deadlines.remaining(), 0.5)
+
+    def test_expired(self):
+        with deadlines.deadline(0):
+            self.assertRaises(exceptions.DeadlineExceededException, deadlines.bounded, (5, 30))
+
+    def test_threads(self):
+        with deadlines.deadline(10):
+            results = list(bulk.run(lambda name: deadlines.remaining(), ["a", "b"]))
+        self.assertTrue(all(0 < result.value <= 10 for result in results))
+
+
+class ConnectionPoolTimeoutsTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+        self.http = pool.ConnectionPool(timeouts={"exists": 3})
+
+    def test_operation(self):
+        with mock.patch.object(requests.Session, "head", return_value=Response(200)) as head:
+            self.http.head(URL, operation="exists")
+            head.assert_called_with(URL, timeout=(3, 3))
+            self.http.head(URL, operation="exists", timeout=1)
+            head.assert_called_with(URL, timeout=(1, 1))
+        with mock.patch.object(requests.Session, "delete", return_value=Response(204)) as delete:
+            self.http.delete(URL)
+            delete.assert_called_with(URL, timeout=(5, 10))
+
+    @override_settings(THUMBOR_TIMEOUTS={"exists": 2}, THUMBOR_RETRIES={"total": 1})
+    def test_default_pool(self):
+        http = storages.ThumborStorageFile("image/5247a82854384f228c6fba432c67e6a8", "rb").http
+        self.assertEqual(http.timeouts.get("exists"), (2, 2))
+        self.assertEqual(http.retry_policy.total, 1)
+
+    def test_deadline(self):
+        with mock.patch.object(requests.Session, "get", return_value=Response(200)) as get:
+            with deadlines.deadline(1):
+                self.http.get(URL, operation="download")
+            self.assertLessEqual(get.call_args[1]["timeout"][1], 1)
+            with deadlines.deadline(0):
+                self.assertRaises(exceptions.DeadlineExceededException, self.http.get, URL)
+        self.assertEqual(get.call_count, 1)
+
+    def test_deadline_retries(self):
+        http = pool.ConnectionPool(retries={"total": 5, "backoff": 10, "max_backoff": 10})
+        with mock.patch.object(requests.Session, "get", return_value=Response(503)) as get:
+            with mock.patch("random.uniform", return_value=10):
+                start = time.monotonic()
+                with deadlines.deadline(0.05):
+                    self.assertRaises(exceptions.DeadlineExceededException, http.get, URL)
+        # The backoff does not sleep past the deadline.
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(get.call_count, 1)
+
+
+class DeadlineMiddlewareTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+
+    @override_settings(THUMBOR_REQUEST_DEADLINE=2)
+    def test_sync(self):
+        middleware = deadlines.deadline_middleware(lambda request: deadlines.remaining())
+        self.assertLessEqual(middleware(None), 2)
+        self.assertIsNone(deadlines.remaining())
+
+    @override_settings(THUMBOR_REQUEST_DEADLINE=2)
+    def test_async(self):
+        async def get_response(request):
+            return deadlines.remaining()
+        middleware = deadlines.deadline_middleware(get_response)
+        self.assertLessEqual(asyncio.run(middleware(None)), 2)
+
+    def test_no_deadline(self):
+        middleware = deadlines.deadline_middleware(lambda request: deadlines.remaining())
+        self.assertIsNone(middleware(None))
+
+    @override_settings(THUMBOR_REQUEST_DEADLINE=0)
+    def test_exceeded(self):
+        def get_response(request):
+            deadlines.bounded(None)
+        request = RequestFactory().get("/people/")
+        with self.assertLogs("django_thumborstorage", "WARNING"):
+            response = deadlines.deadline_middleware(get_response)(request)
+        self.assertEqual(response.status_code, 504)
+
+        async def aget_response(request):
+            deadlines.bounded(None)
+        with self.assertLogs("django_thumborstorage", "WARNING"):
+            response = asyncio.run(deadlines.deadline_middleware(aget_response)(request))
+        self.assertEqual(response.status_code, 504)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TimeoutsTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(DeadlineTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ConnectionPoolTimeoutsTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(DeadlineMiddlewareTest))
+    return suite
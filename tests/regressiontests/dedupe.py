@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import os
+import unittest
+import uuid
+
+import mock
+from django.core.files.base import ContentFile, File
+from django_thumborstorage import dedupe
+from django_thumborstorage import fields
+from django_thumborstorage import storages
+
+from .storages import DjangoThumborTestCase
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+KEY = "oooooo32chars_random_idooooooooo"
+
+
+class NonSeekable(io.RawIOBase):
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+
+def image(filename="HannibalSmith.jpg"):
+    return ContentFile(open(f'{IMAGE_DIR}/{filename}', "rb").read())
+
+
+class CacheHashIndexTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+        self.index = dedupe.CacheHashIndex(prefix=uuid.uuid4().hex)
+
+    def test_index(self):
+        self.assertIsNone(self.index.get("digest"))
+        self.index.set("digest", KEY)
+        self.assertEqual(self.index.get("digest"), KEY)
+        self.assertEqual(self.index.digest(KEY), "digest")
+        self.index.discard(KEY)
+        self.assertIsNone(self.index.get("digest"))
+        self.assertIsNone(self.index.digest(KEY))
+
+    def test_discard_uploaded_again(self):
+        self.index.set("digest", KEY)
+        self.index.set("digest", "5247a82854384f228c6fba432c67e6a8")
+        self.index.discard(KEY)
+        self.assertEqual(self.index.get("digest"), "5247a82854384f228c6fba432c67e6a8")
+
+    def test_get_index(self):
+        self.assertIsInstance(dedupe.get_index(True), dedupe.CacheHashIndex)
+        index = dedupe.get_index({"index": "django_thumborstorage.dedupe.CacheHashIndex",
+                                  "options": {"alias": "default", "timeout": 60}})
+        self.assertEqual(index.timeout, 60)
+
+    def test_content_digest(self):
+        content = image()
+        content.read(10)
+        self.assertEqual(dedupe.content_digest(content, chunk_size=1000),
+                         hashlib.sha256(content.file.getvalue()).hexdigest())
+        self.assertEqual(content.tell(), 0)
+        self.assertIsNone(dedupe.content_digest(File(NonSeekable())))
+
+
+class DedupeStorageTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = storages.ThumborStorage(options={"dedupe": {"options": {"prefix": uuid.uuid4().hex}}})
+
+    def test_disabled(self):
+        self.assertIsNone(storages.ThumborStorage().dedupe_index)
+        storage = storages.ThumborStorage()
+        storage.save('people/HannibalSmith.jpg', image())
+        storage.save('people/HannibalSmith.jpg', image())
+        self.assertEqual(self.MockPostClass.call_count, 2)
+
+    def test_save(self):
+        name = self.storage.save('people/HannibalSmith.jpg', image())
+        self.assertEqual(name, f'image/{KEY}/people/HannibalSmith.jpg')
+        self.assertEqual(self.storage.dedupe_index.get(hashlib.sha256(image().file.getvalue()).hexdigest()), KEY)
+        name = self.storage.save('avatars/HannibalSmith.jpg', image())
+        self.assertEqual(name, f'image/{KEY}/avatars/HannibalSmith.jpg')
+        self.assertEqual(self.MockPostClass.call_count, 1)
+        self.assertEqual(self.MockHeadClass.call_count, 1)
+        # Another content.
+        self.storage.save('people/gnu.png', image("gnu.png"))
+        self.assertEqual(self.MockPostClass.call_count, 2)
+
+    def test_save_without_verify(self):
+        self.storage.options["dedupe"]["verify"] = False
+        self.storage.save('people/HannibalSmith.jpg', image())
+        self.storage.save('people/Unknown.jpg', image())
+        self.assertEqual(self.MockPostClass.call_count, 1)
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
+
+    def test_save_deleted_original(self):
+        self.storage.save('people/HannibalSmith.jpg', image())
+        # Not found on the mocked server: the original was deleted.
+        name = self.storage.save('people/Unknown.jpg', image())
+        self.assertEqual(name, f'image/{KEY}/people/Unknown.jpg')
+        self.assertEqual(self.MockPostClass.call_count, 2)
+
+    def referenced(self, *names):
+        """Patch the file fields using a ThumborStorage to hold ``names``."""
+        model = mock.Mock()
+        model._default_manager.filter.return_value.values_list.return_value = list(names)
+        field = mock.Mock(attname="photo")
+        return mock.patch.object(fields, "thumbor_file_fields", return_value=[(model, field)])
+
+    def test_delete_shared(self):
+        name = self.storage.save('people/HannibalSmith.jpg', image())
+        with self.referenced(name, f'image/{KEY}/avatars/HannibalSmith.jpg'):
+            self.assertTrue(self.storage.may_be_shared(name))
+            # Still used by another row: kept.
+            self.storage.delete(name)
+            [result] = self.storage.delete_many([name])
+        self.assertFalse(result.value)
+        assert not self.MockDeleteClass.called, "Should not DELETE on Thumbor."
+        self.assertEqual(self.storage.dedupe_index.digest(KEY), hashlib.sha256(image().file.getvalue()).hexdigest())
+        # The same name in two rows.
+        with self.referenced(name, name):
+            self.assertTrue(self.storage.may_be_shared(name))
+        self.assertFalse(self.storage.may_be_shared('image/5247a82854384f228c6fba432c67e6a8/TempletonPeck.jpg'))
+        self.assertFalse(storages.ThumborStorage().may_be_shared(name))
+
+    def test_delete_last(self):
+        name = self.storage.save('people/HannibalSmith.jpg', image())
+        with self.referenced(f'/{name}'):
+            self.assertFalse(self.storage.may_be_shared(name))
+            self.storage.delete(name)
+        self.assertEqual(self.MockDeleteClass.call_count, 1)
+        self.assertIsNone(self.storage.dedupe_index.digest(KEY))
+
+    def test_delete_original(self):
+        name = self.storage.save('people/HannibalSmith.jpg', image())
+        [result] = self.storage.delete_many([name], force=True)
+        self.assertTrue(result.ok)
+        self.assertEqual(self.MockDeleteClass.call_count, 1)
+        self.assertIsNone(self.storage.dedupe_index.digest(KEY))
+        self.storage.save('people/HannibalSmith.jpg', image())
+        self.assertEqual(self.MockPostClass.call_count, 2)
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(CacheHashIndexTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(DedupeStorageTest))
+    return suite
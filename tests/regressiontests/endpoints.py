@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import unittest
+
+from django.core.files.base import ContentFile
+from django_thumborstorage import endpoints
+from django_thumborstorage import signals
+from django_thumborstorage import storages
+
+from .storages import DjangoThumborTestCase, mocked_thumbor_head_response
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+SERVERS = ["http://rw1.thumbor-server", "http://rw2.thumbor-server", "http://rw3.thumbor-server"]
+TEMPLETON = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+
+
+def finish(url, status=200, exception=None):
+    """Signal the end of a request to ``url`` like the connection pool does."""
+    context = {}
+    signals.request_finished.send(sender=None, operation="download", method="GET", url=url, key=None,
+                                  context=context, status=status, bytes_sent=0, bytes_received=0,
+                                  duration=0, exception=exception)
+
+
+class Response:
+    def __init__(self, status_code, server=None):
+        self.status_code = status_code
+        self.server = server
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class MockedHttp:
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def get(self, url, **kwargs):
+        status = self.statuses[url.rsplit("/", 1)[0]]
+        if isinstance(status, Exception):
+            raise status
+        return Response(status)
+
+
+class EndpointsTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+
+    def endpoints(self, **config):
+        config.setdefault("health_check_interval", 3600)
+        endpoints_ = endpoints.Endpoints(SERVERS, **config)
+        self.addCleanup(endpoints_.close)
+        return endpoints_
+
+    def test_single(self):
+        endpoints_ = endpoints.Endpoints(["http://rw.thumbor-server/"])
+        self.assertEqual(endpoints_.write_server(), "http://rw.thumbor-server")
+        self.assertEqual(endpoints_.read_server(), "http://rw.thumbor-server")
+        self.assertEqual(endpoints_.hedged(lambda server: server), "http://rw.thumbor-server")
+        self.assertFalse(signals.request_finished.has_listeners())
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, endpoints.Endpoints, [])
+        self.assertRaises(ValueError, endpoints.Endpoints, SERVERS, write="random")
+
+    def test_round_robin(self):
+        endpoints_ = self.endpoints()
+        self.assertEqual([endpoints_.write_server() for i in range(4)], SERVERS + SERVERS[:1])
+
+    def test_least_loaded(self):
+        endpoints_ = self.endpoints(write="least_loaded")
+        endpoints_.endpoints[0].in_flight = 2
+        endpoints_.endpoints[2].in_flight = 1
+        self.assertEqual(endpoints_.write_server(), SERVERS[1])
+        endpoints_._request_started(None, url=f"{SERVERS[1]}/image")
+        endpoints_._request_started(None, url=f"{SERVERS[1]}/image")
+        self.assertEqual(endpoints_.write_server(), SERVERS[2])
+
+    def test_in_flight(self):
+        endpoints_ = self.endpoints()
+        context = {}
+        signals.request_started.send(sender=None, operation="upload", method="POST", url=f"{SERVERS[0]}/image",
+                                     key=None, context=context)
+        self.assertEqual(endpoints_.endpoints[0].in_flight, 1)
+        finish(f"{SERVERS[0]}/image")
+        self.assertEqual(endpoints_.endpoints[0].in_flight, 0)
+
+    def test_passive_health(self):
+        endpoints_ = self.endpoints(failure_threshold=2)
+        finish(f"{SERVERS[0]}/image", status=503)
+        finish(f"{SERVERS[0]}/image", exception=ConnectionError())
+        finish(f"{SERVERS[1]}/image", status=503)
+        finish(f"{SERVERS[1]}/image", status=404)
+        self.assertEqual([endpoint.healthy for endpoint in endpoints_.endpoints], [False, True, True])
+        self.assertEqual({endpoints_.read_server() for i in range(4)}, set(SERVERS[1:]))
+        for endpoint in endpoints_.endpoints:
+            endpoint.healthy = False
+        self.assertEqual({endpoints_.read_server() for i in range(3)}, set(SERVERS))
+
+    def test_no_health_checks(self):
+        endpoints_ = self.endpoints(failure_threshold=1, health_check_interval=None)
+        finish(f"{SERVERS[0]}/image", status=503)
+        self.assertTrue(endpoints_.endpoints[0].healthy)
+
+    def test_check(self):
+        endpoints_ = self.endpoints()
+        endpoints_.endpoints[0].healthy = False
+        endpoints_.check(MockedHttp({SERVERS[0]: 200, SERVERS[1]: 500, SERVERS[2]: ConnectionError()}))
+        self.assertEqual([endpoint.healthy for endpoint in endpoints_.endpoints], [True, False, False])
+
+    def test_hedged(self):
+        endpoints_ = self.endpoints(hedge_after=0.01)
+        release = threading.Event()
+        responses = []
+
+        def request(server):
+            if server == SERVERS[0]:
+                # The first server hangs until the second answered.
+                release.wait(5)
+            response = Response(200, server)
+            responses.append(response)
+            return response
+        response = endpoints_.hedged(request)
+        release.set()
+        self.assertNotEqual(response.server, SERVERS[0])
+        endpoints_._executor.shutdown(wait=True)
+        slow = [r for r in responses if r.server == SERVERS[0]]
+        self.assertTrue(slow[0].closed)
+        self.assertFalse(response.closed)
+
+    def test_not_hedged(self):
+        endpoints_ = self.endpoints(hedge_after=1)
+        self.assertEqual(endpoints_.hedged(lambda server: Response(200, server)).server, SERVERS[0])
+        self.assertRaises(ZeroDivisionError, endpoints_.hedged, lambda server: 1 / 0)
+
+
+class StorageEndpointsTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = storages.ThumborStorage(options={
+            "rw_servers": SERVERS[:2], "rw_balancing": {"health_check_interval": None}})
+        self.addCleanup(self.storage.endpoints.close)
+
+    def test_save(self):
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        self.storage.save('people/HannibalSmith.jpg', content)
+        self.storage.save('people/HannibalSmith.jpg', content)
+        self.assertEqual(sorted(call[0][0] for call in self.MockPostClass.call_args_list),
+                         [f"{SERVERS[0]}/image", f"{SERVERS[1]}/image"])
+
+    def test_read(self):
+        self.MockHeadClass.side_effect = mocked_thumbor_head_response
+        self.storage.exists(TEMPLETON)
+        self.storage.open(TEMPLETON).read()
+        self.assertEqual(sorted([self.MockHeadClass.call_args[0][0], self.MockGetClass.call_args[0][0]]),
+                         [f"{SERVERS[0]}/{TEMPLETON}", f"{SERVERS[1]}/{TEMPLETON}"])
+
+    def test_process_wide(self):
+        self.assertIs(self.storage.endpoints, storages.ThumborStorage(options={
+            "rw_servers": SERVERS[:2], "rw_balancing": {"health_check_interval": None}}).endpoints)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(EndpointsTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(StorageEndpointsTest))
+    return suite
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import os
+import types
+import unittest
+
+from django.core.files.base import ContentFile
+from django_thumborstorage import storages
+from django_thumborstorage.fields import ThumborImageField, ThumborImageFieldFile, prefetch_thumbor_metadata
+
+from .storages import DjangoThumborTestCase
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+TEMPLETON = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+MISSING = 'image/e8a82fa321e344dfaddcbaa997845302/people/DoesNotExists.jpg'
+
+
+class PrefetchThumborMetadataTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = storages.ThumborMigrationStorage()
+        self.field = ThumborImageField(storage=self.storage)
+
+    def people(self, *names):
+        return [types.SimpleNamespace(photo=ThumborImageFieldFile(None, self.field, name)) for name in names]
+
+    def test_prefetch(self):
+        people = self.people(TEMPLETON, MISSING, TEMPLETON, None, 'people/fs/ChuckNorris.jpg')
+        self.assertIs(prefetch_thumbor_metadata(people, "photo"), people)
+        self.assertEqual(self.MockHeadClass.call_count, 2)
+        self.assertEqual(people[0].photo.thumbor_metadata,
+                         {"exists": True, "size": 9730, "content_type": None})
+        self.assertEqual(people[1].photo.thumbor_metadata, {"exists": False})
+        self.assertEqual(people[2].photo.thumbor_metadata, people[0].photo.thumbor_metadata)
+        self.assertFalse(hasattr(people[3].photo, "thumbor_metadata"))
+        self.assertIsNone(people[4].photo.thumbor_metadata)
+        # Served from memory.
+        self.assertTrue(self.storage.exists(TEMPLETON))
+        self.assertFalse(self.storage.exists(MISSING))
+        self.assertEqual(people[0].photo.size, 9730)
+        self.assertEqual(self.MockHeadClass.call_count, 2)
+
+    def test_evicted(self):
+        self.storage = storages.ThumborMigrationStorage(options={"metadata_max_entries": 1})
+        self.field = ThumborImageField(storage=self.storage)
+        people = self.people(TEMPLETON, MISSING)
+        prefetch_thumbor_metadata(people, "photo")
+        self.assertEqual(len(self.storage.metadata), 1)
+        self.assertEqual(people[0].photo.size, 9730)
+        self.assertTrue(people[0].photo.exists())
+        self.assertFalse(people[1].photo.exists())
+        self.assertEqual(self.MockHeadClass.call_count, 2)
+
+    def test_already_known(self):
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        name = self.storage.save('people/HannibalSmith.jpg', content)
+        [person] = self.people(name)
+        prefetch_thumbor_metadata([person], "photo")
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
+        self.assertTrue(person.photo.thumbor_metadata["exists"])
+        self.assertEqual((person.photo.width, person.photo.height), (300, 220))
+
+    def test_failed(self):
+        self.MockHeadClass.side_effect = ConnectionError()
+        [person] = self.people(TEMPLETON)
+        prefetch_thumbor_metadata([person], "photo")
+        self.assertIsNone(person.photo.thumbor_metadata)
+        self.assertIsNone(self.storage.metadata.get("5247a82854384f228c6fba432c67e6a8"))
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(PrefetchThumborMetadataTest)
+    return suite
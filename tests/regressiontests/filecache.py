@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+from django_thumborstorage import filecache
+
+
+class OriginalsCacheTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.location = tempfile.mkdtemp()
+        self.cache = filecache.OriginalsCache(self.location, max_size=250)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def test_store_and_open(self):
+        key = '5247a82854384f228c6fba432c67e6a8'
+        self.assertIsNone(self.cache.open(key))
+        f = self.cache.store(key, [b"abc", b"def"], etag='"1234"')
+        self.assertEqual(f.read(), b"abcdef")
+        f.close()
+        self.assertEqual(self.cache.path(key), os.path.join(self.location, '52', key))
+        with self.cache.open(key) as f:
+            self.assertEqual(f.read(), b"abcdef")
+        self.assertEqual(self.cache.etag(key), '"1234"')
+        self.cache.delete(key)
+        self.assertIsNone(self.cache.open(key))
+        self.assertIsNone(self.cache.etag(key))
+
+    def test_failed_store(self):
+        key = '5247a82854384f228c6fba432c67e6a8'
+
+        def chunks():
+            yield b"abc"
+            raise IOError
+
+        self.assertRaises(IOError, self.cache.store, key, chunks())
+        self.assertIsNone(self.cache.open(key))
+        self.assertEqual(os.listdir(os.path.join(self.location, '52')), [])
+
+    def test_evict_least_recently_used(self):
+        keys = ['%032d' % i for i in range(3)]
+        for i, key in enumerate(keys):
+            self.cache.store(key, [b"x" * 100]).close()
+            os.utime(self.cache.path(key), (time.time() - 100 + i, time.time() - 100 + i))
+        # The third one made the first one go.
+        self.assertIsNone(self.cache.open(keys[0]))
+        # Reading the second one makes it the most recently used.
+        self.cache.open(keys[1]).close()
+        self.cache.store('%032d' % 3, [b"x" * 100]).close()
+        self.assertIsNone(self.cache.open(keys[2]))
+        self.assertIsNotNone(self.cache.open(keys[1]))
+        self.assertEqual(sum(size for mtime, size, key in self.cache.entries()), 200)
+
+    def test_size_counted(self):
+        cache = filecache.OriginalsCache(self.location, max_size=250, clock=lambda: self.now)
+        self.now = 0
+        with mock.patch.object(cache, "entries", wraps=cache.entries) as entries:
+            cache.store('%032d' % 0, [b"x" * 100]).close()
+            self.assertEqual(entries.call_count, 1)
+            cache.store('%032d' % 1, [b"x" * 100]).close()
+            cache.delete('%032d' % 1)
+            cache.store('%032d' % 2, [b"x" * 100]).close()
+            # Counted without walking the directory while under max_size.
+            self.assertEqual(entries.call_count, 1)
+            cache.store('%032d' % 3, [b"x" * 100]).close()
+            self.assertEqual(entries.call_count, 2)
+            self.assertIsNone(cache.open('%032d' % 0))
+            # Measured again once in a while for the files of the other processes.
+            self.now = filecache.DEFAULT_RESCAN_INTERVAL
+            cache.store('%032d' % 4, [b"x" * 10]).close()
+            self.assertEqual(entries.call_count, 3)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(OriginalsCacheTest)
+    return suite
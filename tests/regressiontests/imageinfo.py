@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import unittest
+
+from django_thumborstorage import imageinfo
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+
+def feed_by(data, size):
+    parser = imageinfo.ImageInfoParser()
+    for i in range(0, len(data), size):
+        parser.feed(data[i:i + size])
+    return parser
+
+
+class ImageInfoParserTest(unittest.TestCase):
+    def test_jpeg(self):
+        data = open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read()
+        self.assertEqual(imageinfo.image_info(data), {"format": "jpeg", "width": 300, "height": 220})
+        parser = feed_by(data, 1)
+        self.assertEqual(parser.info, {"format": "jpeg", "width": 300, "height": 220})
+        self.assertTrue(parser.done)
+
+    def test_jpeg_large_exif(self):
+        header = open(f'{IMAGE_DIR}/TempletonPeck.jpg', "rb").read()
+        # Insert a 60 KB APP1 segment after the SOI marker.
+        app1 = b"\xff\xe1" + struct.pack(">H", 60000) + b"Exif\x00\x00" + b"\x00" * (60000 - 8)
+        data = header[:2] + app1 + header[2:]
+        parser = feed_by(data, 4096)
+        self.assertEqual(parser.info, {"format": "jpeg", "width": 300, "height": 220})
+        # The segment has been skipped, not buffered.
+        self.assertLess(max(len(parser._buffer), 0), 4096)
+
+    def test_png(self):
+        data = open(f'{IMAGE_DIR}/bouboune.png', "rb").read()
+        self.assertEqual(feed_by(data, 3).info, {"format": "png", "width": 48, "height": 53})
+
+    def test_gif(self):
+        data = b"GIF89a" + struct.pack("<HH", 640, 480) + b"\x00" * 20
+        self.assertEqual(imageinfo.image_info(data), {"format": "gif", "width": 640, "height": 480})
+
+    def test_webp(self):
+        vp8 = b"RIFF\x00\x00\x00\x00WEBPVP8 " + b"\x00" * 10 + struct.pack("<HH", 1024, 768)
+        self.assertEqual(imageinfo.image_info(vp8), {"format": "webp", "width": 1024, "height": 768})
+        bits = (1024 - 1) | ((768 - 1) << 14)
+        vp8l = b"RIFF\x00\x00\x00\x00WEBPVP8L\x00\x00\x00\x00\x2f" + struct.pack("<I", bits) + b"\x00" * 5
+        self.assertEqual(imageinfo.image_info(vp8l), {"format": "webp", "width": 1024, "height": 768})
+        vp8x = (b"RIFF\x00\x00\x00\x00WEBPVP8X" + b"\x00" * 8
+                + (1024 - 1).to_bytes(3, "little") + (768 - 1).to_bytes(3, "little"))
+        self.assertEqual(imageinfo.image_info(vp8x), {"format": "webp", "width": 1024, "height": 768})
+
+    def test_unknown(self):
+        parser = feed_by(b"This is not an image at all.", 4)
+        self.assertTrue(parser.done)
+        self.assertIsNone(parser.info)
+
+    def test_max_bytes(self):
+        parser = imageinfo.ImageInfoParser(max_bytes=10)
+        data = open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read()
+        parser.feed(data[:12])
+        self.assertTrue(parser.done)
+        self.assertIsNone(parser.info)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(ImageInfoParserTest)
+    return suite
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import unittest
+
+import mock
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django_thumborstorage import metadata, storages
+
+from .storages import DjangoThumborTestCase
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+TEMPLETON = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+MISSING = 'image/e8a82fa321e344dfaddcbaa997845302/people/DoesNotExists.jpg'
+
+
+class MetadataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = metadata.MetadataCache(max_entries=2, negative_timeout=60, clock=lambda: self.now)
+
+    def test_lru(self):
+        self.cache.update("a", size=1)
+        self.cache.update("b", size=2)
+        self.cache.get("a")
+        self.cache.update("c", size=3)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), {"size": 1})
+        self.assertEqual(len(self.cache), 2)
+
+    def test_negative_timeout(self):
+        self.cache.update("a", exists=False)
+        self.cache.update("b", exists=True)
+        self.now = 59
+        self.assertEqual(self.cache.get("a"), {"exists": False})
+        self.now = 60
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), {"exists": True})
+
+    def test_timeout(self):
+        cache = metadata.MetadataCache(timeout=5, clock=lambda: self.now)
+        cache.update("a", exists=True)
+        self.now = 5
+        self.assertIsNone(cache.get("a"))
+
+    def test_found_again(self):
+        self.cache.update("a", exists=False)
+        self.cache.update("a", exists=True, size=1)
+        self.now = 3600
+        self.assertEqual(self.cache.get("a"), {"exists": True, "size": 1})
+
+
+class SharedMetadataCacheTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.config = {"metadata_cache": {"prefix": f"thumbor-metadata-{self.id()}"}}
+        self.storage = storages.ThumborStorage(options=self.config)
+
+    def tearDown(self):
+        caches["default"].clear()
+        super().tearDown()
+
+    def other_node(self):
+        return storages.ThumborStorage(options=self.config)
+
+    def test_shared(self):
+        self.assertTrue(self.storage.exists(TEMPLETON))
+        self.assertEqual(self.storage.size(TEMPLETON), 9730)
+        self.assertEqual(self.MockHeadClass.call_count, 2)
+        other = self.other_node()
+        self.assertTrue(other.exists(TEMPLETON))
+        self.assertEqual(other.size(TEMPLETON), 9730)
+        self.assertEqual(self.MockHeadClass.call_count, 2)
+        self.assertEqual(len(other.metadata), 1)
+
+    def test_save(self):
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        name = self.storage.save('people/HannibalSmith.jpg', content)
+        other = self.other_node()
+        self.assertTrue(other.exists(name))
+        self.assertEqual(other.size(name), content.size)
+        self.assertEqual(other.dimensions(name), (300, 220))
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
+        assert not self.MockGetClass.called, "Should not GET on Thumbor."
+
+    def test_delete(self):
+        self.storage.size(TEMPLETON)
+        other = self.other_node()
+        self.assertTrue(other.exists(TEMPLETON))
+        self.storage.delete(TEMPLETON)
+        self.assertIsNone(self.other_node().metadata.get('5247a82854384f228c6fba432c67e6a8'))
+        # Still known by the process of the other node for local_timeout seconds...
+        self.assertTrue(other.exists(TEMPLETON))
+        self.assertEqual(self.MockHeadClass.call_count, 1)
+        # ... then asked to Thumbor again.
+        other.metadata.local.clock = lambda: time.monotonic() + metadata.DEFAULT_LOCAL_TIMEOUT
+        self.MockHeadClass.side_effect = lambda url, **kwargs: mock.Mock(status_code=404, headers={})
+        self.assertFalse(other.exists(TEMPLETON))
+        self.assertEqual(self.MockHeadClass.call_count, 2)
+
+    def test_negative(self):
+        self.assertFalse(self.storage.exists(MISSING))
+        self.assertFalse(self.other_node().exists(MISSING))
+        self.assertEqual(self.MockHeadClass.call_count, 1)
+        key = self.storage.metadata.cache_key('e8a82fa321e344dfaddcbaa997845302')
+        # Expired in the Django cache.
+        caches["default"].delete(key)
+        self.assertFalse(self.other_node().exists(MISSING))
+        self.assertEqual(self.MockHeadClass.call_count, 2)
+
+    def test_negative_timeout(self):
+        with mock.patch.object(caches["default"], "set") as cache_set:
+            self.storage.exists(MISSING)
+            self.storage.exists(TEMPLETON)
+        self.assertEqual(cache_set.call_args_list[0].args[2], metadata.DEFAULT_NEGATIVE_TIMEOUT)
+        self.assertIsNone(cache_set.call_args_list[1].args[2])
+
+    def test_disabled(self):
+        self.assertIsInstance(storages.ThumborStorage().metadata, metadata.MetadataCache)
+        storage = storages.ThumborStorage(options={"metadata_cache": True})
+        self.assertEqual(storage.metadata.alias, "default")
+        self.assertEqual(storage.metadata.local.timeout, metadata.DEFAULT_LOCAL_TIMEOUT)
+        self.assertIsNone(storages.ThumborStorage().metadata.timeout)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(MetadataCacheTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(SharedMetadataCacheTest))
+    return suite
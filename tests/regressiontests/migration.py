@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import unittest
+
+import mock
+from django_thumborstorage import migration
+from django_thumborstorage import storages
+
+from .storages import DjangoThumborTestCase
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+
+
+class MockedField:
+    attname = "photo"
+
+    def __init__(self, storage):
+        self.storage = storage
+
+
+def mocked_model(referenced=True):
+    model = mock.Mock()
+    model._default_manager.filter.return_value.exists.return_value = referenced
+    model._default_manager.filter.return_value.update.return_value = 1
+    return model
+
+
+class ReadMigratorTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = storages.ThumborMigrationStorage(location=os.path.join(CURRENT_DIR, ".."),
+                                                        options={"migrate_on_read": {"rate": 0}})
+        self.model = mocked_model()
+        patcher = mock.patch.object(migration, "storage_fields",
+                                    return_value=[(self.model, MockedField(self.storage))])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read(self, name):
+        with self.storage.open(name) as f:
+            f.read()
+
+    def test_disabled(self):
+        self.assertIsNone(storages.ThumborMigrationStorage().read_migrator)
+        storage = storages.ThumborMigrationStorage(options={"migrate_on_read": True})
+        self.assertEqual(storage.read_migrator.rate, migration.DEFAULT_READ_MIGRATION_RATE)
+
+    def test_migrate_on_read(self):
+        self.read('images/HannibalSmith.jpg')
+        self.read('images/HannibalSmith.jpg')
+        self.storage.read_migrator.join()
+        self.assertEqual(self.MockPostClass.call_count, 1)
+        self.assertEqual(self.MockPostClass.call_args[1]["headers"]["Slug"], 'images/HannibalSmith.jpg')
+        self.model._default_manager.filter.assert_called_with(photo='images/HannibalSmith.jpg')
+        self.model._default_manager.filter.return_value.update.assert_called_once_with(
+            photo='image/oooooo32chars_random_idooooooooo/images/HannibalSmith.jpg')
+
+    def test_migrate_file(self):
+        with mock.patch.object(self.storage.read_migrator, "enqueue") as enqueue:
+            name = migration.migrate_file(self.storage, 'images/HannibalSmith.jpg')
+        self.assertEqual(name, 'image/oooooo32chars_random_idooooooooo/images/HannibalSmith.jpg')
+        assert not enqueue.called, "Should not queue the file being migrated."
+
+    def test_thumbor_image(self):
+        self.read('image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg')
+        self.assertIsNone(self.storage.read_migrator._queue)
+
+    def test_not_referenced(self):
+        self.model._default_manager.filter.return_value.exists.return_value = False
+        self.read('images/HannibalSmith.jpg')
+        self.storage.read_migrator.join()
+        assert not self.MockPostClass.called, "Should not POST on Thumbor."
+
+    def test_failure(self):
+        # TempletonPeck.jpg is too small for the mocked server.
+        with self.assertLogs("django_thumborstorage", "WARNING"):
+            self.read('images/TempletonPeck.jpg')
+            self.storage.read_migrator.join()
+        self.read('images/gnu.png')
+        self.storage.read_migrator.join()
+        self.model._default_manager.filter.return_value.update.assert_called_once_with(
+            photo='image/oooooo32chars_random_idooooooooo/images/gnu.png')
+
+    def test_forgotten(self):
+        migrator = migration.ReadMigrator(self.storage, rate=0, max_queue=2)
+        outcomes = {"images/a.jpg": "image/aaa/images/a.jpg"}
+        with mock.patch.object(migrator, "migrate", side_effect=outcomes.get):
+            for name in ("images/a.jpg", "images/b.jpg", "images/c.jpg", "images/d.jpg"):
+                self.assertTrue(migrator.enqueue(name))
+                migrator.join()
+            # Only the last max_queue names not migrated are remembered.
+            self.assertEqual(migrator._queued, set())
+            self.assertEqual(list(migrator._skipped), ["images/c.jpg", "images/d.jpg"])
+            self.assertFalse(migrator.enqueue("images/d.jpg"))
+            self.assertTrue(migrator.enqueue("images/b.jpg"))
+            migrator.join()
+
+    def test_queue_full(self):
+        release = threading.Event()
+        migrator = migration.ReadMigrator(self.storage, rate=0, max_queue=1)
+        with mock.patch.object(migrator, "migrate", side_effect=lambda name: release.wait(5)):
+            self.assertTrue(migrator.enqueue("images/a.jpg"))
+            # Wait for the thread to take the first name.
+            while migrator._queue.qsize():
+                time.sleep(0.001)
+            self.assertTrue(migrator.enqueue("images/b.jpg"))
+            self.assertFalse(migrator.enqueue("images/c.jpg"))
+            self.assertFalse(migrator.enqueue("images/b.jpg"))
+            release.set()
+            migrator.join()
+            # A dropped name can be queued again.
+            self.assertTrue(migrator.enqueue("images/c.jpg"))
+            migrator.join()
+
+    def test_rate(self):
+        migrator = migration.ReadMigrator(self.storage, rate=20)
+        start = time.monotonic()
+        for i in range(3):
+            migrator.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+
+class RenameRowsTest(unittest.TestCase):
+    def test_conditional(self):
+        model = mocked_model()
+        model._default_manager.filter.return_value.update.side_effect = [1, 0]
+        renames = [(1, 'images/a.jpg', 'image/aaa/images/a.jpg'), (2, 'images/b.jpg', 'image/bbb/images/b.jpg')]
+        with mock.patch.object(migration.transaction, "atomic"):
+            self.assertEqual(migration.rename_rows(model, MockedField(None), renames), 1)
+        self.assertEqual(model._default_manager.filter.call_args_list,
+                         [mock.call(pk=1, photo='images/a.jpg'), mock.call(pk=2, photo='images/b.jpg')])
+        model._default_manager.filter.return_value.update.assert_called_with(photo='image/bbb/images/b.jpg')
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_threads(self):
+        limiter = migration.RateLimiter(20)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limiter.wait) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_unlimited(self):
+        limiter = migration.RateLimiter(0)
+        start = time.monotonic()
+        for i in range(100):
+            limiter.wait()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(ReadMigratorTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(RenameRowsTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(RateLimiterTest))
+    return suite
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import mock
+from django_thumborstorage import pool
+from django_thumborstorage import storages
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"x" * 100
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = "http://127.0.0.1:%s/image/5247a82854384f228c6fba432c67e6a8" % cls.server.server_port
+
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_connections_are_reused(self):
+        http = pool.ConnectionPool(pool_maxsize=2)
+        for i in range(10):
+            self.assertEqual(http.get(self.url).status_code, 200)
+        stats = http.stats()
+        self.assertEqual(stats["requests"], 10)
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["reused"], 9)
+        self.assertEqual(stats["hosts"], ["http://127.0.0.1:%s" % self.server.server_port])
+        http.reset()
+
+    def test_no_keep_alive(self):
+        http = pool.ConnectionPool(keep_alive=False)
+        self.assertEqual(http.session.headers["Connection"], "close")
+        http.reset()
+
+    def test_new_session_after_fork(self):
+        http = pool.ConnectionPool()
+        session = http.session
+        self.assertIs(http.session, session)
+        with mock.patch("django_thumborstorage.pool.os.getpid", return_value=os.getpid() + 1):
+            self.assertIsNot(http.session, session)
+            self.assertEqual(http.stats()["requests"], 0)
+
+    def test_get_pool_is_shared(self):
+        self.assertIs(pool.get_pool(), pool.get_pool())
+        self.assertIsNot(pool.get_pool(), pool.get_pool(pool_maxsize=50))
+
+    def test_storage_pool_options(self):
+        storage = storages.ThumborStorage(options={"pool_maxsize": 42})
+        self.assertEqual(storage.http.pool_maxsize, 42)
+        self.assertIs(storage.http, storages.ThumborStorage(options={"pool_maxsize": 42}).http)
+        self.assertIs(storages.ThumborStorage().http, pool.get_pool())
+        thumbor_file = storage.open("image/5247a82854384f228c6fba432c67e6a8")
+        self.assertIs(thumbor_file.http, storage.http)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(ConnectionPoolTest)
+    return suite
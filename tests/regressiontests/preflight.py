@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import unittest
+
+import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django_thumborstorage import exceptions
+from django_thumborstorage import imageinfo
+from django_thumborstorage import preflight
+from django_thumborstorage import storages
+
+from .storages import DjangoThumborTestCase
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    Image = None
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+HANNIBAL = {"format": "jpeg", "width": 300, "height": 220}
+
+
+def image(filename="HannibalSmith.jpg"):
+    return ContentFile(open(f'{IMAGE_DIR}/{filename}', "rb").read(), name=filename)
+
+
+def rotated_jpeg():
+    """A 40x20 JPEG displayed 20x40, with its EXIF orientation."""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = "Camera"
+    output = io.BytesIO()
+    Image.new("RGB", (40, 20), "red").save(output, format="JPEG", exif=exif.tobytes())
+    return output.getvalue()
+
+
+class ValidateTest(unittest.TestCase):
+    def test_read_info(self):
+        content = image()
+        self.assertEqual(preflight.read_info(content), HANNIBAL)
+        self.assertEqual(content.tell(), 0)
+        self.assertIsNone(preflight.read_info(ContentFile(b"Not an image." * 10)))
+
+    def test_validate(self):
+        content = image()
+        preflight.validate(content, HANNIBAL, {"max_size": content.size, "min_width": 300, "max_height": 220,
+                                               "max_pixels": 300 * 220, "formats": ["jpeg", "png"]})
+        for limits in ({"max_size": content.size - 1}, {"min_width": 301}, {"min_height": 221},
+                       {"max_width": 299}, {"max_height": 219}, {"max_pixels": 300 * 219},
+                       {"formats": ["png"]}):
+            self.assertRaises(exceptions.ImageValidationException, preflight.validate, content, HANNIBAL, limits)
+
+    def test_not_an_image(self):
+        content = ContentFile(b"Not an image." * 10)
+        preflight.validate(content, None, {"max_size": 1000})
+        self.assertRaises(exceptions.ImageValidationException, preflight.validate, content, None, {"min_width": 1})
+        self.assertRaises(Exception, preflight.validate, content, None, {"min_width": 1})
+
+    def test_unknown_limit(self):
+        self.assertRaises(ImproperlyConfigured, preflight.validate, image(), HANNIBAL, {"min_size": 1})
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed.")
+class NormalizeTest(unittest.TestCase):
+    def test_small_enough(self):
+        content = image()
+        self.assertIs(preflight.normalize(content, HANNIBAL, max_edge=300, processes=0), content)
+        self.assertIs(preflight.normalize(content, None, max_edge=100, strip_metadata=True, processes=0), content)
+
+    def test_downscale(self):
+        content = preflight.normalize(image(), HANNIBAL, max_edge=100, processes=0)
+        self.assertEqual(content.name, "HannibalSmith.jpg")
+        self.assertEqual(imageinfo.image_info(content.read()), {"format": "jpeg", "width": 100, "height": 73})
+
+    def test_process_pool(self):
+        content = preflight.normalize(image("gnu.png"), preflight.read_info(image("gnu.png")), max_edge=50,
+                                      processes=1)
+        info = imageinfo.image_info(content.read())
+        self.assertEqual((info["format"], max(info["width"], info["height"])), ("png", 50))
+
+    def test_temporary_uploaded_file(self):
+        from django.core.files.uploadedfile import TemporaryUploadedFile
+
+        content = TemporaryUploadedFile('HannibalSmith.jpg', 'image/jpeg', 0, None)
+        self.addCleanup(content.close)
+        content.write(image().read())
+        content.seek(0)
+        with mock.patch.object(preflight, "reencode", wraps=preflight.reencode) as reencode:
+            normalized = preflight.normalize(content, HANNIBAL, max_edge=100, processes=0)
+        self.assertEqual(reencode.call_args[0][0], content.temporary_file_path())
+        self.assertEqual(imageinfo.image_info(normalized.read())["width"], 100)
+
+    def test_animation(self):
+        frames = [Image.new("RGB", (40, 20), color) for color in ("red", "blue")]
+        output = io.BytesIO()
+        frames[0].save(output, format="WEBP", save_all=True, append_images=frames[1:])
+        content = ContentFile(output.getvalue(), name="anim.webp")
+        self.assertIs(preflight.normalize(content, imageinfo.image_info(output.getvalue()), max_edge=10,
+                                          processes=0), content)
+
+    def test_executor(self):
+        executor = preflight.get_executor(1)
+        self.assertIs(preflight.get_executor(1), executor)
+        self.assertIn(executor._mp_context.get_start_method(), ("forkserver", "spawn"))
+
+    def test_strip_metadata(self):
+        data = rotated_jpeg()
+        info = imageinfo.image_info(data)
+        stripped = Image.open(io.BytesIO(preflight.reencode(data, "JPEG", strip_metadata=True)))
+        self.assertEqual(stripped.size, (20, 40))
+        self.assertNotIn("exif", stripped.info)
+        kept = Image.open(io.BytesIO(preflight.normalize(ContentFile(data), info, max_edge=30,
+                                                         processes=0).read()))
+        self.assertEqual(kept.size, (15, 30))
+        self.assertEqual(kept.getexif().get(0x010F), "Camera")
+        self.assertNotIn(0x0112, kept.getexif())
+
+
+class PreflightStorageTest(DjangoThumborTestCase):
+    def test_validation(self):
+        storage = storages.ThumborStorage(options={"upload_validation": {"min_width": 400}})
+        self.assertRaises(exceptions.ImageValidationException, storage.save, 'people/HannibalSmith.jpg', image())
+        assert not self.MockPostClass.called, "Should not POST on Thumbor."
+        storage.options["upload_validation"] = {"max_width": 400}
+        storage.save('people/HannibalSmith.jpg', image())
+        self.assertEqual(self.MockPostClass.call_count, 1)
+
+    @unittest.skipIf(Image is None, "Pillow is not installed.")
+    def test_normalization(self):
+        storage = storages.ThumborStorage(options={"upload_normalization": {"max_edge": 280, "processes": 0}})
+        # The mocked server refuses the images under 10000 bytes.
+        name = storage.save('people/HannibalSmith.jpg', image())
+        self.assertEqual(storage.dimensions(name), (280, 205))
+        data = self.MockPostClass.call_args[1]["data"]
+        self.assertNotEqual(len(data), image().size)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(ValidateTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(NormalizeTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(PreflightStorageTest))
+    return suite
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import mock
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from django.core.files.base import ContentFile
+from django_thumborstorage import exceptions
+from django_thumborstorage import pool
+from django_thumborstorage import resilience
+from django_thumborstorage import storages
+from django_thumborstorage import streams
+
+URL = "http://rw.thumbor-server/image/5247a82854384f228c6fba432c67e6a8"
+
+
+def refused():
+    """The ``requests.ConnectionError`` of a connection which could not be established."""
+    reason = NewConnectionError(None, "Failed to establish a new connection: [Errno 111] Connection refused")
+    return requests.ConnectionError(MaxRetryError(None, URL, reason))
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_idempotent(self):
+        policy = resilience.RetryPolicy(total=2)
+        for method in ("GET", "HEAD", "DELETE"):
+            self.assertTrue(policy.retry_exception(method, requests.ConnectionError(), 0))
+            self.assertTrue(policy.retry_exception(method, requests.ReadTimeout(), 1))
+            self.assertFalse(policy.retry_exception(method, requests.ReadTimeout(), 2))
+            self.assertTrue(policy.retry_status(method, 503, 0))
+            self.assertFalse(policy.retry_status(method, 500, 0))
+            self.assertFalse(policy.retry_status(method, 404, 0))
+        self.assertFalse(policy.retry_exception("GET", ValueError(), 0))
+
+    def test_post(self):
+        policy = resilience.RetryPolicy(total=2)
+        self.assertTrue(policy.retry_exception("POST", refused(), 0))
+        self.assertTrue(policy.retry_exception("POST", requests.ConnectTimeout(), 0))
+        # The connection may have been lost once the body was sent.
+        aborted = requests.ConnectionError(ConnectionError("Connection aborted.", "RemoteDisconnected"))
+        self.assertFalse(policy.retry_exception("POST", aborted, 0))
+        self.assertFalse(policy.retry_exception("POST", requests.ConnectionError(), 0))
+        self.assertFalse(policy.retry_exception("POST", requests.ReadTimeout(), 0))
+        self.assertFalse(policy.retry_status("POST", 503, 0))
+
+    def test_delay(self):
+        policy = resilience.RetryPolicy(backoff=0.1, max_backoff=0.3)
+        for attempt, ceiling in [(0, 0.1), (1, 0.2), (2, 0.3), (10, 0.3)]:
+            for i in range(20):
+                self.assertTrue(0 <= policy.delay(attempt) <= ceiling)
+
+    def test_rewind_body(self):
+        content = ContentFile(b"x" * 100)
+        body = streams.UploadBody(content)
+        body.read()
+        self.assertTrue(resilience.rewind_body({"data": body}))
+        self.assertEqual(len(body.read()), 100)
+        self.assertTrue(resilience.rewind_body({}))
+        self.assertTrue(resilience.rewind_body({"data": b"x"}))
+        self.assertFalse(resilience.rewind_body({"data": iter([b"x"])}))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = resilience.CircuitBreaker(failure_rate=0.5, min_requests=4, window=10,
+                                                 reset_timeout=5, clock=self.clock)
+
+    def test_open(self):
+        for success in (True, False, True):
+            self.breaker.before_request()
+            self.breaker.record(success)
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "open")
+        self.assertRaises(exceptions.CircuitOpenException, self.breaker.before_request)
+        # Caught by Django and by the views.
+        self.assertRaises(Exception, self.breaker.before_request)
+
+    def test_window(self):
+        for i in range(3):
+            self.breaker.record(False)
+        self.clock.now = 11
+        self.breaker.record(True)
+        self.breaker.record(True)
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open(self):
+        for i in range(4):
+            self.breaker.record(False)
+        self.clock.now = 5
+        self.breaker.before_request()
+        self.assertEqual(self.breaker.state, "half-open")
+        # Only one probe at a time.
+        self.assertRaises(exceptions.CircuitOpenException, self.breaker.before_request)
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now = 10
+        self.breaker.before_request()
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.before_request()
+
+
+class ConnectionPoolResilienceTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
+        self.http = pool.ConnectionPool(retries={"total": 2, "backoff": 0},
+                                        circuit_breaker={"min_requests": 4, "reset_timeout": 60})
+
+    def test_retry_get(self):
+        with mock.patch.object(requests.Session, "get",
+                               side_effect=[requests.ConnectionError(), Response(503), Response(200)]) as get:
+            self.assertEqual(self.http.get(URL).status_code, 200)
+        self.assertEqual(get.call_count, 3)
+
+    def test_retry_exhausted(self):
+        with mock.patch.object(requests.Session, "get", side_effect=requests.ReadTimeout()) as get:
+            self.assertRaises(requests.ReadTimeout, self.http.get, URL)
+        self.assertEqual(get.call_count, 3)
+
+    def test_retry_post(self):
+        body = streams.UploadBody(ContentFile(b"x" * 100))
+
+        def post(url, data, timeout=None):
+            if post.calls == 0:
+                post.calls += 1
+                data.read(10)
+                raise refused()
+            self.assertEqual(len(data.read()), 100)
+            return Response(201)
+        post.calls = 0
+        with mock.patch.object(requests.Session, "post", side_effect=post):
+            self.assertEqual(self.http.post(URL, data=body).status_code, 201)
+
+    def test_no_retry_post(self):
+        with mock.patch.object(requests.Session, "post", side_effect=requests.ReadTimeout()) as post:
+            self.assertRaises(requests.ReadTimeout, self.http.post, URL, data=b"x")
+        with mock.patch.object(requests.Session, "post", side_effect=[Response(503)]) as post:
+            self.assertEqual(self.http.post(URL, data=b"x").status_code, 503)
+        # A streamed body cannot be sent twice.
+        with mock.patch.object(requests.Session, "post", side_effect=refused()) as post:
+            self.assertRaises(requests.ConnectionError, self.http.post, URL, data=iter([b"x"]))
+        self.assertEqual(post.call_count, 1)
+
+    def test_circuit_breaker(self):
+        http = pool.ConnectionPool(circuit_breaker={"min_requests": 4, "reset_timeout": 60})
+        with mock.patch.object(requests.Session, "get", side_effect=requests.ConnectionError()) as get:
+            for i in range(4):
+                self.assertRaises(requests.ConnectionError, http.get, URL)
+            self.assertRaises(exceptions.CircuitOpenException, http.get, URL)
+        self.assertEqual(get.call_count, 4)
+        self.assertEqual(http.stats()["circuit_breakers"], {"rw.thumbor-server": "open"})
+        # Another host has its own circuit breaker.
+        with mock.patch.object(requests.Session, "get", return_value=Response(404)):
+            self.assertEqual(http.get("http://other.thumbor-server/image").status_code, 404)
+
+    def test_interrupted_probe(self):
+        http = pool.ConnectionPool(circuit_breaker={"min_requests": 1, "reset_timeout": 0})
+        with mock.patch.object(requests.Session, "get", side_effect=requests.ConnectionError()):
+            self.assertRaises(requests.ConnectionError, http.get, URL)
+        breaker = http.circuit_breakers.get(URL)
+        self.assertEqual(breaker.state, "open")
+        with mock.patch.object(requests.Session, "get", side_effect=KeyboardInterrupt()):
+            self.assertRaises(KeyboardInterrupt, http.get, URL)
+        self.assertEqual(breaker.state, "open")
+        with mock.patch.object(requests.Session, "get", return_value=Response(200)):
+            self.assertEqual(http.get(URL).status_code, 200)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_storage_options(self):
+        storage = storages.ThumborStorage(options={"retries": {"total": 3}, "circuit_breaker": {"window": 60}})
+        self.assertEqual(storage.http.retry_policy.total, 3)
+        self.assertEqual(storage.http.circuit_breakers.config, {"window": 60})
+        self.assertIs(storage.http, storages.ThumborStorage(options={"retries": {"total": 3},
+                                                                     "circuit_breaker": {"window": 60}}).http)
+        self.assertIsNone(storages.ThumborStorage().http.retry_policy)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(RetryPolicyTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(CircuitBreakerTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ConnectionPoolResilienceTest))
+    return suite
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import unittest
+
+import requests
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django_thumborstorage import signals
+from django_thumborstorage import storages
+from django_thumborstorage.instrumentation import OpenTelemetryTracing, PrometheusMetrics
+
+from .storages import DjangoThumborTestCase
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover
+    prometheus_client = None
+
+try:
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+except ImportError:  # pragma: no cover
+    TracerProvider = None
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+TEMPLETON = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+
+
+class SignalsTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = storages.ThumborStorage()
+        self.started, self.finished = [], []
+        signals.request_started.connect(self.on_started)
+        signals.request_finished.connect(self.on_finished)
+
+    def tearDown(self):
+        signals.request_started.disconnect(self.on_started)
+        signals.request_finished.disconnect(self.on_finished)
+        super().tearDown()
+
+    def on_started(self, sender, **kwargs):
+        kwargs["context"]["started"] = True
+        self.started.append(kwargs)
+
+    def on_finished(self, sender, **kwargs):
+        self.finished.append(kwargs)
+
+    def test_save(self):
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        self.storage.save('people/HannibalSmith.jpg', content)
+        [started], [finished] = self.started, self.finished
+        self.assertEqual(started["operation"], "upload")
+        self.assertEqual(started["method"], "POST")
+        self.assertEqual(started["url"], f"{settings.THUMBOR_RW_SERVER}/image")
+        self.assertIsNone(started["key"])
+        self.assertEqual(finished["status"], 201)
+        self.assertEqual(finished["bytes_sent"], content.size)
+        self.assertGreaterEqual(finished["duration"], 0)
+        self.assertIsNone(finished["exception"])
+        self.assertEqual(finished["context"], {"started": True})
+
+    def test_exists(self):
+        self.assertTrue(self.storage.exists(TEMPLETON))
+        [finished] = self.finished
+        self.assertEqual(finished["operation"], "exists")
+        self.assertEqual(finished["method"], "HEAD")
+        self.assertEqual(finished["key"], "5247a82854384f228c6fba432c67e6a8")
+        self.assertEqual(finished["status"], 200)
+
+    def test_operations(self):
+        self.storage.size(TEMPLETON)
+        self.storage.open(TEMPLETON).read()
+        self.storage.delete(TEMPLETON)
+        self.assertEqual([(finished["operation"], finished["method"]) for finished in self.finished],
+                         [("size", "HEAD"), ("download", "GET"), ("delete", "DELETE")])
+        self.assertEqual(self.finished[1]["bytes_received"], 9730)
+
+    def test_exception(self):
+        self.MockHeadClass.side_effect = requests.ConnectionError
+        with self.assertRaises(requests.ConnectionError):
+            self.storage.exists(TEMPLETON)
+        [finished] = self.finished
+        self.assertIsNone(finished["status"])
+        self.assertIsInstance(finished["exception"], requests.ConnectionError)
+
+    def test_logging(self):
+        with self.assertLogs("django_thumborstorage", logging.DEBUG) as cm:
+            self.storage.exists(TEMPLETON)
+        [record] = cm.output
+        self.assertIn("exists HEAD", record)
+
+
+@unittest.skipIf(prometheus_client is None, "prometheus_client is not installed")
+class PrometheusMetricsTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = prometheus_client.CollectorRegistry()
+        self.metrics = PrometheusMetrics(registry=self.registry).connect()
+
+    def tearDown(self):
+        self.metrics.disconnect()
+        super().tearDown()
+
+    def test_metrics(self):
+        storage = storages.ThumborStorage()
+        storage.exists(TEMPLETON)
+        storage.exists('image/e8a82fa321e344dfaddcbaa997845302/DoesNotExists.jpg')
+        storage.open(TEMPLETON).read()
+        value = self.registry.get_sample_value
+        self.assertEqual(value("thumbor_storage_requests_total", {"operation": "exists", "status": "200"}), 1)
+        self.assertEqual(value("thumbor_storage_requests_total", {"operation": "exists", "status": "404"}), 1)
+        self.assertEqual(value("thumbor_storage_request_duration_seconds_count", {"operation": "exists"}), 2)
+        self.assertEqual(value("thumbor_storage_received_bytes_total", {"operation": "download"}), 9730)
+
+
+@unittest.skipIf(TracerProvider is None, "opentelemetry-sdk is not installed")
+class OpenTelemetryTracingTest(DjangoThumborTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(self.exporter))
+        self.tracing = OpenTelemetryTracing(tracer_provider=provider).connect()
+
+    def tearDown(self):
+        self.tracing.disconnect()
+        super().tearDown()
+
+    def test_spans(self):
+        storage = storages.ThumborStorage()
+        storage.exists(TEMPLETON)
+        self.MockDeleteClass.side_effect = requests.ConnectionError
+        with self.assertRaises(requests.ConnectionError):
+            storage.delete(TEMPLETON)
+        exists, delete = self.exporter.get_finished_spans()
+        self.assertEqual(exists.name, "thumbor exists")
+        self.assertEqual(exists.attributes["thumbor.key"], "5247a82854384f228c6fba432c67e6a8")
+        self.assertEqual(exists.attributes["http.response.status_code"], 200)
+        self.assertTrue(exists.status.is_ok)
+        self.assertEqual(delete.name, "thumbor delete")
+        self.assertFalse(delete.status.is_ok)
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(SignalsTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(PrometheusMetricsTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(OpenTelemetryTracingTest))
+    return suite
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import mock
+from django_thumborstorage import signing
+
+
+class URLSignerTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.signer = signing.URLSigner('http://ro.thumbor-server', 'MY_SECURE_KEY', max_entries=2)
+
+    def test_url(self):
+        self.assertEqual(self.signer.url('5247a82854384f228c6fba432c67e6a8'),
+                         'http://ro.thumbor-server/qn6d7XNEzldMxgE8t4oVjEbEsDg=/5247a82854384f228c6fba432c67e6a8')
+
+    def test_url_options(self):
+        url = self.signer.url('5247a82854384f228c6fba432c67e6a8', width=300, height=200,
+                              filters=['quality(80)'])
+        self.assertIn('/300x200/filters:quality(80)/5247a82854384f228c6fba432c67e6a8', url)
+
+    def test_cache(self):
+        with mock.patch.object(self.signer._crypto, 'generate', wraps=self.signer._crypto.generate) as generate:
+            first = self.signer.url('5247a82854384f228c6fba432c67e6a8', filters=['quality(80)'])
+            self.assertEqual(self.signer.url('5247a82854384f228c6fba432c67e6a8', filters=['quality(80)']), first)
+            self.assertEqual(generate.call_count, 1)
+            self.signer.url('5247a82854384f228c6fba432c67e6a8', width=10)
+            self.signer.url('e8a82fa321e344dfaddcbaa997845302')
+            # The first url has been evicted.
+            self.signer.url('5247a82854384f228c6fba432c67e6a8', filters=['quality(80)'])
+            self.assertEqual(generate.call_count, 4)
+
+    def test_urls(self):
+        keys = ['5247a82854384f228c6fba432c67e6a8', 'e8a82fa321e344dfaddcbaa997845302']
+        self.assertEqual(self.signer.urls(keys), [self.signer.url(key) for key in keys])
+
+    def test_image_options(self):
+        self.assertEqual(signing.image_options(), {})
+        self.assertEqual(signing.image_options(width=320, height=240.0, smart=True, format='webp', quality=80,
+                                               filters=['grayscale()'], fit_in=True),
+                         {'width': 320, 'height': 240, 'smart': True, 'fit_in': True,
+                          'filters': ['grayscale()', 'format(webp)', 'quality(80)']})
+
+    def test_srcset(self):
+        key = '5247a82854384f228c6fba432c67e6a8'
+        srcset = self.signer.srcset(key, [320, 640], format='webp', height_ratio=0.5)
+        self.assertEqual(srcset, ", ".join([
+            f"{self.signer.url(key, width=320, height=160, filters=['format(webp)'])} 320w",
+            f"{self.signer.url(key, width=640, height=320, filters=['format(webp)'])} 640w",
+        ]))
+        self.assertIn('/320x160/filters:format(webp)/', srcset)
+
+    def test_get_signer(self):
+        self.assertIs(signing.get_signer('http://ro.thumbor-server', 'MY_SECURE_KEY'),
+                      signing.get_signer('http://ro.thumbor-server', 'MY_SECURE_KEY'))
+        self.assertIsNot(signing.get_signer('http://ro.thumbor-server', 'MY_SECURE_KEY'),
+                         signing.get_signer('http://ro.thumbor-server', 'OTHER_KEY'))
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(URLSignerTest)
+    return suite
@@ -1,20 +1,30 @@
 # -*- coding: utf-8 -*-
 
 import os
+import shutil
+import tempfile
 import unittest
 import requests
 import mock
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django_thumborstorage import storages
+from django_thumborstorage import deadlines
 from django_thumborstorage import exceptions
+from django_thumborstorage import pool
+from django_thumborstorage import streams
 
 CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
 IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
 
+DOWNLOAD_TIMEOUT = deadlines.DEFAULT_TIMEOUTS["download"]
+EXISTS_TIMEOUT = deadlines.DEFAULT_TIMEOUTS["exists"]
+DELETE_TIMEOUT = deadlines.DEFAULT_TIMEOUTS["delete"]
+
 
 class MockedGetResponse:
     status_code = 200
+    content = b""
 
     def __init__(self, url):
         """Retrieve the file on the filesytem according to the name. """
@@ -27,19 +37,124 @@ class MockedGetResponse:
             self.content = open(filename, "rb").read()
 
 
-def mocked_thumbor_get_response(url):
+def mocked_thumbor_get_response(url, **kwargs):
     response = MockedGetResponse(url)
     return response
 
 
+class MockedStreamingGetResponse(MockedGetResponse):
+    headers = {"ETag": '"d41d8cd98f"'}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def mocked_thumbor_streaming_get_response(url, stream=False, timeout=None):
+    assert stream, "Should stream the response."
+    response = MockedStreamingGetResponse(url)
+    return response
+
+
+def mocked_thumbor_conditional_get_response(url, headers=None, stream=False, timeout=None):
+    response = mocked_thumbor_streaming_get_response(url, stream=stream)
+    if response.status_code == 200 and (headers or {}).get("If-None-Match") == response.headers["ETag"]:
+        response.status_code = 304
+    return response
+
+
+class MockedHeadResponse:
+    status_code = 200
+
+    def __init__(self, url):
+        basename = os.path.basename(url)
+        filename = os.path.join(IMAGE_DIR, basename)
+        self.headers = {}
+        if not os.path.exists(filename):
+            self.status_code = 404
+        else:
+            self.headers["Content-Length"] = str(os.path.getsize(filename))
+
+
+def mocked_thumbor_head_response(url, **kwargs):
+    response = MockedHeadResponse(url)
+    return response
+
+
+class MockedRangeResponse:
+    status_code = 206
+
+    def __init__(self, url, range_header="bytes=0-0"):
+        basename = os.path.basename(url)
+        filename = os.path.join(IMAGE_DIR, basename)
+        self.content = b""
+        if not os.path.exists(filename):
+            self.status_code = 404
+            self.headers = {}
+        else:
+            content = open(filename, "rb").read()
+            start, end = [int(bound) for bound in range_header[len("bytes="):].split("-")]
+            end = min(end, len(content) - 1)
+            self.content = content[start:end + 1]
+            self.headers = {"Content-Range": f"bytes {start}-{end}/{len(content)}"}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def mocked_thumbor_head_no_length_response(url, **kwargs):
+    response = MockedHeadResponse(url)
+    response.headers = {}
+    return response
+
+
+def mocked_thumbor_head_error_response(url, **kwargs):
+    response = MockedHeadResponse(url)
+    response.status_code = 500
+    response.headers = {"Content-Length": "27"}
+    return response
+
+
+def mocked_thumbor_head_not_allowed_response(url, **kwargs):
+    response = MockedHeadResponse(url)
+    response.status_code = 405
+    return response
+
+
+def mocked_thumbor_range_response(url, **kwargs):
+    range_header = kwargs.get("headers", {}).get("Range")
+    if range_header:
+        return MockedRangeResponse(url, range_header)
+    return MockedGetResponse(url)
+
+
+def mocked_thumbor_range_error_response(url, **kwargs):
+    response = MockedRangeResponse(url)
+    response.status_code = 503
+    response.headers = {}
+    response.content = b"<html>Service Unavailable</html>"
+    return response
+
+
 class MockedPostResponse:
     status_code = 201
     headers = {}
     reason = ''
 
 
-def mocked_thumbor_post_response(url, data, headers):
+def mocked_thumbor_post_response(url, data, headers, timeout=None):
+    if hasattr(data, "read"):
+        # Consume the request body like the transport would do.
+        data = data.read()
     response = MockedPostResponse()
+    response.headers = {}
     if len(data) < 10000:
         response.status_code = 412
         response.reason = "Image too small"
@@ -48,6 +163,14 @@ def mocked_thumbor_post_response(url, data, headers):
     return response
 
 
+def mocked_thumbor_post_streaming_response(url, data, headers, timeout=None):
+    # Consume the request body like the transport would do, chunk by chunk.
+    chunks = [chunk for chunk in data]
+    response = mocked_thumbor_post_response(url, b"".join(chunks), headers)
+    response.chunks = chunks
+    return response
+
+
 class MockedDeleteAllowedResponse:
     status_code = 204
     content = ''
@@ -59,7 +182,7 @@ class MockedDeleteAllowedResponse:
             self.status_code = 404
 
 
-def mocked_thumbor_delete_allowed_response(url):
+def mocked_thumbor_delete_allowed_response(url, timeout=None):
     response = MockedDeleteAllowedResponse(url)
     return response
 
@@ -68,7 +191,7 @@ class MockedDeleteNotAllowedResponse:
     status_code = 405
 
 
-def mocked_thumbor_delete_not_allowed_response(url):
+def mocked_thumbor_delete_not_allowed_response(url, timeout=None):
     response = MockedDeleteNotAllowedResponse()
     return response
 
@@ -77,43 +200,59 @@ class DjangoThumborTestCase(unittest.TestCase):
     def setUp(self):
         super().setUp()
         os.environ['DJANGO_SETTINGS_MODULE'] = "settings"
-        self.patcher_get = mock.patch('django_thumborstorage.storages.requests.get')
+        self.patcher_get = mock.patch('django_thumborstorage.pool.requests.Session.get')
         self.MockGetClass = self.patcher_get.start()
         self.MockGetClass.side_effect = mocked_thumbor_get_response
 
-        self.patcher_post = mock.patch('django_thumborstorage.storages.requests.post')
+        self.patcher_post = mock.patch('django_thumborstorage.pool.requests.Session.post')
         self.MockPostClass = self.patcher_post.start()
         self.MockPostClass.side_effect = mocked_thumbor_post_response
 
-        self.patcher_delete = mock.patch('django_thumborstorage.storages.requests.delete')
+        self.patcher_delete = mock.patch('django_thumborstorage.pool.requests.Session.delete')
         self.MockDeleteClass = self.patcher_delete.start()
         self.MockDeleteClass.side_effect = mocked_thumbor_delete_allowed_response
 
+        self.patcher_head = mock.patch('django_thumborstorage.pool.requests.Session.head')
+        self.MockHeadClass = self.patcher_head.start()
+        self.MockHeadClass.side_effect = mocked_thumbor_head_response
+
     def tearDown(self):
+        pool.get_pool().head_unsupported.clear()
+        self.patcher_head.stop()
         self.patcher_get.stop()
         self.patcher_post.stop()
         self.patcher_delete.stop()
 
+    def assertPosted(self, content, headers):
+        [url], kwargs = self.MockPostClass.call_args
+        self.assertEqual(url, f"{settings.THUMBOR_RW_SERVER}/image")
+        self.assertEqual(kwargs["headers"], headers)
+        # The upload is sent from its file, not from a copy.
+        self.assertIsInstance(kwargs["data"], streams.UploadBody)
+        self.assertIs(kwargs["data"].file, content.file)
+        self.assertEqual(len(kwargs["data"]), content.size)
+
 
 class ThumborStorageFileTest(DjangoThumborTestCase):
     def test_get_file(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         thumbor_file = storages.ThumborStorageFile(filename, mode='rb')
         thumbor_file.file
-        self.MockGetClass.assert_called_with("%s%s" % (settings.THUMBOR_RW_SERVER, filename))
+        self.MockGetClass.assert_called_with("%s%s" % (settings.THUMBOR_RW_SERVER, filename), timeout=DOWNLOAD_TIMEOUT)
 
     def test_get_file_post_django_3_2_11(self):
         # See https://github.com/django/django/commit/6d343d01c57eb03ca1c6826318b652709e58a76e
         filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         thumbor_file = storages.ThumborStorageFile(filename, mode='rb')
         thumbor_file.file
-        self.MockGetClass.assert_called_with("%s/%s" % (settings.THUMBOR_RW_SERVER, filename))
+        self.MockGetClass.assert_called_with("%s/%s" % (settings.THUMBOR_RW_SERVER, filename), timeout=DOWNLOAD_TIMEOUT)
 
     def test_size(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         thumbor_file = storages.ThumborStorageFile(filename, mode='rb')
         size = thumbor_file.size
-        self.MockGetClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}{filename}')
+        self.MockHeadClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}{filename}', timeout=EXISTS_TIMEOUT)
+        assert not self.MockGetClass.called, "Should not GET on Thumbor."
         self.assertEqual(size, 9730)
 
     def test_size_post_django_3_2_11(self):
@@ -121,14 +260,22 @@ class ThumborStorageFileTest(DjangoThumborTestCase):
         filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         thumbor_file = storages.ThumborStorageFile(filename, mode='rb')
         size = thumbor_file.size
-        self.MockGetClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}/{filename}')
+        self.MockHeadClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}/{filename}', timeout=EXISTS_TIMEOUT)
+        assert not self.MockGetClass.called, "Should not GET on Thumbor."
         self.assertEqual(size, 9730)
 
+    def test_size_after_read(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        thumbor_file = storages.ThumborStorageFile(filename, mode='rb')
+        thumbor_file.read()
+        self.assertEqual(thumbor_file.size, 9730)
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
+
     def test_read(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         thumbor_file = storages.ThumborStorageFile(filename, mode='rb')
         content = thumbor_file.read()
-        self.MockGetClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}{filename}')
+        self.MockGetClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}{filename}', timeout=DOWNLOAD_TIMEOUT)
         self.assertEqual(len(content), 9730)
 
     def test_read_post_django_3_2_11(self):
@@ -136,17 +283,70 @@ class ThumborStorageFileTest(DjangoThumborTestCase):
         filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         thumbor_file = storages.ThumborStorageFile(filename, mode='rb')
         content = thumbor_file.read()
-        self.MockGetClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}/{filename}')
+        self.MockGetClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}/{filename}', timeout=DOWNLOAD_TIMEOUT)
         self.assertEqual(len(content), 9730)
 
+    def test_read_streaming(self):
+        self.MockGetClass.side_effect = mocked_thumbor_streaming_get_response
+        storage = storages.ThumborStorage(options={"streaming_download": True,
+                                                   "download_chunk_size": 1000,
+                                                   "spool_max_size": 2000})
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        content = open(f'{IMAGE_DIR}/TempletonPeck.jpg', "rb").read()
+        thumbor_file = storage.open(filename)
+        self.assertEqual(thumbor_file.read(10), content[:10])
+        self.MockGetClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}/{filename}', stream=True, timeout=DOWNLOAD_TIMEOUT)
+        self.assertEqual(b"".join(thumbor_file.chunks(chunk_size=1000)), content)
+        self.assertTrue(thumbor_file.file._spool._rolled)
+        thumbor_file.close()
+        self.assertEqual(len(thumbor_file.read()), 9730)
+        self.assertEqual(self.MockGetClass.call_count, 2)
+
+    def test_read_cached(self):
+        self.MockGetClass.side_effect = mocked_thumbor_conditional_get_response
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        storage = storages.ThumborStorage(options={"originals_cache": {"location": location}})
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        for i in range(3):
+            thumbor_file = storage.open(filename)
+            self.assertEqual(len(thumbor_file.read()), 9730)
+            thumbor_file.close()
+        self.MockGetClass.assert_called_once_with(f'{settings.THUMBOR_RW_SERVER}/{filename}',
+                                                  headers={}, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        self.assertTrue(os.path.exists(os.path.join(location, '52', '5247a82854384f228c6fba432c67e6a8')))
+
+        storage.delete(filename)
+        self.assertIsNone(storage.originals_cache.open('5247a82854384f228c6fba432c67e6a8'))
+
+    def test_read_cached_revalidate(self):
+        self.MockGetClass.side_effect = mocked_thumbor_conditional_get_response
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        storage = storages.ThumborStorage(options={"originals_cache": {"location": location, "revalidate": True}})
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertEqual(len(storage.open(filename).read()), 9730)
+        self.assertEqual(len(storage.open(filename).read()), 9730)
+        self.MockGetClass.assert_called_with(f'{settings.THUMBOR_RW_SERVER}/{filename}',
+                                             headers={"If-None-Match": '"d41d8cd98f"'}, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        self.assertEqual(self.MockGetClass.call_count, 2)
+
+    def test_read_cached_not_found(self):
+        self.MockGetClass.side_effect = mocked_thumbor_conditional_get_response
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        storage = storages.ThumborStorage(options={"originals_cache": {"location": location}})
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/DoesNotExists.jpg'
+        storage.open(filename).file
+        storage.open(filename).file
+        self.assertEqual(self.MockGetClass.call_count, 2)
+
     def test_write_jpeg(self):
         filename = 'people/HannibalSmith.jpg'
         content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
         thumbor_file = storages.ThumborStorageFile(filename, mode="wb")
         thumbor_file.write(content=content)
-        self.MockPostClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/image",
-                                              data=content.file.read(),
-                                              headers={"Content-Type": "image/jpeg", "Slug": filename})
+        self.assertPosted(content, headers={"Content-Type": "image/jpeg", "Slug": filename})
         self.assertEqual(thumbor_file._location, f'/image/oooooo32chars_random_idooooooooo/{filename}')
 
     def test_write_png(self):
@@ -154,9 +354,7 @@ class ThumborStorageFileTest(DjangoThumborTestCase):
         content = ContentFile(open(f'{IMAGE_DIR}/gnu.png', "rb").read())
         thumbor_file = storages.ThumborStorageFile(filename, mode="wb")
         thumbor_file.write(content=content)
-        self.MockPostClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/image",
-                                              data=content.file.read(),
-                                              headers={"Content-Type": "image/png", "Slug": filename})
+        self.assertPosted(content, headers={"Content-Type": "image/png", "Slug": filename})
         self.assertEqual(thumbor_file._location, f'/image/oooooo32chars_random_idooooooooo/{filename}')
 
     def test_write_image_too_small(self):
@@ -171,16 +369,14 @@ class ThumborStorageFileTest(DjangoThumborTestCase):
         content = ContentFile(open(f'{IMAGE_DIR}/gnu.png', "rb").read())
         thumbor_file = storages.ThumborStorageFile(filename, mode="w")
         thumbor_file.write(content=content)
-        self.MockPostClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/image",
-                                              data=content.file.read(),
-                                              headers={"Content-Type": "image/png", "Slug": filename_encoded})
+        self.assertPosted(content, headers={"Content-Type": "image/png", "Slug": filename_encoded})
         self.assertEqual(thumbor_file._location, f'/image/oooooo32chars_random_idooooooooo/{filename}')
 
     def test_delete_allowed(self):
         filename = '/image/oooooo32chars_random_idooooooooo/foundations/gnu.png'
         thumbor_file = storages.ThumborStorageFile(filename, mode="wb")
         thumbor_file.delete()
-        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}")
+        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}", timeout=DELETE_TIMEOUT)
         # TODO test status_code == 204 (how ?)
 
         filename = '/image/oooooo32chars_random_idooooooooo/does_not_exists.png'
@@ -192,7 +388,7 @@ class ThumborStorageFileTest(DjangoThumborTestCase):
         filename = 'image/oooooo32chars_random_idooooooooo/foundations/gnu.png'
         thumbor_file = storages.ThumborStorageFile(filename, mode="wb")
         thumbor_file.delete()
-        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}")
+        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}", timeout=DELETE_TIMEOUT)
         # TODO test status_code == 204 (how ?)
 
         filename = '/image/oooooo32chars_random_idooooooooo/does_not_exists.png'
@@ -236,6 +432,45 @@ class ThumborStorageTest(DjangoThumborTestCase):
         self.assertEqual(self.storage.url(filename),
                          f'{settings.THUMBOR_SERVER}/qn6d7XNEzldMxgE8t4oVjEbEsDg=/5247a82854384f228c6fba432c67e6a8')
 
+    def test_urls(self):
+        filenames = ['image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg',
+                     '/image/e8a82fa321e344dfaddcbaa997845302.jpg']
+        self.assertEqual(self.storage.urls(filenames), [
+            f'{settings.THUMBOR_SERVER}/qn6d7XNEzldMxgE8t4oVjEbEsDg=/5247a82854384f228c6fba432c67e6a8',
+            f'{settings.THUMBOR_SERVER}/z6gLg9YmBMFkZO_9sVxJ3B_IGvg=/e8a82fa321e344dfaddcbaa997845302',
+        ])
+
+    def test_image_url(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        url = self.storage.image_url(filename, width=320, height=240, smart=True, format='webp', quality=80)
+        self.assertTrue(url.startswith(f'{settings.THUMBOR_SERVER}/'))
+        self.assertTrue(url.endswith('/320x240/smart/filters:format(webp):quality(80)/'
+                                     '5247a82854384f228c6fba432c67e6a8'))
+        self.assertEqual(self.storage.image_url(filename), self.storage.url(filename))
+
+    def test_srcset(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        srcset = self.storage.srcset(filename, [320, 640], format='avif')
+        self.assertEqual(srcset, ", ".join([
+            f"{self.storage.image_url(filename, width=320, format='avif')} 320w",
+            f"{self.storage.image_url(filename, width=640, format='avif')} 640w",
+        ]))
+
+    def test_template_tags(self):
+        from django_thumborstorage.templatetags import thumborstorage
+
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        image = mock.Mock(storage=self.storage)
+        image.name = filename
+        self.assertEqual(thumborstorage.thumbor_url(image, width=320, format='webp'),
+                         self.storage.image_url(filename, width=320, format='webp'))
+        self.assertEqual(thumborstorage.thumbor_srcset(image, "320, 640", quality=70),
+                         self.storage.srcset(filename, [320, 640], quality=70))
+        self.assertEqual(thumborstorage.thumbor_url(None), "")
+
+        image = mock.Mock(storage=object(), url='/media/people/fs/ChuckNorris.jpg')
+        self.assertEqual(thumborstorage.thumbor_srcset(image, [320]), '/media/people/fs/ChuckNorris.jpg')
+
     def test_key(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         self.assertEqual(self.storage.key(filename), '5247a82854384f228c6fba432c67e6a8')
@@ -253,33 +488,288 @@ class ThumborStorageTest(DjangoThumborTestCase):
     def test_size(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         size = self.storage.size(filename)
-        self.MockGetClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}")
+        self.MockHeadClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}", timeout=EXISTS_TIMEOUT)
+        assert not self.MockGetClass.called, "Should not GET on Thumbor."
         self.assertEqual(size, 9730)
 
+    def test_size_cached(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertEqual(self.storage.size(filename), 9730)
+        self.assertEqual(self.storage.size('image/5247a82854384f228c6fba432c67e6a8'), 9730)
+        self.assertEqual(self.storage.open(filename).size, 9730)
+        self.assertEqual(self.MockHeadClass.call_count, 1)
+        self.assertEqual(self.storage.metadata.get('5247a82854384f228c6fba432c67e6a8')['size'], 9730)
+
+    def test_size_head_not_allowed(self):
+        self.MockHeadClass.side_effect = mocked_thumbor_head_not_allowed_response
+        self.MockGetClass.side_effect = mocked_thumbor_range_response
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertEqual(self.storage.size(filename), 9730)
+        self.MockGetClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}",
+                                             headers={"Range": "bytes=0-0"}, stream=True, timeout=EXISTS_TIMEOUT)
+
+    def test_size_without_content_length(self):
+        self.MockHeadClass.side_effect = mocked_thumbor_head_no_length_response
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertEqual(self.storage.size(filename), 9730)
+        self.MockGetClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}", timeout=DOWNLOAD_TIMEOUT)
+
+    def test_size_not_found(self):
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/DoesNotExists.jpg'
+        self.assertRaises(exceptions.NotFoundException, self.storage.size, filename)
+
+    def test_size_not_thumbor_name(self):
+        self.assertEqual(self.storage.size('people/new/TempletonPeck.jpg'), 9730)
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
+
+    def test_size_server_error(self):
+        self.MockHeadClass.side_effect = mocked_thumbor_head_error_response
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertRaises(exceptions.DjangoThumborStorageException, self.storage.size, filename)
+        assert not self.MockGetClass.called, "Should not download the error page."
+        self.assertIsNone(self.storage.metadata.get('5247a82854384f228c6fba432c67e6a8'))
+
     def test_save(self):
         filename = 'people/HannibalSmith.jpg'
         content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
         response = self.storage.save(filename, content)
-        self.MockPostClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/image",
-                                              data=content.file.read(),
-                                              headers={"Content-Type": "image/jpeg", "Slug": filename})
+        self.assertPosted(content, headers={"Content-Type": "image/jpeg", "Slug": filename})
         self.assertEqual(response, f'image/oooooo32chars_random_idooooooooo/{filename}')
 
+    def test_save_temporary_uploaded_file(self):
+        from django.core.files.uploadedfile import TemporaryUploadedFile
+
+        content = TemporaryUploadedFile('HannibalSmith.jpg', 'image/jpeg', 0, None)
+        self.addCleanup(content.close)
+        content.write(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        thumbor_file = storages.ThumborStorageFile('people/HannibalSmith.jpg', mode="wb")
+        thumbor_file.write(content=content)
+        self.assertPosted(content, headers={"Content-Type": "image/jpeg", "Slug": 'people/HannibalSmith.jpg'})
+        self.assertEqual(thumbor_file.image_info, {"format": "jpeg", "width": 300, "height": 220})
+        # No copy of the upload is kept once posted.
+        self.assertEqual(thumbor_file.file.getvalue(), b"")
+
+    def test_save_memory(self):
+        import tracemalloc
+        from django.core.files.uploadedfile import TemporaryUploadedFile
+
+        def post(url, data, headers, timeout=None):
+            # Read the body block by block like the transport would do.
+            for block in data:
+                pass
+            return mocked_thumbor_post_response(url, b"\0" * 10000, headers)
+        self.MockPostClass.side_effect = post
+
+        def peak(size):
+            header = open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read()
+            content = TemporaryUploadedFile('HannibalSmith.jpg', 'image/jpeg', size, None)
+            self.addCleanup(content.close)
+            content.write(header)
+            for i in range((size - len(header)) // 2 ** 20):
+                content.write(b"\0" * 2 ** 20)
+            tracemalloc.start()
+            try:
+                self.storage.save('people/HannibalSmith.jpg', content)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small, large = peak(2 ** 20), peak(16 * 2 ** 20)
+        # Bounded by the upload chunk size, not by the size of the image.
+        self.assertLess(large, 2 ** 20)
+        self.assertLess(large, small + 64 * 2 ** 10)
+
+    def test_save_remember_size(self):
+        filename = 'people/HannibalSmith.jpg'
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        name = self.storage.save(filename, content)
+        self.assertEqual(self.storage.size(name), content.size)
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
+
+    def test_save_remember_dimensions(self):
+        filename = 'people/HannibalSmith.jpg'
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        name = self.storage.save(filename, content)
+        self.assertEqual(self.storage.dimensions(name), (300, 220))
+        self.assertEqual(self.storage.metadata.get('oooooo32chars_random_idooooooooo')['format'], 'jpeg')
+        self.assertIsNone(self.storage.dimensions('people/HannibalSmith.jpg'))
+
+        storage = storages.ThumborStorage(options={"streaming_upload": True, "upload_chunk_size": 100})
+        self.MockPostClass.side_effect = mocked_thumbor_post_streaming_response
+        content = ContentFile(open(f'{IMAGE_DIR}/gnu.png', "rb").read())
+        name = storage.save('foundations/gnu.png', content)
+        self.assertEqual(storage.dimensions(name), (300, 300))
+
+    def test_image_field_dimensions(self):
+        from django_thumborstorage.fields import ThumborImageField, ThumborImageFieldFile
+
+        field = ThumborImageField(storage=self.storage)
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        name = self.storage.save('people/HannibalSmith.jpg', content)
+        image = ThumborImageFieldFile(None, field, name)
+        self.assertEqual((image.width, image.height), (300, 220))
+        assert not self.MockGetClass.called, "Should not GET on Thumbor."
+
+        # Unknown to the storage: parse the header of the original.
+        self.MockGetClass.side_effect = mocked_thumbor_range_response
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        image = ThumborImageFieldFile(None, field, filename)
+        self.assertEqual((image.width, image.height), (300, 220))
+        self.MockGetClass.assert_called_once_with(f"{settings.THUMBOR_RW_SERVER}/{filename}",
+                                                  headers={"Range": "bytes=0-16383"}, stream=True, timeout=EXISTS_TIMEOUT)
+
+        # Not on Thumbor: read the image.
+        image = ThumborImageFieldFile(None, field, 'people/fs/ChuckNorris.jpg')
+        with mock.patch('django.core.files.images.get_image_dimensions', return_value=(300, 220)) as mocked:
+            self.assertEqual((image.width, image.height), (300, 220))
+        mocked.assert_called_once_with(image, close=True)
+
+    def test_dimensions(self):
+        self.MockGetClass.side_effect = mocked_thumbor_range_response
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertEqual(self.storage.dimensions(filename), (300, 220))
+        self.assertEqual(self.storage.dimensions(filename), (300, 220))
+        self.assertEqual(self.storage.size(filename), 9730)
+        self.assertEqual(self.MockGetClass.call_count, 1)
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
+
+        thumbor_file = self.storage.open(filename)
+        self.assertEqual((thumbor_file.width, thumbor_file.height), (300, 220))
+        self.assertEqual(self.MockGetClass.call_count, 1)
+
+        self.assertIsNone(self.storage.dimensions('people/new/TempletonPeck.jpg'))
+        filename = 'image/e8a82fa321e344dfaddcbaa997845302/people/new/DoesNotExists.jpg'
+        self.assertEqual(self.storage.dimensions(filename), (None, None))
+
+    def test_dimensions_unknown_format(self):
+        self.MockGetClass.side_effect = mocked_thumbor_range_response
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        with mock.patch('django_thumborstorage.imageinfo.ImageInfoParser.info', None):
+            self.assertEqual(self.storage.dimensions(filename), (None, None))
+        # The first range was the whole image.
+        self.assertEqual(self.MockGetClass.call_count, 1)
+        self.assertEqual(self.storage.dimensions(filename), (None, None))
+        self.assertEqual(self.MockGetClass.call_count, 1)
+
+    def test_dimensions_server_error(self):
+        self.MockGetClass.side_effect = mocked_thumbor_range_error_response
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertRaises(exceptions.DjangoThumborStorageException, self.storage.dimensions, filename)
+        self.assertIsNone(self.storage.metadata.get('5247a82854384f228c6fba432c67e6a8'))
+
+    def test_original_header(self):
+        self.MockGetClass.side_effect = mocked_thumbor_range_response
+        url = f'{settings.THUMBOR_RW_SERVER}/image/5247a82854384f228c6fba432c67e6a8/TempletonPeck.jpg'
+        info, size = storages.thumbor_original_header(url, first_bytes=100)
+        self.assertEqual(info, {"format": "jpeg", "width": 300, "height": 220})
+        self.assertEqual(size, 9730)
+        self.assertEqual([call[1]["headers"]["Range"] for call in self.MockGetClass.call_args_list],
+                         ["bytes=0-99", "bytes=100-262143"])
+
+    def test_original_header_range_ignored(self):
+        responses = []
+
+        def get(url, headers=None, stream=False, timeout=None):
+            response = MockedStreamingGetResponse(url)
+            response.consumed = 0
+
+            def iter_content(chunk_size):
+                for i in range(0, len(response.content), 100):
+                    response.consumed += 100
+                    yield response.content[i:i + 100]
+
+            response.iter_content = iter_content
+            responses.append(response)
+            return response
+
+        self.MockGetClass.side_effect = get
+        url = f'{settings.THUMBOR_RW_SERVER}/image/5247a82854384f228c6fba432c67e6a8/TempletonPeck.jpg'
+        info, size = storages.thumbor_original_header(url, first_bytes=100)
+        self.assertEqual(info, {"format": "jpeg", "width": 300, "height": 220})
+        self.assertIsNone(size)
+        [response] = responses
+        self.assertEqual(response.consumed, 200)
+
+    def test_save_many(self):
+        items = [(f'people/{basename}', ContentFile(open(f'{IMAGE_DIR}/{basename}', "rb").read()))
+                 for basename in ['HannibalSmith.jpg', 'bouboune.png', 'gnu.png']]
+        results = self.storage.save_many(items, max_workers=2)
+        self.assertEqual([result.name for result in results],
+                         ['people/HannibalSmith.jpg', 'people/bouboune.png', 'people/gnu.png'])
+        self.assertEqual([result.value for result in results], [
+            'image/oooooo32chars_random_idooooooooo/people/HannibalSmith.jpg',
+            None,
+            'image/oooooo32chars_random_idooooooooo/people/gnu.png',
+        ])
+        self.assertIsInstance(results[1].error, exceptions.ThumborPostException)
+        self.assertEqual(self.MockPostClass.call_count, 3)
+
+    def test_save_streaming(self):
+        storage = storages.ThumborStorage(options={"streaming_upload": True, "upload_chunk_size": 1024})
+        self.MockPostClass.side_effect = mocked_thumbor_post_streaming_response
+        filename = 'people/HannibalSmith.jpg'
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        response = storage.save(filename, content)
+        self.assertEqual(response, f'image/oooooo32chars_random_idooooooooo/{filename}')
+        [url], kwargs = self.MockPostClass.call_args
+        self.assertNotIsInstance(kwargs["data"], bytes)
+        self.assertEqual(kwargs["headers"], {"Content-Type": "image/jpeg", "Slug": filename})
+
+    def test_save_streaming_chunks(self):
+        storage = storages.ThumborStorage(options={"streaming_upload": True, "upload_chunk_size": 1024})
+        responses = []
+
+        def post(url, data, headers, timeout=None):
+            response = mocked_thumbor_post_streaming_response(url, data, headers)
+            responses.append(response)
+            return response
+
+        self.MockPostClass.side_effect = post
+        content = ContentFile(open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read())
+        storage.save('people/HannibalSmith.jpg', content)
+        [response] = responses
+        self.assertEqual(b"".join(response.chunks), content.file.getvalue())
+        self.assertTrue(all(len(chunk) <= 1024 for chunk in response.chunks))
+        self.assertGreater(len(response.chunks), 1)
+
+    def test_save_streaming_image_too_small(self):
+        storage = storages.ThumborStorage(options={"streaming_upload": True})
+        self.MockPostClass.side_effect = mocked_thumbor_post_streaming_response
+        content = ContentFile(open(f'{IMAGE_DIR}/bouboune.png', "rb").read())
+        self.assertRaises(exceptions.ThumborPostException, storage.save, 'beasts/bouboune.png', content)
+
     def test_delete(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.storage.size(filename)
         self.storage.delete(filename)
-        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}")
+        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}", timeout=DELETE_TIMEOUT)
+        self.assertIsNone(self.storage.metadata.get('5247a82854384f228c6fba432c67e6a8'))
 
     def test_delete_post_django_3_2_11(self):
         filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         self.storage.delete(filename)
-        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}")
+        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}", timeout=DELETE_TIMEOUT)
+
+    def test_delete_many(self):
+        filenames = ['image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg',
+                     'image/5247a82854384f228c6fba432c67e6a8/people/new/DoesNotExists.jpg',
+                     'image/oooooo32chars_random_idooooooooo/foundations/gnu.png']
+        results = self.storage.delete_many(filenames, max_workers=2)
+        self.assertEqual([result.name for result in results], filenames)
+        self.assertEqual([result.value for result in results], [True, False, True])
+        self.assertTrue(all(result.ok for result in results))
+
+        self.MockDeleteClass.side_effect = mocked_thumbor_delete_not_allowed_response
+        results = self.storage.delete_many(filenames)
+        self.assertTrue(all(isinstance(result.error, exceptions.MethodNotAllowedException)
+                            for result in results))
 
     def test_exists(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         self.assertTrue(self.storage.exists(filename))
-        self.MockGetClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}")
-        filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/DoesNoyExists.jpg'
+        self.MockHeadClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}", timeout=EXISTS_TIMEOUT)
+        assert not self.MockGetClass.called, "Should not GET on Thumbor."
+        filename = '/image/e8a82fa321e344dfaddcbaa997845302/people/new/DoesNoyExists.jpg'
         self.assertFalse(self.storage.exists(filename))
         filename = 'people/new/TempletonPeck.jpg'
         self.assertFalse(self.storage.exists(filename))
@@ -287,12 +777,27 @@ class ThumborStorageTest(DjangoThumborTestCase):
     def test_exists_post_django_3_2_11(self):
         filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         self.assertTrue(self.storage.exists(filename))
-        self.MockGetClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}")
-        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/DoesNoyExists.jpg'
+        self.MockHeadClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}", timeout=EXISTS_TIMEOUT)
+        filename = 'image/e8a82fa321e344dfaddcbaa997845302/people/new/DoesNoyExists.jpg'
         self.assertFalse(self.storage.exists(filename))
         filename = 'people/new/TempletonPeck.jpg'
         self.assertFalse(self.storage.exists(filename))
 
+    def test_exists_head_not_allowed(self):
+        self.MockHeadClass.side_effect = mocked_thumbor_head_not_allowed_response
+        self.MockGetClass.side_effect = mocked_thumbor_range_response
+        filename = 'image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
+        self.assertTrue(self.storage.exists(filename))
+        self.MockGetClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}/{filename}",
+                                             headers={"Range": "bytes=0-0"}, stream=True, timeout=EXISTS_TIMEOUT)
+        self.assertEqual(self.MockHeadClass.call_count, 1)
+
+        # The server is known to reject HEAD: no more attempt.
+        filename = 'image/e8a82fa321e344dfaddcbaa997845302/people/new/DoesNoyExists.jpg'
+        self.assertFalse(self.storage.exists(filename))
+        self.assertEqual(self.MockHeadClass.call_count, 1)
+        self.assertEqual(self.MockGetClass.call_count, 2)
+
 
 class ThumborMigrationStorageTest(DjangoThumborTestCase):
     def setUp(self):
@@ -318,6 +823,21 @@ class ThumborMigrationStorageTest(DjangoThumborTestCase):
         self.assertEqual(self.storage.url(filename),
                          f'{settings.THUMBOR_SERVER}/qn6d7XNEzldMxgE8t4oVjEbEsDg=/5247a82854384f228c6fba432c67e6a8')
 
+    def test_urls(self):
+        filenames = ['image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg',
+                     'images/people/new/TempletonPeck.jpg']
+        self.assertEqual(self.storage.urls(filenames), [
+            f'{settings.THUMBOR_SERVER}/qn6d7XNEzldMxgE8t4oVjEbEsDg=/5247a82854384f228c6fba432c67e6a8',
+            f'{settings.MEDIA_URL}images/people/new/TempletonPeck.jpg',
+        ])
+
+    def test_image_url_filesystem(self):
+        filename = 'images/people/new/TempletonPeck.jpg'
+        self.assertEqual(self.storage.image_url(filename, width=320),
+                         f'{settings.MEDIA_URL}images/people/new/TempletonPeck.jpg')
+        self.assertEqual(self.storage.srcset(filename, [320, 640]),
+                         f'{settings.MEDIA_URL}images/people/new/TempletonPeck.jpg')
+
     def test_key_thumbor(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         self.assertEqual(self.storage.key(filename), '5247a82854384f228c6fba432c67e6a8')
@@ -330,12 +850,12 @@ class ThumborMigrationStorageTest(DjangoThumborTestCase):
     def test_delete_thumbor(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         self.storage.delete(filename)
-        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}")
+        self.MockDeleteClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}", timeout=DELETE_TIMEOUT)
 
     def test_exists_thumbor(self):
         filename = '/image/5247a82854384f228c6fba432c67e6a8/people/new/TempletonPeck.jpg'
         self.assertTrue(self.storage.exists(filename))
-        self.MockGetClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}")
+        self.MockHeadClass.assert_called_with(f"{settings.THUMBOR_RW_SERVER}{filename}", timeout=EXISTS_TIMEOUT)
 
     def test_url_filesystem(self):
         filename = 'images/people/new/TempletonPeck.jpg'
@@ -361,6 +881,7 @@ class ThumborMigrationStorageTest(DjangoThumborTestCase):
         filename = 'images/people/new/TempletonPeck.jpg'
         self.storage.exists(filename)
         assert not self.MockGetClass.called, "Should not GET on Thumbor."
+        assert not self.MockHeadClass.called, "Should not HEAD on Thumbor."
 
 
 class UtilsTest(DjangoThumborTestCase):
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+from django.core.files.base import ContentFile
+from django_thumborstorage import imageinfo, streams
+
+CURRENT_DIR = os.path.abspath(os.path.split(__file__)[0])
+IMAGE_DIR = os.path.join(CURRENT_DIR, "..", "images")
+
+
+class MockedStreamingResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+        self.consumed = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            chunk = self.content[i:i + chunk_size]
+            self.consumed += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class SpooledResponseFileTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read()
+        self.response = MockedStreamingResponse(self.content)
+
+    def test_read_is_incremental(self):
+        f = streams.SpooledResponseFile(self.response, chunk_size=1000)
+        self.assertEqual(self.response.consumed, 0)
+        self.assertEqual(f.read(10), self.content[:10])
+        self.assertEqual(self.response.consumed, 1000)
+        self.assertEqual(f.read(1500), self.content[10:1510])
+        self.assertEqual(self.response.consumed, 2000)
+        self.assertEqual(f.tell(), 1510)
+        self.assertFalse(self.response.closed)
+        self.assertEqual(f.read(), self.content[1510:])
+        self.assertTrue(self.response.closed)
+        self.assertEqual(f.read(10), b"")
+
+    def test_seek(self):
+        f = streams.SpooledResponseFile(self.response, chunk_size=1000)
+        f.read(100)
+        self.assertEqual(f.seek(0), 0)
+        self.assertEqual(f.read(100), self.content[:100])
+        self.assertEqual(f.seek(10, os.SEEK_CUR), 110)
+        self.assertEqual(f.read(5), self.content[110:115])
+        self.assertEqual(self.response.consumed, 1000)
+        self.assertEqual(f.seek(0, os.SEEK_END), len(self.content))
+        self.assertEqual(f.seek(-5, os.SEEK_END), len(self.content) - 5)
+        self.assertEqual(f.read(), self.content[-5:])
+        self.assertRaises(ValueError, f.seek, -1)
+
+    def test_spool_on_disk(self):
+        f = streams.SpooledResponseFile(self.response, max_size=4096, chunk_size=1000)
+        f.read(2000)
+        self.assertFalse(f._spool._rolled)
+        f.read(3000)
+        self.assertTrue(f._spool._rolled)
+        f.seek(0)
+        self.assertEqual(f.read(), self.content)
+
+    def test_readinto(self):
+        f = streams.SpooledResponseFile(self.response, chunk_size=1000)
+        buffer = bytearray(20)
+        self.assertEqual(f.readinto(buffer), 20)
+        self.assertEqual(bytes(buffer), self.content[:20])
+
+    def test_close(self):
+        f = streams.SpooledResponseFile(self.response)
+        f.close()
+        self.assertTrue(f.closed)
+        self.assertTrue(self.response.closed)
+        self.assertRaises(ValueError, f.read)
+
+
+class UploadBodyTest(unittest.TestCase):
+    def test_rewind(self):
+        data = open(f'{IMAGE_DIR}/HannibalSmith.jpg', "rb").read()
+        content = ContentFile(data)
+        parser = imageinfo.ImageInfoParser()
+        body = streams.UploadBody(content, parser=parser, block_size=100)
+        # A first attempt interrupted in the middle of the header.
+        body.read(100)
+        body.rewind()
+        self.assertEqual(b"".join(body), data)
+        self.assertEqual(parser.info, {"format": "jpeg", "width": 300, "height": 220})
+
+
+def suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(SpooledResponseFileTest)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(UploadBodyTest))
+    return suite
@@ -0,0 +1,46 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, '..')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+import django  # noqa: E402
+
+from benchmarks import bench  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ThumborStorage operations "
+                                                 "against a local stand-in Thumbor server.")
+    parser.add_argument("operations", nargs="*", metavar="operation",
+                        help=f"Operations to benchmark among {', '.join(bench.OPERATIONS)} (default: all).")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--payload-size", type=int, default=256 * 2 ** 10, help="Size of the images, in bytes.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of threads calling the storage.")
+    parser.add_argument("--latency", type=float, default=0, help="Delay of the server, in seconds.")
+    parser.add_argument("--options", type=json.loads, default=None,
+                        help='ThumborStorage options, as JSON (e.g. \'{"streaming_download": true}\').')
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+    django.setup()
+    unknown = set(args.operations) - set(bench.OPERATIONS)
+    if unknown:
+        parser.error(f"unknown operation(s): {', '.join(sorted(unknown))}")
+
+    results = bench.run(operations=args.operations or bench.OPERATIONS, iterations=args.iterations,
+                        payload_size=args.payload_size, concurrency=args.concurrency,
+                        latency=args.latency, options=args.options)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'operation':<10}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KiB':>10}")
+    for result in results:
+        print(f"{result['operation']:<10}{result['throughput']:>10.1f}"
+              f"{result['p50'] * 1000:>10.2f}{result['p95'] * 1000:>10.2f}{result['p99'] * 1000:>10.2f}"
+              f"{result['peak_memory'] / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()